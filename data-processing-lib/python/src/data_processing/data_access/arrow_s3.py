@@ -10,15 +10,88 @@
 # limitations under the License.
 ################################################################################
 
+import io
+import math
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import Lock
 from typing import Any
 
 import boto3
 import pyarrow as pa
 from botocore.config import Config
-from data_processing.utils import TransformUtils, get_logger
+from botocore.exceptions import ClientError
+from data_processing.utils import MB, TransformUtils, get_logger
 
 
 logger = get_logger(__name__)
+# max number of parts of S3 multipart upload
+s3_max_parts = 10000
+
+
+class S3RangeReader(io.RawIOBase):
+    """
+    Read only file-like object for an S3 file. Every read is a ranged GET of the requested bytes, so that
+    readers accessing only parts of a file (e.g. parquet footer and selected row groups) do not download it
+    """
+
+    def __init__(self, arrow_s3: "ArrowS3", bucket: str, prefix: str, size: int):
+        """
+        Initialization
+        :param arrow_s3: S3 access used for ranged reads
+        :param bucket: bucket name
+        :param prefix: file key
+        :param size: file size
+        """
+        super().__init__()
+        self.arrow_s3 = arrow_s3
+        self.bucket = bucket
+        self.prefix = prefix
+        self.size = size
+        self.position = 0
+        # number of retries of all reads
+        self.retries = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        elif whence == io.SEEK_END:
+            self.position = self.size + offset
+        else:
+            raise ValueError(f"Unsupported whence {whence}")
+        return self.position
+
+    def read(self, size: int = -1) -> bytes:
+        end = self.size if size is None or size < 0 else min(self.position + size, self.size)
+        if end <= self.position:
+            return b""
+        for n in range(self.arrow_s3.retries):
+            try:
+                data, _, r = self.arrow_s3._read_range(
+                    bucket=self.bucket, prefix=self.prefix, start=self.position, end=end - 1
+                )
+                self.retries += r
+                self.position += len(data)
+                return data
+            except Exception as e:
+                logger.error(f"failed to read range of {self.bucket}/{self.prefix}, exception {e}, attempt {n}")
+                self.retries += self.arrow_s3.s3_max_attempts
+        raise IOError(f"failed to read range of {self.bucket}/{self.prefix} in {self.arrow_s3.retries} attempts")
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
 
 
 class ArrowS3:
@@ -36,6 +109,10 @@ class ArrowS3:
         region: str = None,
         s3_retries: int = 10,
         s3_max_attempts=10,
+        multipart_threshold: int = 0,
+        part_size: int = 8 * MB,
+        max_concurrency: int = 8,
+        list_shard_depth: int = 3,
     ) -> None:
         """
         Initialization
@@ -45,7 +122,14 @@ class ArrowS3:
         :param region: s3 region
         :param s3_retries: number of S3 retries - default 10
         :param s3_max_attempts - boto s3 client internal retries - default 10
+        :param multipart_threshold: size (bytes) above which files are read with concurrent ranged GETs and
+                                    written with multipart uploads - default 0, transfers use a single request
+        :param part_size: size (bytes) of a single part of the ranged/multipart transfer - default 8MB
+        :param max_concurrency: number of concurrent part transfers and listing requests - default 8
+        :param list_shard_depth: max number of folder levels used for sharding of the files listing - default 3
         """
+        if multipart_threshold > 0 and part_size < 5 * MB:
+            raise ValueError(f"S3 multipart part size {part_size} is smaller then minimal 5MB")
         # Create boto S3 client
         self.s3_client = boto3.client(
             service_name="s3",
@@ -53,10 +137,30 @@ class ArrowS3:
             aws_secret_access_key=secret_key,
             endpoint_url=endpoint,
             region_name=region,
-            config=Config(retries={"max_attempts": s3_max_attempts, "mode": "standard"}),
+            config=Config(
+                retries={"max_attempts": s3_max_attempts, "mode": "standard"},
+                max_pool_connections=max(10, max_concurrency),
+            ),
         )
         self.retries = s3_retries
         self.s3_max_attempts = s3_max_attempts
+        self.multipart_threshold = multipart_threshold
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+        self.list_shard_depth = list_shard_depth
+        # thread pool shared by all ranged reads and multipart uploads. Created lazily
+        self.executor = None
+        self.executor_lock = Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """
+        Get thread pool used for part transfers
+        :return: thread pool executor
+        """
+        with self.executor_lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="s3_part")
+            return self.executor
 
     @staticmethod
     def _get_bucket_key(key: str) -> tuple[str, str]:
@@ -68,54 +172,124 @@ class ArrowS3:
         prefixes = key.split("/")
         return prefixes[0], "/".join(prefixes[1:])
 
-    # get list of the files (names and sizes) for a given prefix (including bucket name)
-    def list_files(self, key: str) -> tuple[list[dict[str, Any]], int]:
+    @staticmethod
+    def _file_entry(bucket: str, obj: dict[str, Any]) -> dict[str, Any]:
         """
-        List files in the folder (hierarchically going through all sub-folders)
-        :param key: complete folder name
-        :return: list of dictionaries, containing file names and length and number of retries
+        Convert S3 object description to the file entry
+        :param bucket: bucket name
+        :param obj: object description returned by list_objects_v2
+        :return: dictionary of file name, size, etag and modification time (epoch seconds)
+        """
+        return {
+            "name": f"{bucket}/{obj['Key']}",
+            "size": obj["Size"],
+            "etag": obj.get("ETag", "").strip('"'),
+            "mtime": obj["LastModified"].timestamp() if "LastModified" in obj else 0.0,
+        }
+
+    def _list_prefix(
+        self, bucket: str, prefix: str, delimiter: bool, start_after: str = None
+    ) -> tuple[list[dict[str, Any]], list[str], int]:
+        """
+        List a single prefix
+        :param bucket: bucket name
+        :param prefix: prefix
+        :param delimiter: flag to list only the current level (returning sub folders separately)
+        :param start_after: optional key to start listing after
+        :return: list of files, list of sub folders (prefixes) and number of retries
         """
-        bucket, prefix = self._get_bucket_key(key)
         # Use paginator here to get all the files rather then 1 page
         paginator = self.s3_client.get_paginator("list_objects_v2")
-        pages = paginator.paginate(Bucket=bucket, Prefix=prefix)
+        params = {"Bucket": bucket, "Prefix": prefix}
+        if delimiter:
+            params["Delimiter"] = "/"
+        if start_after is not None:
+            params["StartAfter"] = start_after
         files = []
+        folders = []
         retries = 0
-        for page in pages:
+        for page in paginator.paginate(**params):
             # For every page
             retries += page.get("ResponseMetadata", {}).get("RetryAttempts", 0)
             for obj in page.get("Contents", []):
-                # Get both file name and size
-                files.append({"name": f"{bucket}/{obj['Key']}", "size": obj["Size"]})
-        return files, retries
+                files.append(self._file_entry(bucket=bucket, obj=obj))
+            for p in page.get("CommonPrefixes", []):
+                folders.append(p["Prefix"])
+        return files, folders, retries
+
+    def _list_prefixes(
+        self, bucket: str, prefixes: list[str], delimiter: bool
+    ) -> list[tuple[list[dict[str, Any]], list[str], int]]:
+        """
+        List multiple prefixes concurrently
+        :param bucket: bucket name
+        :param prefixes: list of prefixes
+        :param delimiter: flag to list only the current level
+        :return: list of listing results for every prefix
+        """
+        if len(prefixes) == 1:
+            return [self._list_prefix(bucket=bucket, prefix=prefixes[0], delimiter=delimiter)]
+        executor = self._get_executor()
+        return list(executor.map(lambda p: self._list_prefix(bucket=bucket, prefix=p, delimiter=delimiter), prefixes))
+
+    # get list of the files (names and sizes) for a given prefix (including bucket name)
+    def list_files(self, key: str, start_after: str = None) -> tuple[list[dict[str, Any]], int]:
+        """
+        List files in the folder (hierarchically going through all sub-folders). The listing is sharded by
+        sub-folders: folder levels are listed (with delimiter) until there are enough sub-folders to
+        keep max_concurrency connections busy, then every sub-folder is listed concurrently
+        :param key: complete folder name
+        :param start_after: optional complete file name to start listing after. If specified, only the
+                            files after this one (in lexicographical order) are returned by a single,
+                            not sharded, listing. Used for the incremental refresh of the input manifest
+        :return: list of dictionaries, containing file names, length, etag and modification time, sorted by name
+        and number of retries
+        """
+        bucket, prefix = self._get_bucket_key(key)
+        if start_after is not None:
+            # incremental listing of the new files
+            files, _, retries = self._list_prefix(
+                bucket=bucket, prefix=prefix, delimiter=False, start_after=self._get_bucket_key(start_after)[1]
+            )
+            return files, retries
+        files = []
+        retries = 0
+        level = [prefix]
+        depth = 0
+        while len(level) > 0:
+            if len(level) >= self.max_concurrency or depth >= self.list_shard_depth:
+                # enough shards, list them completely
+                for f, _, r in self._list_prefixes(bucket=bucket, prefixes=level, delimiter=False):
+                    files.extend(f)
+                    retries += r
+                break
+            sub_folders = []
+            for f, sf, r in self._list_prefixes(bucket=bucket, prefixes=level, delimiter=True):
+                files.extend(f)
+                sub_folders.extend(sf)
+                retries += r
+            level = sub_folders
+            depth += 1
+        return sorted(files, key=lambda f: f["name"]), retries
 
     def list_folders(self, key: str) -> tuple[list[str], int]:
         """
-        Get list of folders for folder
+        Get list of folders for folder. Every level of the folders hierarchy is listed concurrently
         :param key: complete folder
         :return: list of folders within a given folder and number of retries
         """
-        def _get_sub_folders(bck: str, p: str) -> tuple[list[str], int]:
-            sub_folders = []
-            # use paginator
-            paginator = self.s3_client.get_paginator("list_objects_v2")
-            # use Delimiter to get folders just folders
-            page_iterator = paginator.paginate(Bucket=bck, Prefix=p, Delimiter="/")
-            internal_retries = 0
-            for page in page_iterator:
-                # for every page
-                internal_retries += page.get("ResponseMetadata", {}).get("RetryAttempts", 0)
-                for p in page.get("CommonPrefixes", []):
-                    sf = p["Prefix"]
-                    sub_folders.append(sf)
-                    # apply recursively
-                    sf, r = _get_sub_folders(bck=bck, p=sf)
-                    internal_retries += r
-                    sub_folders.extend(sf)
-            return sub_folders, internal_retries
         bucket, prefix = self._get_bucket_key(key)
-        subs, retries = _get_sub_folders(bck=bucket, p=prefix)
-        return [f"{bucket}/{f}" for f in subs], retries
+        folders = []
+        retries = 0
+        level = [prefix]
+        while len(level) > 0:
+            sub_folders = []
+            for _, sf, r in self._list_prefixes(bucket=bucket, prefixes=level, delimiter=True):
+                sub_folders.extend(sf)
+                retries += r
+            folders.extend(sub_folders)
+            level = sub_folders
+        return [f"{bucket}/{f}" for f in sorted(folders)], retries
 
     def read_file(self, key: str) -> tuple[bytes, int]:
         """
@@ -127,6 +301,10 @@ class ArrowS3:
         retries = 0
         for n in range(self.retries):
             try:
+                if self.multipart_threshold > 0:
+                    data, r = self._read_ranged(bucket=bucket, prefix=prefix)
+                    retries += r
+                    return data, retries
                 obj = self.s3_client.get_object(Bucket=bucket, Key=prefix)
                 retries += obj.get("ResponseMetadata", {}).get("RetryAttempts", 0)
                 return obj["Body"].read(), retries
@@ -136,6 +314,79 @@ class ArrowS3:
         logger.error(f"failed to read file {key} in {self.retries} attempts. Skipping it")
         return None, retries
 
+    def _read_range(self, bucket: str, prefix: str, start: int, end: int) -> tuple[bytes, int, int]:
+        """
+        Read a byte range of an s3 file
+        :param bucket: bucket name
+        :param prefix: file key
+        :param start: first byte of the range
+        :param end: last byte of the range (inclusive)
+        :return: range content, total file size and number of retries
+        """
+        obj = self.s3_client.get_object(Bucket=bucket, Key=prefix, Range=f"bytes={start}-{end}")
+        # content range is defined as bytes start-end/size
+        size = int(obj["ContentRange"].split("/")[-1])
+        return obj["Body"].read(), size, obj.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+
+    def _read_ranged(self, bucket: str, prefix: str) -> tuple[bytes, int]:
+        """
+        Read an s3 file using ranged GETs. The first part is read synchronously to get the file size. If the
+        file is larger then multipart threshold, the rest of the parts are read concurrently
+        :param bucket: bucket name
+        :param prefix: file key
+        :return: file content and number of retries
+        """
+        try:
+            first, size, retries = self._read_range(bucket=bucket, prefix=prefix, start=0, end=self.part_size - 1)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "InvalidRange":
+                raise e
+            # empty file can not be read with range
+            obj = self.s3_client.get_object(Bucket=bucket, Key=prefix)
+            return obj["Body"].read(), obj.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+        if size <= len(first):
+            return first, retries
+        if size <= self.multipart_threshold:
+            # small file, read the remainder in one request
+            rest, _, r = self._read_range(bucket=bucket, prefix=prefix, start=len(first), end=size - 1)
+            return first + rest, retries + r
+        executor = self._get_executor()
+        futures = [
+            executor.submit(
+                self._read_range,
+                bucket=bucket,
+                prefix=prefix,
+                start=start,
+                end=min(start + self.part_size, size) - 1,
+            )
+            for start in range(len(first), size, self.part_size)
+        ]
+        parts = [first]
+        for future in futures:
+            part, _, r = future.result()
+            parts.append(part)
+            retries += r
+        return b"".join(parts), retries
+
+    def open_file(self, key: str) -> tuple[S3RangeReader, int]:
+        """
+        Open an s3 file for reading of its parts, every read is a ranged GET
+        :param key: complete path
+        :return: file-like object or None if the file does not exist and a number of retries
+        """
+        bucket, prefix = self._get_bucket_key(key)
+        retries = 0
+        for n in range(self.retries):
+            try:
+                res = self.s3_client.head_object(Bucket=bucket, Key=prefix)
+                retries += res.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+                return S3RangeReader(arrow_s3=self, bucket=bucket, prefix=prefix, size=res["ContentLength"]), retries
+            except Exception as e:
+                logger.error(f"failed to open file {key}, exception {e}, attempt {n}")
+                retries += self.s3_max_attempts
+        logger.error(f"failed to open file {key} in {self.retries} attempts. Skipping it")
+        return None, retries
+
     def save_file(self, key: str, data: bytes) -> tuple[dict[str, Any], int]:
         """
         Save file to S3
@@ -149,6 +400,9 @@ class ArrowS3:
         retries = 0
         for n in range(self.retries):
             try:
+                if 0 < self.multipart_threshold < len(data):
+                    res, r = self._save_multipart(bucket=bucket, prefix=prefix, data=data)
+                    return res, retries + r
                 res = self.s3_client.put_object(Bucket=bucket, Key=prefix, Body=data)
                 retries += res.get("ResponseMetadata", {}).get("RetryAttempts", 0)
                 return res, retries
@@ -158,6 +412,74 @@ class ArrowS3:
         logger.error(f"Failed to upload file {key}, skipping it")
         return None, retries
 
+    def _upload_part(
+        self, bucket: str, prefix: str, upload_id: str, part_number: int, data: memoryview
+    ) -> tuple[dict[str, Any], int]:
+        """
+        Upload a single part of the multipart upload
+        :param bucket: bucket name
+        :param prefix: file key
+        :param upload_id: multipart upload id
+        :param part_number: part number (starting from 1)
+        :param data: part content
+        :return: completed part description and number of retries
+        """
+        # boto3 does not accept memoryview body, wrap it in a file-like object without copying
+        res = self.s3_client.upload_part(
+            Bucket=bucket, Key=prefix, UploadId=upload_id, PartNumber=part_number, Body=pa.BufferReader(data)
+        )
+        retries = res.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+        return {"ETag": res["ETag"], "PartNumber": part_number}, retries
+
+    def _save_multipart(self, bucket: str, prefix: str, data: bytes) -> tuple[dict[str, Any], int]:
+        """
+        Save file to S3 using multipart upload with parts uploaded concurrently. In the case of failure
+        the upload is aborted, so that no parts are left in the bucket, and the original exception is raised.
+        Parts are uploaded from slices of the data memoryview, without copying. The part size is increased
+        if needed to stay within S3 limit of 10,000 parts
+        :param bucket: bucket name
+        :param prefix: file key
+        :param data: byte array of the file content
+        :return: dictionary as returned by boto3 complete_multipart_upload and number of retries
+        """
+        upload_id = self.s3_client.create_multipart_upload(Bucket=bucket, Key=prefix)["UploadId"]
+        futures = []
+        part_size = max(self.part_size, math.ceil(len(data) / s3_max_parts))
+        view = memoryview(data)
+        try:
+            executor = self._get_executor()
+            futures = [
+                executor.submit(
+                    self._upload_part,
+                    bucket=bucket,
+                    prefix=prefix,
+                    upload_id=upload_id,
+                    part_number=index + 1,
+                    data=view[start : start + part_size],
+                )
+                for index, start in enumerate(range(0, len(data), part_size))
+            ]
+            parts = []
+            retries = 0
+            for future in futures:
+                part, r = future.result()
+                parts.append(part)
+                retries += r
+            res = self.s3_client.complete_multipart_upload(
+                Bucket=bucket, Key=prefix, UploadId=upload_id, MultipartUpload={"Parts": parts}
+            )
+            return res, retries + res.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+        except Exception:
+            # parts uploaded after the abort would be left in the bucket, wait for the ones in progress
+            for future in futures:
+                future.cancel()
+            wait(futures)
+            try:
+                self.s3_client.abort_multipart_upload(Bucket=bucket, Key=prefix, UploadId=upload_id)
+            except Exception as e:
+                logger.error(f"Failed to abort multipart upload {upload_id} of {bucket}/{prefix}, exception {e}")
+            raise
+
     def read_table(self, key: str, schema: pa.schema = None) -> tuple[pa.Table, int]:
         """
         Get an arrow table from a file with a given name
@@ -10,10 +10,14 @@
 # limitations under the License.
 ################################################################################
 
+import bisect
 import random
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
 import pyarrow as pa
+import pyarrow.parquet as pq
 from data_processing.utils import KB, MB, GB, TransformUtils, get_logger
 
 
@@ -29,6 +33,9 @@ class DataAccess:
             n_samples: int,
             files_to_use: list[str],
             files_to_checkpoint: list[str],
+            manifest: str = None,
+            checkpoint_markers: str = None,
+            manifest_refresh: str = "full",
     ):
         """
         Create data access class for folder based configuration
@@ -38,6 +45,11 @@ class DataAccess:
         :param n_samples: amount of files to randomly sample
         :param files_to_use: files extensions of files to include
         :param files_to_checkpoint: files extensions of files to use for checkpointing
+        :param manifest: optional location of the input folder manifest. If defined, the input folder
+                         listing is kept in the manifest, see _load_manifest
+        :param checkpoint_markers: optional folder for completion markers. If defined, names of the processed
+                                   files are saved there and used for checkpointing instead of the output listing
+        :param manifest_refresh: manifest refresh mode - full (default), incremental or none, see _load_manifest
         """
         self.d_sets = d_sets
         self.checkpoint = checkpoint
@@ -45,6 +57,14 @@ class DataAccess:
         self.n_samples = n_samples
         self.files_to_use = files_to_use
         self.files_to_checkpoint = files_to_checkpoint
+        self.manifest = manifest
+        self.manifest_refresh = manifest_refresh
+        self.checkpoint_markers = checkpoint_markers
+        # sizes of the files returned by the last get_files_to_process
+        self.input_file_sizes = {}
+        # input folder listing (sorted by name), loaded from the manifest on the first use
+        self.manifest_files = None
+        self.manifest_names = None
         self.logger = get_logger(__name__)
 
     def get_output_folder(self) -> str:
@@ -97,6 +117,7 @@ class DataAccess:
         if self.get_output_folder() is None:
             self.logger.warning("Input/Output are not defined, returning empty list")
             return [], {}, 0
+        self.input_file_sizes = {}
         path_list, path_profile, retries = self._get_files_to_process_internal()
         if self.n_samples > 0:
             files = self.get_random_file_set(n_samples=self.n_samples, files=path_list)
@@ -155,6 +176,14 @@ class DataAccess:
             )
         return path_list, profile, retries
 
+    def get_input_file_sizes(self) -> dict[str, int]:
+        """
+        Get sizes of the files returned by the last get_files_to_process invocation, as reported by the listing.
+        Runtimes use them for size-aware scheduling
+        :return: dictionary of file name to file size (bytes)
+        """
+        return self.input_file_sizes
+
     def _get_folders_to_use(self) -> tuple[list[str], int]:
         """
         convert data sets to a list of folders to use
@@ -183,7 +212,7 @@ class DataAccess:
         p_list = []
         total_input_file_size = 0
         i = 0
-        files, retries = self._list_files_folder(path=path)
+        files, retries = self._list_files_cached(path=path)
         for file in files:
             if i >= cm_files > 0:
                 break
@@ -235,16 +264,24 @@ class DataAccess:
                 max_file_size=max_file_size,
             )
             files = [fs["name"] for fs in file_sizes]
+            for fs in file_sizes:
+                self.input_file_sizes[fs["name"]] = fs["size"]
             return files, profile, retries
 
-        pout_list, _, retries1 = self._get_files_folder(
-            path=output_path, files_to_use=self.files_to_checkpoint, cm_files=-1
-        )
-        output_base_names_ext = [file["name"].replace(self.get_output_folder(), self.get_input_folder())
-                                 for file in pout_list]
-        # In the case of binary transforms, an extension can be different, so just use the file names.
-        # Also remove duplicates
-        output_base_names = list(set([TransformUtils.get_file_extension(file)[0] for file in output_base_names_ext]))
+        # base names (without extension) of the completed files. In the case of binary transforms, an extension
+        # can be different, so just use the file names.
+        completed, retries1 = self._get_completed_files()
+        if completed is None:
+            pout_list, _, r = self._get_files_folder(
+                path=output_path, files_to_use=self.files_to_checkpoint, cm_files=-1
+            )
+            retries1 += r
+            output_folder = self.get_output_folder()
+            input_folder = self.get_input_folder()
+            completed = {
+                TransformUtils.get_file_extension(file["name"].replace(output_folder, input_folder))[0]
+                for file in pout_list
+            }
         p_list = []
         total_input_file_size = 0
         i = 0
@@ -260,9 +297,10 @@ class DataAccess:
             if self.files_to_use is not None:
                 if name_extension[1] not in self.files_to_use:
                     continue
-            if name_extension[0] not in output_base_names:
+            if name_extension[0] not in completed:
                 p_list.append(f_name)
                 size = file["size"]
+                self.input_file_sizes[f_name] = size
                 total_input_file_size += size
                 if min_file_size > size:
                     min_file_size = size
@@ -279,23 +317,215 @@ class DataAccess:
             retries,
         )
 
-    def _list_files_folder(self, path: str) -> tuple[list[dict[str, Any]], int]:
+    def save_completion_markers(self, f_names: list[str]) -> tuple[dict[str, Any], int]:
+        """
+        Save completion markers for the processed input files. Markers are saved as a new text file (one
+        name, relative to the input folder, per line) in the checkpoint markers folder, so that concurrent
+        workers never update the same file
+        :param f_names: list of input file names
+        :return: a dictionary as
+        defined https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/s3/client/put_object.html
+        in the case of failure dict is None and number of operation retries
+        """
+        if self.checkpoint_markers is None or len(f_names) == 0:
+            return {}, 0
+        root = self.get_input_folder().rstrip("/")
+        names = [name[len(root) + 1 :] if name.startswith(f"{root}/") else name for name in f_names]
+        path = f"{self.checkpoint_markers.rstrip('/')}/{uuid.uuid4().hex}.txt"
+        return self.save_file(path=path, data="\n".join(names).encode("utf-8"))
+
+    def _get_completed_files(self) -> tuple[set[str], int]:
+        """
+        Get base names (without extension) of the input files, recorded in the completion markers
+        :return: set of file names or None if completion markers are not used or do not exist yet
+        and number of retries
+        """
+        if self.checkpoint_markers is None:
+            return None, 0
+        markers, retries = self._list_files_folder(path=self.checkpoint_markers)
+        markers = [marker["name"] for marker in markers if marker["name"].endswith(".txt")]
+        if len(markers) == 0:
+            return None, retries
+        root = self.get_input_folder().rstrip("/")
+        completed = set()
+        with ThreadPoolExecutor(max_workers=min(len(markers), 8)) as executor:
+            for data, r in executor.map(self.get_file, markers):
+                retries += r
+                if data is None:
+                    continue
+                for name in data.decode("utf-8").splitlines():
+                    if len(name) > 0:
+                        completed.add(TransformUtils.get_file_extension(f"{root}/{name}")[0])
+        self.logger.info(f"Found {len(completed)} completed files in {len(markers)} completion markers")
+        return completed, retries
+
+    def _list_files_folder(self, path: str, start_after: str = None) -> tuple[list[dict[str, Any]], int]:
         """
         Get files for a given folder and all sub folders
         :param path: path
-        :return: List of files
+        :param start_after: optional file name. If defined only files with names after it are returned
+        :return: List of files (dictionaries of name, size, etag and mtime) and number of retries
         """
         raise NotImplementedError("Subclasses should implement this!")
 
-    def get_table(self, path: str) -> tuple[pa.table, int]:
+    def _file_exists(self, path: str) -> tuple[bool, int]:
+        """
+        Check whether the file exists
+        :param path: file path
+        :return: True if the file exists, False otherwise and number of retries
+        """
+        raise NotImplementedError("Subclasses should implement this!")
+
+    def _list_files_cached(self, path: str) -> tuple[list[dict[str, Any]], int]:
+        """
+        Get files for a given folder and all sub folders. If the manifest is configured and the folder is
+        the input folder or its sub folder, the files are taken from the manifest, otherwise the folder is listed
+        :param path: path
+        :return: List of files and number of retries
+        """
+        input_folder = self.get_input_folder()
+        if self.manifest is None or input_folder is None:
+            return self._list_files_folder(path=path)
+        root = input_folder.rstrip("/")
+        folder = path.rstrip("/")
+        if folder != root and not folder.startswith(f"{root}/"):
+            return self._list_files_folder(path=path)
+        retries = 0
+        if self.manifest_files is None:
+            self.manifest_files, retries = self._load_manifest(root=root)
+            self.manifest_names = [file["name"] for file in self.manifest_files]
+        if folder == root:
+            return self.manifest_files, retries
+        # files of the sub folder are a continuous range of the sorted list
+        first = bisect.bisect_left(self.manifest_names, f"{folder}/")
+        # "0" is the character following "/"
+        last = bisect.bisect_left(self.manifest_names, f"{folder}0", lo=first)
+        return self.manifest_files[first:last], retries
+
+    def _load_manifest(self, root: str) -> tuple[list[dict[str, Any]], int]:
+        """
+        Load the input folder manifest and refresh it based on the manifest refresh mode:
+            full - the input folder is listed and the manifest is updated with the added, removed and changed
+                   files. This is the default, it is always correct and concurrent runs do not corrupt the manifest
+            incremental - only files with names after the last file in the manifest are listed. This is only
+                   correct if files are never removed, new files get increasing names (e.g. timestamped) and
+                   runs refreshing the manifest do not overlap
+            none - the manifest is used as is. This is only correct for inputs that do not change
+        If the manifest does not exist, it is created from the input folder listing.
+        The manifest is only saved if it changed and it is saved atomically
+        :param root: input folder
+        :return: list of files sorted by name and number of retries
+        """
+        manifest_files, retries = self._read_manifest(root=root)
+        if manifest_files is not None and self.manifest_refresh == "none":
+            self.logger.info(f"Using manifest {self.manifest} with {len(manifest_files)} files")
+            return manifest_files, retries
+        if manifest_files is not None and self.manifest_refresh == "incremental":
+            start_after = manifest_files[-1]["name"] if len(manifest_files) > 0 else None
+            new_files, r = self._list_files_folder(path=f"{root}/", start_after=start_after)
+            retries += r
+            new_files = sorted(
+                [file for file in new_files if file["name"] != self.manifest], key=lambda file: file["name"]
+            )
+            self.logger.info(
+                f"Using manifest {self.manifest} with {len(manifest_files)} files, {len(new_files)} new files"
+            )
+            files = manifest_files + new_files
+            changed = len(new_files) > 0
+        else:
+            files, r = self._list_files_folder(path=f"{root}/")
+            retries += r
+            files = sorted([file for file in files if file["name"] != self.manifest], key=lambda file: file["name"])
+            if manifest_files is None:
+                self.logger.info(f"Creating manifest {self.manifest} with {len(files)} files")
+                changed = True
+            else:
+                names = {file["name"] for file in files}
+                manifest_names = {file["name"] for file in manifest_files}
+                self.logger.info(
+                    f"Refreshing manifest {self.manifest} with {len(manifest_files)} files, "
+                    f"{len(names - manifest_names)} new files, {len(manifest_names - names)} removed files"
+                )
+                changed = files != manifest_files
+        if changed:
+            manifest = pa.Table.from_pydict(
+                {
+                    "name": [file["name"][len(root) + 1 :] for file in files],
+                    "size": pa.array([file["size"] for file in files], type=pa.int64()),
+                    "etag": pa.array([file.get("etag", "") for file in files], type=pa.string()),
+                    "mtime": pa.array([file.get("mtime", 0.0) for file in files], type=pa.float64()),
+                }
+            )
+            res, r = self._save_file_atomic(
+                path=self.manifest, data=TransformUtils.convert_arrow_to_binary(table=manifest)
+            )
+            retries += r
+            if res is None:
+                self.logger.warning(f"Failed to save manifest {self.manifest}")
+        return files, retries
+
+    def _read_manifest(self, root: str) -> tuple[list[dict[str, Any]], int]:
+        """
+        Read the input folder manifest
+        :param root: input folder
+        :return: list of files sorted by name or None, if the manifest does not exist or can not be read
+                 and number of retries
+        """
+        exists, retries = self._file_exists(self.manifest)
+        if not exists:
+            return None, retries
+        data, r = self.get_file(self.manifest)
+        retries += r
+        table = TransformUtils.convert_binary_to_arrow(data=data) if data is not None else None
+        if table is None:
+            self.logger.warning(f"Failed to read manifest {self.manifest}, listing input folder")
+            return None, retries
+        return [
+            {"name": f"{root}/{name}", "size": size, "etag": etag, "mtime": mtime}
+            for name, size, etag, mtime in zip(
+                table["name"].to_pylist(),
+                table["size"].to_pylist(),
+                table["etag"].to_pylist(),
+                table["mtime"].to_pylist(),
+            )
+        ], retries
+
+    def _save_file_atomic(self, path: str, data: bytes) -> tuple[dict[str, Any], int]:
+        """
+        Save file, so that readers see either the previous or the new content. Object stores replace
+        objects atomically, so by default this is save_file
+        :param path: file path
+        :param data: byte array
+        :return: a dictionary as for save_file, in the case of failure dict is None and number of retries
+        """
+        return self.save_file(path=path, data=data)
+
+    def get_table(
+            self, path: str, columns: list[str] = None, row_groups: list[int] = None
+    ) -> tuple[pa.table, int]:
         """
         Get pyArrow table for a given path
         :param path - file path
+        :param columns - optional list of columns to read. If None, all columns are read
+        :param row_groups - optional list of row group indexes to read. If None, all row groups are read
         :return: pyArrow table or None, if the table read failed and number of operation retries.
                  Retries are performed on operation failures and are typically due to the resource overload.
         """
         raise NotImplementedError("Subclasses should implement this!")
 
+    @staticmethod
+    def _read_parquet(source: Any, columns: list[str] = None, row_groups: list[int] = None) -> pa.Table:
+        """
+        Read parquet table from a source, only decoding the required columns and row groups
+        :param source: file path or pyarrow file-like object (memory map, buffer reader)
+        :param columns - optional list of columns to read
+        :param row_groups - optional list of row group indexes to read
+        :return: pyArrow table
+        """
+        if row_groups is None:
+            return pq.read_table(source, columns=columns)
+        return pq.ParquetFile(source).read_row_groups(row_groups=row_groups, columns=columns)
+
     def get_file(self, path: str) -> tuple[bytes, int]:
         """
         Get file as a byte array
@@ -306,6 +536,32 @@ class DataAccess:
         """
         raise NotImplementedError("Subclasses should implement this!")
 
+    def get_buffer(self, path: str) -> tuple[pa.Buffer | bytes, int]:
+        """
+        Get file content as a pyarrow buffer. Implementations can override this method to avoid copying
+        of the file content, for example by memory mapping the file. The returned object supports
+        buffer protocol, so it can be used by pyarrow (pa.BufferReader) and polars readers directly.
+        The default implementation simply returns the result of get_file.
+        :param path: file path
+        :return: buffer (or bytes) of file content and number of operation retries
+                 Retries are performed on operation failures and are typically due to the resource overload.
+        """
+        return self.get_file(path)
+
+    def get_parquet_file(self, path: str) -> tuple[pq.ParquetFile, int]:
+        """
+        Open a parquet file for reading of its metadata and of selected row groups and columns. Implementations
+        can override this method to fetch only the parts of the file that are actually read, for example using
+        ranged reads. The default implementation opens the content returned by get_buffer.
+        :param path: file path
+        :return: parquet file or None, if the file can not be read and number of operation retries
+                 Retries are performed on operation failures and are typically due to the resource overload.
+        """
+        data, retries = self.get_buffer(path)
+        if data is None:
+            return None, retries
+        return pq.ParquetFile(pa.BufferReader(data)), retries
+
     def get_folder_files(
         self, path: str, extensions: list[str] = None, return_data: bool = True
     ) -> tuple[dict[str, bytes], int]:
@@ -352,6 +608,14 @@ class DataAccess:
         """
         raise NotImplementedError("Subclasses should implement this!")
 
+    def delete_file(self, path: str) -> int:
+        """
+        Delete file
+        :param path: file path
+        :return: number of operation retries. Failures are logged
+        """
+        raise NotImplementedError("Subclasses should implement this!")
+
     def get_output_location(self, path: str) -> str:
         """
         Get output location based on input
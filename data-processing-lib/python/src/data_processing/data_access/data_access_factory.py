@@ -86,6 +86,13 @@ class DataAccessFactory(DataAccessFactoryBase):
                 "s3-path/your-output-bucket",
                 "Path to output folder of processed files",
             ],
+            "multipart_threshold_mb": [
+                64,
+                "Optional size (MB) above which files are transferred with concurrent ranged reads and multipart "
+                "uploads, default 0 (disabled)",
+            ],
+            "part_size_mb": [8, "Optional size (MB, at least 5) of a part of the concurrent transfer, default 8"],
+            "max_concurrency": [8, "Optional number of concurrent part transfers, default 8"],
         }
         parser.add_argument(
             f"--{self.cli_arg_prefix}s3_config",
@@ -137,6 +144,31 @@ class DataAccessFactory(DataAccessFactoryBase):
         parser.add_argument(
             f"--{self.cli_arg_prefix}num_samples", type=int, default=-1, help="number of random input files to process"
         )
+        parser.add_argument(
+            f"--{self.cli_arg_prefix}manifest",
+            type=str,
+            default=None,
+            help="optional location of the input folder manifest (parquet file of input file names, sizes, etags "
+            "and modification times). It is created from the input folder listing and refreshed according to "
+            f"--{self.cli_arg_prefix}manifest_refresh",
+        )
+        parser.add_argument(
+            f"--{self.cli_arg_prefix}manifest_refresh",
+            type=str,
+            default="full",
+            choices=["full", "incremental", "none"],
+            help="manifest refresh mode. full - list the input folder and update the manifest with added, removed "
+            "and changed files. incremental - list only files with names after the last file in the manifest, "
+            "correct only if files are never removed, new files get increasing names and runs do not overlap. "
+            "none - use the manifest as is, correct only for inputs that do not change",
+        )
+        parser.add_argument(
+            f"--{self.cli_arg_prefix}checkpoint_markers",
+            type=str,
+            default=None,
+            help="optional folder for completion markers. If defined, names of the processed files are saved there "
+            "and checkpointing uses them instead of listing the output folder",
+        )
 
     def apply_input_params(self, args: Union[dict, argparse.Namespace]) -> bool:
         """
@@ -160,6 +192,9 @@ class DataAccessFactory(DataAccessFactoryBase):
         n_samples = arg_dict.get(f"{self.cli_arg_prefix}num_samples", -1)
         files_to_use = arg_dict.get(f"{self.cli_arg_prefix}files_to_use", [".parquet"])
         files_to_checkpoint = arg_dict.get(f"{self.cli_arg_prefix}files_to_checkpoint", [".parquet"])
+        manifest = arg_dict.get(f"{self.cli_arg_prefix}manifest", None)
+        manifest_refresh = arg_dict.get(f"{self.cli_arg_prefix}manifest_refresh", "full")
+        checkpoint_markers = arg_dict.get(f"{self.cli_arg_prefix}checkpoint_markers", None)
         # check which configuration (S3 or Local) is specified
         s3_config_specified = 1 if s3_config is not None else 0
         local_config_specified = 1 if local_config is not None else 0
@@ -220,6 +255,9 @@ class DataAccessFactory(DataAccessFactoryBase):
         self.n_samples = n_samples
         self.files_to_use = files_to_use
         self.files_to_checkpoint = files_to_checkpoint
+        self.manifest = manifest
+        self.manifest_refresh = manifest_refresh
+        self.checkpoint_markers = checkpoint_markers
         self.dsets = data_sets
         if data_sets is None or len(data_sets) < 1:
             self.logger.info(
@@ -251,6 +289,9 @@ class DataAccessFactory(DataAccessFactoryBase):
                 n_samples=self.n_samples,
                 files_to_use=self.files_to_use,
                 files_to_checkpoint=self.files_to_checkpoint,
+                manifest=self.manifest,
+                checkpoint_markers=self.checkpoint_markers,
+                manifest_refresh=self.manifest_refresh,
             )
         else:
             # anything else is local data
@@ -262,4 +303,7 @@ class DataAccessFactory(DataAccessFactoryBase):
                 n_samples=self.n_samples,
                 files_to_use=self.files_to_use,
                 files_to_checkpoint=self.files_to_checkpoint,
+                manifest=self.manifest,
+                checkpoint_markers=self.checkpoint_markers,
+                manifest_refresh=self.manifest_refresh,
             )
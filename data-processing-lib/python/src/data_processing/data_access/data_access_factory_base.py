@@ -39,6 +39,9 @@ class DataAccessFactoryBase(CLIArgumentProvider):
         self.n_samples = -1
         self.files_to_use = []
         self.files_to_checkpoint = []
+        self.manifest = None
+        self.manifest_refresh = "full"
+        self.checkpoint_markers = None
         self.cli_arg_prefix = cli_arg_prefix
         self.params = {}
         self.logger = get_logger(__name__ + str(uuid.uuid4()))
@@ -140,4 +143,13 @@ class DataAccessFactoryBase(CLIArgumentProvider):
         if s3_config.get("output_folder", "") == "":
             valid_config = False
             self.logger.error(f"data access factory {self.cli_arg_prefix}: Could not find output folder in s3 config")
+        if s3_config.get("multipart_threshold_mb", 0) < 0:
+            valid_config = False
+            self.logger.error(f"data access factory {self.cli_arg_prefix}: Negative multipart threshold in s3 config")
+        if s3_config.get("part_size_mb", 8) < 5:
+            valid_config = False
+            self.logger.error(f"data access factory {self.cli_arg_prefix}: Part size in s3 config is less then 5MB")
+        if s3_config.get("max_concurrency", 8) < 1:
+            valid_config = False
+            self.logger.error(f"data access factory {self.cli_arg_prefix}: Non positive max concurrency in s3 config")
         return valid_config
@@ -13,6 +13,7 @@
 import gzip
 import json
 import os
+import uuid
 from pathlib import Path
 from typing import Any
 
@@ -39,6 +40,9 @@ class DataAccessLocal(DataAccess):
         n_samples: int = -1,
         files_to_use: list[str] = [".parquet"],
         files_to_checkpoint: list[str] = [".parquet"],
+        manifest: str = None,
+        checkpoint_markers: str = None,
+        manifest_refresh: str = "full",
     ):
         """
         Create data access class for folder based configuration
@@ -49,15 +53,23 @@ class DataAccessLocal(DataAccess):
         :param n_samples: amount of files to randomly sample
         :param files_to_use: files extensions of files to include
         :param files_to_checkpoint: files extensions of files to use for checkpointing
+        :param manifest: optional location of the input folder manifest
+        :param checkpoint_markers: optional folder for completion markers
+        :param manifest_refresh: manifest refresh mode - full, incremental or none
         """
         super().__init__(d_sets=d_sets, checkpoint=checkpoint, m_files=m_files, n_samples=n_samples,
-                         files_to_use=files_to_use, files_to_checkpoint=files_to_checkpoint)
+                         files_to_use=files_to_use, files_to_checkpoint=files_to_checkpoint, manifest=manifest,
+                         checkpoint_markers=checkpoint_markers, manifest_refresh=manifest_refresh)
         if local_config is None:
             self.input_folder = None
             self.output_folder = None
         else:
             self.input_folder = os.path.abspath(local_config["input_folder"])
             self.output_folder = os.path.abspath(local_config["output_folder"])
+        if manifest is not None:
+            self.manifest = os.path.abspath(manifest)
+        if checkpoint_markers is not None:
+            self.checkpoint_markers = os.path.abspath(checkpoint_markers)
 
         logger.debug(f"Local input folder: {self.input_folder}")
         logger.debug(f"Local output folder: {self.output_folder}")
@@ -82,10 +94,11 @@ class DataAccessLocal(DataAccess):
         """
         return self.input_folder
 
-    def _list_files_folder(self, path: str) -> tuple[list[dict[str, Any]], int]:
+    def _list_files_folder(self, path: str, start_after: str = None) -> tuple[list[dict[str, Any]], int]:
         """
         Get files for a given folder and all sub folders
         :param path: path
+        :param start_after: optional file name. If defined only files with names after it are returned
         :return: List of files
         """
         files = sorted(Path(path).rglob("*"))
@@ -93,9 +106,21 @@ class DataAccessLocal(DataAccess):
         for file in files:
             if file.is_dir():
                 continue
-            res.append({"name": str(file), "size": file.stat().st_size})
+            name = str(file)
+            if start_after is not None and name <= start_after:
+                continue
+            stat = file.stat()
+            res.append({"name": name, "size": stat.st_size, "etag": "", "mtime": stat.st_mtime})
         return res, 0
 
+    def _file_exists(self, path: str) -> tuple[bool, int]:
+        """
+        Check whether the file exists
+        :param path: file path
+        :return: True if the file exists, False otherwise and number of retries
+        """
+        return os.path.isfile(path), 0
+
     def _get_folders_to_use(self) -> tuple[list[str], int]:
         """
         convert data sets to a list of folders to use
@@ -112,19 +137,25 @@ class DataAccessLocal(DataAccess):
                         break
         return folders_to_use, 0
 
-    def get_table(self, path: str) -> tuple[pa.table, int]:
+    def get_table(
+        self, path: str, columns: list[str] = None, row_groups: list[int] = None
+    ) -> tuple[pa.table, int]:
         """
-        Attempts to read a PyArrow table from the given path.
+        Attempts to read a PyArrow table from the given path. The file is memory mapped, so that
+        only the pages containing the requested columns and row groups are actually read.
 
         Args:
             path (str): Path to the file containing the table.
+            columns (list[str]): optional list of columns to read, all columns if None.
+            row_groups (list[int]): optional list of row group indexes to read, all row groups if None.
 
         Returns:
             pyarrow.Table: PyArrow table if read successfully, None otherwise.
         """
 
         try:
-            table = pq.read_table(path)
+            with pa.memory_map(path, "r") as source:
+                table = self._read_parquet(source=source, columns=columns, row_groups=row_groups)
             return table, 0
         except (FileNotFoundError, IOError, pa.ArrowException) as e:
             logger.error(f"Error reading table from {path}: {e}")
@@ -213,6 +244,29 @@ class DataAccessLocal(DataAccess):
             logger.error(f"Error reading file {path}: {e}")
             raise e
 
+    def get_buffer(self, path: str) -> tuple[pa.Buffer | bytes, int]:
+        """
+        Gets the contents of a file as a memory mapped pyarrow buffer. No data is copied here,
+        the content is read directly from the page cache when it is accessed.
+        Compressed (gz) files can not be mapped and are read using get_file.
+
+        Args:
+            path (str): The path to the file.
+
+        Returns:
+            pa.Buffer: The contents of the file as a zero-copy buffer.
+        """
+        if path.endswith(".gz"):
+            return self.get_file(path)
+        try:
+            # buffer keeps the mapping alive after the file is closed
+            with pa.memory_map(path, "r") as f:
+                data = f.read_buffer()
+            return data, 0
+        except FileNotFoundError as e:
+            logger.error(f"Error reading file {path}: {e}")
+            raise e
+
     def save_file(self, path: str, data: bytes) -> tuple[dict[str, Any], int]:
         """
         Saves bytes to a file and returns a dictionary with file information.
@@ -236,3 +290,44 @@ class DataAccessLocal(DataAccess):
         except Exception as e:
             logger.error(f"Error saving bytes to file {path}: {e}")
             return None, 0
+
+    def _save_file_atomic(self, path: str, data: bytes) -> tuple[dict[str, Any], int]:
+        """
+        Saves bytes to a temporary file in the same folder and renames it to the target file,
+        so that readers never see a partially written file.
+
+        Args:
+            path (str): The full name of the file to save.
+            data (bytes): The bytes data to save.
+
+        Returns:
+            dict or None: A dictionary with "name" and "size" keys if successful,
+                        or None if saving fails.
+        """
+        temp_path = f"{path}.{uuid.uuid4()}.tmp"
+        file_info, _ = self.save_file(path=temp_path, data=data)
+        if file_info is None:
+            return None, 0
+        try:
+            os.replace(temp_path, path)
+            return {"name": path, "size": file_info["size"]}, 0
+        except Exception as e:
+            logger.error(f"Error renaming file {temp_path} to {path}: {e}")
+            self.delete_file(temp_path)
+            return None, 0
+
+    def delete_file(self, path: str) -> int:
+        """
+        Deletes a file.
+
+        Args:
+            path (str): The full name of the file to delete.
+
+        Returns:
+            int: number of retries, always 0. Failures are logged.
+        """
+        try:
+            os.remove(path)
+        except Exception as e:
+            logger.error(f"Error deleting file {path}: {e}")
+        return 0
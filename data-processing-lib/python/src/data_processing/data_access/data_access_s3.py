@@ -15,8 +15,9 @@ import json
 from typing import Any
 
 import pyarrow
+import pyarrow.parquet
 from data_processing.data_access import ArrowS3, DataAccess
-from data_processing.utils import TransformUtils
+from data_processing.utils import MB, TransformUtils
 
 
 class DataAccessS3(DataAccess):
@@ -34,20 +35,28 @@ class DataAccessS3(DataAccess):
         n_samples: int = -1,
         files_to_use: list[str] = [".parquet"],
         files_to_checkpoint: list[str] = [".parquet"],
+        manifest: str = None,
+        checkpoint_markers: str = None,
+        manifest_refresh: str = "full",
     ):
         """
         Create data access class for folder based configuration
         :param s3_credentials: dictionary of cos credentials
-        :param s3_config: dictionary of path info
+        :param s3_config: dictionary of path info and optional transfer settings - multipart_threshold_mb,
+                          part_size_mb and max_concurrency
         :param d_sets list of the data sets to use
         :param checkpoint: flag to return only files that do not exist in the output directory
         :param m_files: max amount of files to return
         :param n_samples: amount of files to randomly sample
         :param files_to_use: files extensions of files to include
         :param files_to_checkpoint: files extensions of files to use for checkpointing
+        :param manifest: optional location of the input folder manifest
+        :param checkpoint_markers: optional folder for completion markers
+        :param manifest_refresh: manifest refresh mode - full, incremental or none
         """
         super().__init__(d_sets=d_sets, checkpoint=checkpoint, m_files=m_files, n_samples=n_samples,
-                         files_to_use=files_to_use, files_to_checkpoint=files_to_checkpoint)
+                         files_to_use=files_to_use, files_to_checkpoint=files_to_checkpoint, manifest=manifest,
+                         checkpoint_markers=checkpoint_markers, manifest_refresh=manifest_refresh)
         if (
             s3_credentials is None
             or s3_credentials.get("access_key", None) is None
@@ -56,6 +65,7 @@ class DataAccessS3(DataAccess):
             raise "S3 credentials is not defined"
         self.s3_credentials = s3_credentials
         if s3_config is None:
+            s3_config = {}
             self.input_folder = None
             self.output_folder = None
         else:
@@ -66,6 +76,9 @@ class DataAccessS3(DataAccess):
             secret_key=s3_credentials.get("secret_key"),
             endpoint=s3_credentials.get("url", None),
             region=s3_credentials.get("region", None),
+            multipart_threshold=int(s3_config.get("multipart_threshold_mb", 0) * MB),
+            part_size=int(s3_config.get("part_size_mb", 8) * MB),
+            max_concurrency=s3_config.get("max_concurrency", 8),
         )
 
     def get_output_folder(self) -> str:
@@ -82,18 +95,28 @@ class DataAccessS3(DataAccess):
         """
         return self.input_folder
 
-    def _list_files_folder(self, path: str) -> tuple[list[dict[str, Any]], int]:
+    def _list_files_folder(self, path: str, start_after: str = None) -> tuple[list[dict[str, Any]], int]:
         """
         Get files for a given folder and all sub folders
         :param path: path
+        :param start_after: optional file name. If defined only files with names after it are returned
         :return: List of files
         """
         try:
-            return self.arrS3.list_files(key=path)
+            return self.arrS3.list_files(key=path, start_after=start_after)
         except Exception as e:
             self.logger.error(f"Error listing S3 files for path {path} - {e}")
             return [], 0
 
+    def _file_exists(self, path: str) -> tuple[bool, int]:
+        """
+        Check whether the file exists
+        :param path: file path
+        :return: True if the file exists, False otherwise and number of retries
+        """
+        files, retries = self._list_files_folder(path=path)
+        return any(file["name"] == path for file in files), retries
+
     def _get_folders_to_use(self) -> tuple[list[str], int]:
         """
         convert data sets to a list of folders to use
@@ -114,14 +137,24 @@ class DataAccessS3(DataAccess):
                     break
         return folders_to_use, retries
 
-    def get_table(self, path: str) -> tuple[pyarrow.table, int]:
+    def get_table(
+        self, path: str, columns: list[str] = None, row_groups: list[int] = None
+    ) -> tuple[pyarrow.table, int]:
         """
         Get pyArrow table for a given path
         :param path - file path
+        :param columns - optional list of columns to read. If None, all columns are read
+        :param row_groups - optional list of row group indexes to read. If None, all row groups are read
         :return: pyArrow table or None, if the table read failed and number of retries
         """
         try:
-            return self.arrS3.read_table(path)
+            if columns is None and row_groups is None:
+                return self.arrS3.read_table(path)
+            data, retries = self.arrS3.read_file(path)
+            if data is None:
+                return None, retries
+            table = self._read_parquet(source=pyarrow.BufferReader(data), columns=columns, row_groups=row_groups)
+            return table, retries
         except Exception as e:
             self.logger.error(f"Exception reading table {path} from S3 - {e}")
             return None, 0
@@ -181,6 +214,34 @@ class DataAccessS3(DataAccess):
             filedata = gzip.decompress(filedata)
         return filedata, retries
 
+    def get_parquet_file(self, path: str) -> tuple[pyarrow.parquet.ParquetFile, int]:
+        """
+        Open a parquet file for reading of its metadata and of selected row groups and columns.
+        Only the parts of the file that are actually read are fetched, using ranged GETs
+        :param path: file path
+        :return: parquet file or None, if the file can not be read and number of retries
+        """
+        try:
+            source, retries = self.arrS3.open_file(path)
+            if source is None:
+                return None, retries
+            return pyarrow.parquet.ParquetFile(pyarrow.PythonFile(source, mode="r")), retries
+        except Exception as e:
+            self.logger.error(f"Exception opening parquet file {path} - {e}")
+            return None, 0
+
+    def delete_file(self, path: str) -> int:
+        """
+        Delete file
+        :param path: file path
+        :return: number of retries
+        """
+        try:
+            return self.arrS3.delete_file(key=path)
+        except Exception as e:
+            self.logger.error(f"Exception deleting file {path} - {e}")
+            return 0
+
     def save_file(self, path: str, data: bytes) -> tuple[dict[str, Any], int]:
         """
         Save byte array to the file
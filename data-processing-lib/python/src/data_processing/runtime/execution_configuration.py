@@ -12,6 +12,7 @@
 
 import argparse
 import ast
+from typing import Any
 
 from data_processing.utils import CLIArgumentProvider, ParamsUtils, get_logger
 
@@ -38,6 +39,8 @@ class TransformExecutionConfiguration(CLIArgumentProvider):
         self.code_location = {}
         self.name = name
         self.print_params = print_params
+        self.prefetch_depth = 0
+        self.write_behind_depth = 0
 
     def add_input_params(self, parser: argparse.ArgumentParser) -> None:
         """
@@ -59,6 +62,18 @@ class TransformExecutionConfiguration(CLIArgumentProvider):
             default=None,
             help="AST string containing code location\n" + ParamsUtils.get_ast_help_text(help_example_dict),
         )
+        parser.add_argument(
+            f"--{runtime_cli_prefix}prefetch_depth",
+            type=int,
+            default=0,
+            help="number of input files that are read in the background, while the current file is transformed",
+        )
+        parser.add_argument(
+            f"--{runtime_cli_prefix}write_behind_depth",
+            type=int,
+            default=0,
+            help="maximum number of output files that are written in the background. 0 - write synchronously",
+        )
 
     def apply_input_params(self, args: argparse.Namespace) -> bool:
         """
@@ -76,9 +91,26 @@ class TransformExecutionConfiguration(CLIArgumentProvider):
             "job id": captured["job_id"],
         }
         self.code_location = captured["code_location"]
+        self.prefetch_depth = captured["prefetch_depth"]
+        self.write_behind_depth = captured["write_behind_depth"]
+        if self.prefetch_depth < 0 or self.write_behind_depth < 0:
+            logger.error(
+                f"prefetch depth {self.prefetch_depth} and write behind depth {self.write_behind_depth} "
+                f"should be non negative"
+            )
+            return False
         # print parameters
         logger.info(f"pipeline id {self.pipeline_id}")
         if self.print_params:
             logger.info(f"job details {self.job_details}")
         logger.info(f"code location {self.code_location}")
+        if self.prefetch_depth > 0 or self.write_behind_depth > 0:
+            logger.info(f"prefetch depth {self.prefetch_depth}, write behind depth {self.write_behind_depth}")
         return True
+
+    def get_input_params(self) -> dict[str, Any]:
+        """
+        get common input parameters for job_input_params in metadata
+        :return: dictionary of parameters
+        """
+        return {"prefetch depth": self.prefetch_depth, "write behind depth": self.write_behind_depth}
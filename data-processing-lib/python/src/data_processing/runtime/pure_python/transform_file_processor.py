@@ -30,6 +30,8 @@ class PythonTransformFileProcessor(AbstractTransformFileProcessor):
         transform_params: dict[str, Any],
         transform_class: type[AbstractTransform],
         is_folder: bool,
+        prefetch_depth: int = 0,
+        write_behind_depth: int = 0,
     ):
         """
         Init method
@@ -38,12 +40,16 @@ class PythonTransformFileProcessor(AbstractTransformFileProcessor):
         :param transform_params - transform parameters
         :param transform_class: transform class
         :param is_folder: folder transform flag
+        :param prefetch_depth: number of files to read in the background
+        :param write_behind_depth: max number of files written in the background
         """
         # invoke superclass
         super().__init__(
             data_access_factory=data_access_factory,
             transform_parameters=dict(transform_params),
             is_folder=is_folder,
+            prefetch_depth=prefetch_depth,
+            write_behind_depth=write_behind_depth,
         )
         self.transform_params["statistics"] = statistics
         # Create local processor
@@ -61,7 +67,8 @@ class PythonTransformFileProcessor(AbstractTransformFileProcessor):
 
 class PythonPoolTransformFileProcessor(AbstractTransformFileProcessor):
     """
-    This is the class implementing the worker class processing of a single file
+    This is the class implementing the worker class processing of a single file. A single instance is
+    created in every pool process and used for all of the files processed by it
     """
 
     def __init__(
@@ -69,7 +76,8 @@ class PythonPoolTransformFileProcessor(AbstractTransformFileProcessor):
         data_access_factory: DataAccessFactoryBase,
         transform_params: dict[str, Any],
         transform_class: type[AbstractTransform],
-        is_folder: bool
+        is_folder: bool,
+        write_behind_depth: int = 0,
     ):
         """
         Init method
@@ -77,11 +85,13 @@ class PythonPoolTransformFileProcessor(AbstractTransformFileProcessor):
         :param transform_params - transform parameters
         :param transform_class: transform class
         :param is_folder: folder tranform flag
+        :param write_behind_depth: max number of files written in the background
         """
         super().__init__(
             data_access_factory=data_access_factory,
             transform_parameters=dict(transform_params),
             is_folder=is_folder,
+            write_behind_depth=write_behind_depth,
         )
         # Add data access and statistics to the processor parameters
         self.transform_params["data_access"] = self.data_access
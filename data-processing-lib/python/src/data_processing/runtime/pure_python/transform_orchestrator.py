@@ -14,7 +14,8 @@ import time
 import traceback
 import psutil
 from datetime import datetime
-from multiprocessing import Pool
+from multiprocessing import Barrier, Pool
+from threading import BrokenBarrierError
 from typing import Any
 
 from data_processing.data_access import DataAccessFactoryBase
@@ -30,6 +31,12 @@ from data_processing.utils import GB, get_logger
 
 logger = get_logger(__name__)
 
+# file processor of the pool worker process and the barrier synchronizing flushes, see _init_pool_worker
+_pool_processor: PythonPoolTransformFileProcessor = None
+_pool_flush_barrier: Barrier = None
+# max time (sec) a worker waits on the flush barrier for the rest of the workers to flush
+flush_barrier_timeout = 3600
+
 
 def _execution_resources() -> dict[str, Any]:
     """
@@ -96,6 +103,7 @@ def orchestrate(
             # using multiprocessor pool for execution
             statistics = _process_transforms_multiprocessor(
                 files=files,
+                file_sizes=data_access.get_input_file_sizes(),
                 size=execution_config.num_processors,
                 data_access_factory=data_access_factory,
                 print_interval=print_interval,
@@ -104,6 +112,7 @@ def orchestrate(
                 ),
                 transform_class=runtime_config.get_transform_class(),
                 is_folder=is_folder,
+                write_behind_depth=execution_config.write_behind_depth,
             )
         else:
             # using sequential execution
@@ -117,6 +126,8 @@ def orchestrate(
                 ),
                 transform_class=runtime_config.get_transform_class(),
                 is_folder=is_folder,
+                prefetch_depth=execution_config.prefetch_depth,
+                write_behind_depth=execution_config.write_behind_depth,
             )
         status = "success"
         return_code = 0
@@ -166,6 +177,8 @@ def _process_transforms(
     transform_params: dict[str, Any],
     transform_class: type[AbstractTransform],
     is_folder: bool,
+    prefetch_depth: int = 0,
+    write_behind_depth: int = 0,
 ) -> None:
     """
     Process transforms sequentially
@@ -176,6 +189,8 @@ def _process_transforms(
     :param transform_params - transform parameters
     :param transform_class: transform class
     :param is_folder: folder transform flag
+    :param prefetch_depth: number of files to read in the background
+    :param write_behind_depth: max number of files written in the background
     :return: metadata for the execution
     """
     # create executor
@@ -185,11 +200,15 @@ def _process_transforms(
         transform_params=transform_params,
         transform_class=transform_class,
         is_folder=is_folder,
+        prefetch_depth=prefetch_depth,
+        write_behind_depth=write_behind_depth,
     )
     # process data
     t_start = time.time()
     completed = 0
-    for path in files:
+    for index, path in enumerate(files):
+        # read next files while processing the current one
+        executor.prefetch(files[index: index + 1 + prefetch_depth])
         executor.process_file(path)
         completed += 1
         if completed % print_interval == 0:
@@ -204,6 +223,50 @@ def _process_transforms(
     logger.info(f"done flushing in {round(time.time() - start, 3)} sec")
 
 
+def _init_pool_worker(processor_params: dict[str, Any], flush_barrier: Barrier) -> None:
+    """
+    Pool worker initializer. Creates the file processor, used for all the files processed by this worker,
+    so that transform is created once per worker and its buffered state is preserved till the flush
+    :param processor_params: parameters of the PythonPoolTransformFileProcessor
+    :param flush_barrier: barrier, shared by all the workers, used for flushing
+    :return: None
+    """
+    global _pool_processor, _pool_flush_barrier
+    _pool_processor = PythonPoolTransformFileProcessor(**processor_params)
+    _pool_flush_barrier = flush_barrier
+
+
+def _pool_process_file(f_name: str) -> dict[str, Any]:
+    """
+    Process file by the worker's processor
+    :param f_name: file name
+    :return: execution statistics
+    """
+    return _pool_processor.process_file(f_name=f_name)
+
+
+def _pool_flush(index: int) -> dict[str, Any]:
+    """
+    Flush worker's processor. After flushing, the worker waits on the barrier until all the workers
+    flushed, so that it can not pick up another flush task. As a result, when the number of
+    flush tasks is equal to the number of workers, every worker is flushed exactly once.
+    A worker, whose flush failed, still waits on the barrier, so that the other workers are not blocked,
+    and then raises the flush exception. The wait is limited by flush_barrier_timeout
+    :param index: flush task index
+    :return: execution statistics
+    """
+    try:
+        stats = _pool_processor.flush()
+    except Exception:
+        try:
+            _pool_flush_barrier.wait(timeout=flush_barrier_timeout)
+        except BrokenBarrierError:
+            pass
+        raise
+    _pool_flush_barrier.wait(timeout=flush_barrier_timeout)
+    return stats
+
+
 def _process_transforms_multiprocessor(
     files: list[str],
     size: int,
@@ -211,10 +274,13 @@ def _process_transforms_multiprocessor(
     data_access_factory: DataAccessFactoryBase,
     transform_params: dict[str, Any],
     transform_class: type[AbstractTransform],
-    is_folder: bool
+    is_folder: bool,
+    file_sizes: dict[str, int] = None,
+    write_behind_depth: int = 0,
 ) -> TransformStatistics:
     """
-    Process transforms using multiprocessing pool
+    Process transforms using multiprocessing pool. Files are handed out to the workers one at a time,
+    largest first, so that a worker that is done picks up the next file and the long tail of big files is avoided
     :param files: list of files to process
     :param size: pool size
     :param print_interval: print interval
@@ -222,23 +288,27 @@ def _process_transforms_multiprocessor(
     :param transform_params - transform parameters
     :param transform_class: transform class
     :param is_folder: folder transform class
+    :param file_sizes: optional dictionary of file sizes, used for ordering of files
+    :param write_behind_depth: max number of files written in the background by every worker
     :return: metadata for the execution
     """
     # result statistics
     statistics = TransformStatistics()
-    # create processor
-    processor = PythonPoolTransformFileProcessor(
-        data_access_factory=data_access_factory,
-        transform_params=transform_params,
-        transform_class=transform_class,
-        is_folder=is_folder,
-    )
+    if file_sizes is not None and len(file_sizes) > 0:
+        files = sorted(files, key=lambda f: file_sizes.get(f, 0), reverse=True)
+    processor_params = {
+        "data_access_factory": data_access_factory,
+        "transform_params": transform_params,
+        "transform_class": transform_class,
+        "is_folder": is_folder,
+        "write_behind_depth": write_behind_depth,
+    }
     completed = 0
     t_start = time.time()
     # create multiprocessing pool
-    with Pool(processes=size) as pool:
+    with Pool(processes=size, initializer=_init_pool_worker, initargs=(processor_params, Barrier(size))) as pool:
         # execute for every input file
-        for result in pool.imap_unordered(processor.process_file, files):
+        for result in pool.imap_unordered(_pool_process_file, files, chunksize=1):
             completed += 1
             # accumulate statistics
             statistics.add_stats(result)
@@ -249,11 +319,8 @@ def _process_transforms_multiprocessor(
                     f"in {round((time.time() - t_start)/60., 3)} min"
                 )
         logger.info(f"Done processing {completed} files, waiting for flush() completion.")
-        results = [{}] * size
-        # flush
-        for i in range(size):
-            results[i] = pool.apply_async(processor.flush)
-        for s in results:
-            statistics.add_stats(s.get())
+        # flush every worker
+        for stats in pool.map(_pool_flush, range(size), chunksize=1):
+            statistics.add_stats(stats)
     logger.info(f"done flushing in {time.time() - t_start} sec")
     return statistics
@@ -11,9 +11,13 @@
 ################################################################################
 import time
 import traceback
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
 from typing import Any
 
 from data_processing.data_access import DataAccessFactoryBase
+from data_processing.transform import AbstractTableTransform
 from data_processing.utils import TransformUtils, UnrecoverableException, get_logger
 
 
@@ -27,12 +31,16 @@ class AbstractTransformFileProcessor:
         data_access_factory: DataAccessFactoryBase,
         transform_parameters: dict[str, Any],
         is_folder: bool = False,
+        prefetch_depth: int = 0,
+        write_behind_depth: int = 0,
     ):
         """
         Init method
         :param data_access_factory: Data Access Factory
         :param transform_parameters: Transform parameters
         :param is_folder: folder transform flag
+        :param prefetch_depth: max number of input files read in the background, see prefetch()
+        :param write_behind_depth: max number of output files written in the background. 0 - write synchronously
         """
         self.logger = get_logger(__name__)
         # validate parameters
@@ -49,6 +57,49 @@ class AbstractTransformFileProcessor:
         self.transform_params = transform_parameters
         self.transform_params["data_access"] = self.data_access
         self.is_folder = is_folder
+        # background reads and writes. Thread pools are created on first usage
+        self.prefetch_depth = prefetch_depth
+        self.write_behind_depth = write_behind_depth
+        self.prefetched = {}
+        self.pending_writes = deque()
+        self.reader = None
+        self.writer = None
+        # lock serializing transform execution, used by processors executing several requests concurrently
+        self.transform_lock = None
+        # completion markers - source files, whose outputs were written, are recorded by data access in batches
+        self.current_file = None
+        self.completed_files = []
+        self.failed_sources = set()
+        self.markers_batch_size = 100
+
+    def prefetch(self, f_names: list[str]) -> None:
+        """
+        Start reading files, that are going to be processed next, in the background. At most prefetch_depth
+        files are read ahead of the file being processed, the rest of the names is ignored. Prefetched files
+        are used by process_file.
+        :param f_names: names of the file to be processed and the ones following it, in order of processing
+        :return: None
+        """
+        if self.prefetch_depth <= 0 or self.is_folder:
+            return
+        for f_name in f_names:
+            if len(self.prefetched) > self.prefetch_depth:
+                break
+            if f_name not in self.prefetched:
+                if self.reader is None:
+                    self.reader = ThreadPoolExecutor(max_workers=self.prefetch_depth, thread_name_prefix="prefetch")
+                self.prefetched[f_name] = self.reader.submit(self._read_file, f_name)
+
+    def _read_file(self, f_name: str) -> tuple[bytes, int]:
+        """
+        Read source file
+        :param f_name: file name
+        :return: file content and number of retries
+        """
+        if isinstance(self.transform, AbstractTableTransform):
+            # table transforms only need a parquet buffer, use zero copy read if supported
+            return self.data_access.get_buffer(path=f_name)
+        return self.data_access.get_file(path=f_name)
 
     def process_file(self, f_name: str) -> None:
         """
@@ -63,7 +114,11 @@ class AbstractTransformFileProcessor:
         t_start = time.time()
         if not self.is_folder:
             # Read source file only if we are processing file
-            filedata, retries = self.data_access.get_file(path=f_name)
+            prefetched = self.prefetched.pop(f_name, None)
+            if prefetched is not None:
+                filedata, retries = prefetched.result()
+            else:
+                filedata, retries = self._read_file(f_name)
             if retries > 0:
                 self._publish_stats({"data access retries": retries})
             if filedata is None:
@@ -72,29 +127,37 @@ class AbstractTransformFileProcessor:
                 return
             self._publish_stats({"source_files": 1, "source_size": len(filedata)})
         # Process input file
-        try:
-            self.logger.debug(f"Begin transforming file {f_name}")
-            if not self.is_folder:
-                # execute local processing
-                out_files, stats = self.transform.transform_binary(file_name=f_name, byte_array=filedata)
-                name_extension = TransformUtils.get_file_extension(f_name)
-                self.last_file_name = name_extension[0]
-                self.last_file_name_next_index = None
-                self.last_extension = name_extension[1]
-            else:
-                out_files, stats = self.transform.transform(folder_name=f_name)
-                self.last_file_name = f_name
-            self.logger.debug(f"Done transforming file {f_name}, got {len(out_files)} files")
-            # save results
-            self._submit_file(t_start=t_start, out_files=out_files, stats=stats)
-        # Process unrecoverable exceptions
-        except UnrecoverableException as _:
-            self.logger.warning(f"Transform has thrown unrecoverable exception processing file {f_name}. Exiting...")
-            raise UnrecoverableException
-        # Process other exceptions
-        except Exception as e:
-            self.logger.warning(f"Exception processing file {f_name}: {traceback.format_exc()}")
-            self._publish_stats({"transform execution exception": 1})
+        with self.transform_lock or nullcontext():
+            self.current_file = f_name
+            try:
+                self.logger.debug(f"Begin transforming file {f_name}")
+                if not self.is_folder:
+                    # execute local processing
+                    out_files, stats = self.transform.transform_binary(file_name=f_name, byte_array=filedata)
+                    name_extension = TransformUtils.get_file_extension(f_name)
+                    self.last_file_name = name_extension[0]
+                    self.last_file_name_next_index = None
+                    self.last_extension = name_extension[1]
+                else:
+                    out_files, stats = self.transform.transform(folder_name=f_name)
+                    self.last_file_name = f_name
+                self.logger.debug(f"Done transforming file {f_name}, got {len(out_files)} files")
+                # save results
+                self._submit_file(t_start=t_start, out_files=out_files, stats=stats)
+                if len(out_files) > 0:
+                    self._mark_completed(f_name)
+            # Process unrecoverable exceptions
+            except UnrecoverableException as _:
+                self.logger.warning(
+                    f"Transform has thrown unrecoverable exception processing file {f_name}. Exiting..."
+                )
+                raise UnrecoverableException
+            # Process other exceptions
+            except Exception as e:
+                self.logger.warning(f"Exception processing file {f_name}: {traceback.format_exc()}")
+                self._publish_stats({"transform execution exception": 1})
+            # publish results of the background writes completed so far
+            self._complete_writes(wait=False)
 
     def flush(self) -> None:
         """
@@ -103,25 +166,78 @@ class AbstractTransformFileProcessor:
         the hook for them to return back locally stored data and their statistics.
         :return: None
         """
-        if self.last_file_name is None or self.is_folder:
-            # for some reason a given worker never processed anything. Happens in testing
-            # when the amount of workers is greater than the amount of files
-            self.logger.debug("skipping flush, no name for file is defined or this is a folder transform")
+        with self.transform_lock or nullcontext():
+            self.current_file = None
+            if self.last_file_name is None or self.is_folder:
+                # for some reason a given worker never processed anything. Happens in testing
+                # when the amount of workers is greater than the amount of files
+                self.logger.debug("skipping flush, no name for file is defined or this is a folder transform")
+            else:
+                try:
+                    t_start = time.time()
+                    # get flush results
+                    self.logger.debug(
+                        f"Begin flushing transform, last file name {self.last_file_name}, "
+                        f"last index {self.last_file_name_next_index}"
+                    )
+                    out_files, stats = self.transform.flush_binary()
+                    self.logger.debug(f"Done flushing transform, got {len(out_files)} files")
+                    # Here we are using the name of the last file, that we were processing
+                    self._submit_file(t_start=t_start, out_files=out_files, stats=stats)
+                except Exception as e:
+                    self.logger.warning(f"Exception {e} flushing: {traceback.format_exc()}")
+                    self._publish_stats({"transform execution exception": 1})
+            # wait for all the background writes, including the flushed ones
+            self._complete_writes(wait=True)
+            self._save_markers()
+            # flush completes processing, release the background threads
+            self._shutdown_executors()
+
+    def _shutdown_executors(self) -> None:
+        """
+        Shut down the background read and write thread pools. Reads of prefetched files, that were not
+        processed, are cancelled. The pools are created again, if the processor is used after the shutdown
+        :return: None
+        """
+        for prefetched in self.prefetched.values():
+            prefetched.cancel()
+        self.prefetched = {}
+        if self.reader is not None:
+            self.reader.shutdown(wait=True)
+            self.reader = None
+        if self.writer is not None:
+            self.writer.shutdown(wait=True)
+            self.writer = None
+
+    def _mark_completed(self, f_name: str) -> None:
+        """
+        Record source file as completed. Completion markers are saved in batches, once all of
+        the outputs of the files in the batch are written
+        :param f_name: source file name
+        :return: None
+        """
+        if self.is_folder or self.data_access.checkpoint_markers is None:
             return
-        try:
-            t_start = time.time()
-            # get flush results
-            self.logger.debug(
-                f"Begin flushing transform, last file name {self.last_file_name}, "
-                f"last index {self.last_file_name_next_index}"
-            )
-            out_files, stats = self.transform.flush_binary()
-            self.logger.debug(f"Done flushing transform, got {len(out_files)} files")
-            # Here we are using the name of the last file, that we were processing
-            self._submit_file(t_start=t_start, out_files=out_files, stats=stats)
-        except Exception as e:
-            self.logger.warning(f"Exception {e} flushing: {traceback.format_exc()}")
-            self._publish_stats({"transform execution exception": 1})
+        self.completed_files.append(f_name)
+        if len(self.completed_files) >= self.markers_batch_size:
+            self._save_markers()
+
+    def _save_markers(self) -> None:
+        """
+        Save completion markers for the completed files, skipping the ones with failed writes
+        :return: None
+        """
+        if len(self.completed_files) == 0:
+            return
+        self._complete_writes(wait=True)
+        completed = [f_name for f_name in self.completed_files if f_name not in self.failed_sources]
+        self.completed_files = []
+        self.failed_sources = set()
+        save_res, retries = self.data_access.save_completion_markers(f_names=completed)
+        if retries > 0:
+            self._publish_stats({"data access retries": retries})
+        if save_res is None:
+            self.logger.warning(f"Failed to save completion markers for {len(completed)} files")
 
     def _submit_file(self, t_start: float, out_files: list[tuple[bytes, str]], stats: dict[str, Any]) -> None:
         """
@@ -163,12 +279,7 @@ class AbstractTransformFileProcessor:
                 self.logger.debug(
                     f"Writing transformed file {self.last_file_name}{self.last_extension} to {output_name}"
                 )
-                save_res, retries = self.data_access.save_file(path=output_name, data=dt)
-                if retries > 0:
-                    self._publish_stats({"data access retries": retries})
-                if save_res is None:
-                    self.logger.warning(f"Failed to write file {output_name}")
-                    self._publish_stats({"failed_writes": 1})
+                self._save_file(path=output_name, data=dt)
                 # Store execution statistics. Doing this async
                 self._publish_stats(
                     {
@@ -204,12 +315,7 @@ class AbstractTransformFileProcessor:
                         )
                         dt = file_ext[0]
                     file_sizes += len(dt)
-                    save_res, retries = self.data_access.save_file(path=output_name_indexed, data=dt)
-                    if retries > 0:
-                        self._publish_stats({"data access retries": retries})
-                    if save_res is None:
-                        self.logger.warning(f"Failed to write file {output_name_indexed}")
-                        self._publish_stats({"failed_writes": 1})
+                    if not self._save_file(path=output_name_indexed, data=dt):
                         break
                 self.last_file_name_next_index = start_index + count
                 self._publish_stats(
@@ -223,6 +329,69 @@ class AbstractTransformFileProcessor:
         if len(stats) > 0:
             self._publish_stats(stats)
 
+    def _save_file(self, path: str, data: bytes) -> bool:
+        """
+        Save output file. If write behind is enabled, the file is written in the background and the
+        result of the write is published by _complete_writes(). When write_behind_depth writes are
+        already in progress, this method waits for the oldest one to complete (backpressure).
+        :param path: output file path
+        :param data: file content
+        :return: False if the write is known to fail, True otherwise
+        """
+        if self.write_behind_depth <= 0:
+            save_res, retries = self.data_access.save_file(path=path, data=data)
+            return self._publish_write(path=path, save_res=save_res, retries=retries, source=self.current_file)
+        while len(self.pending_writes) >= self.write_behind_depth:
+            self._complete_write(*self.pending_writes.popleft())
+        if self.writer is None:
+            self.writer = ThreadPoolExecutor(max_workers=self.write_behind_depth, thread_name_prefix="write_behind")
+        future = self.writer.submit(self.data_access.save_file, path=path, data=data)
+        self.pending_writes.append((path, future, self.current_file))
+        return True
+
+    def _complete_writes(self, wait: bool) -> None:
+        """
+        Publish results of the background writes, in order of their submission
+        :param wait: if True, wait for all of the writes to complete, otherwise only process the completed ones
+        :return: None
+        """
+        while len(self.pending_writes) > 0 and (wait or self.pending_writes[0][1].done()):
+            self._complete_write(*self.pending_writes.popleft())
+
+    def _complete_write(self, path: str, future: Future, source: str) -> None:
+        """
+        Wait for the background write and publish its result
+        :param path: output file path
+        :param future: future of the data access save_file invocation
+        :param source: source file name, None for the flushed files
+        :return: None
+        """
+        try:
+            save_res, retries = future.result()
+        except Exception as e:
+            self.logger.warning(f"Exception writing file {path}: {e}")
+            save_res, retries = None, 0
+        self._publish_write(path=path, save_res=save_res, retries=retries, source=source)
+
+    def _publish_write(self, path: str, save_res: dict[str, Any], retries: int, source: str) -> bool:
+        """
+        Publish statistics for the file write
+        :param path: output file path
+        :param save_res: result of the save_file
+        :param retries: number of retries
+        :param source: source file name, None for the flushed files
+        :return: True if the write succeeded
+        """
+        if retries > 0:
+            self._publish_stats({"data access retries": retries})
+        if save_res is None:
+            self.logger.warning(f"Failed to write file {path}")
+            self._publish_stats({"failed_writes": 1})
+            if source is not None:
+                self.failed_sources.add(source)
+            return False
+        return True
+
     def _publish_stats(self, stats: dict[str, Any]) -> None:
         """
         Publishing execution statistics
@@ -20,6 +20,7 @@ from data_processing.runtime.pure_python.runtime_configuration import (
     PythonTransformRuntimeConfiguration,
 )
 from data_processing.transform import AbstractTableTransform, TransformConfiguration, AbstractTransform
+from data_processing.transform.table_transform import streaming_batch_size_key
 from data_processing.utils import CLIArgumentProvider, get_logger
 
 
@@ -31,6 +32,7 @@ sleep_key = "sleep_sec"
 pwd_key = "pwd"
 sleep_cli_param = f"{cli_prefix}{sleep_key}"
 pwd_cli_param = f"{cli_prefix}{pwd_key}"
+streaming_batch_size_cli_param = f"{cli_prefix}{streaming_batch_size_key}"
 
 
 class NOOPTransform(AbstractTableTransform):
@@ -49,6 +51,8 @@ class NOOPTransform(AbstractTableTransform):
         # of NOOPTransformConfiguration class
         super().__init__(config)
         self.sleep = config.get("sleep_sec", 1)
+        # file processed in the streaming mode, used to count files in transform_batch()
+        self.streamed_file = None
 
     def transform(self, table: pa.Table, file_name: str = None) -> tuple[list[pa.Table], dict[str, Any]]:
         """
@@ -67,6 +71,21 @@ class NOOPTransform(AbstractTableTransform):
         metadata = {"nfiles": 1, "nrows": len(table)}
         return [table], metadata
 
+    def transform_batch(
+        self, batch: pa.RecordBatch, file_name: str = None
+    ) -> tuple[list[pa.RecordBatch], dict[str, Any]]:
+        """
+        Streaming version of transform(), used when streaming batch size is specified.
+        Sleep is not applied here, as it is defined per file and not per batch.
+        """
+        logger.debug(f"Transforming one batch with {batch.num_rows} rows")
+        metadata = {"nrows": batch.num_rows}
+        if file_name != self.streamed_file:
+            # first batch of the file
+            self.streamed_file = file_name
+            metadata["nfiles"] = 1
+        return [batch], metadata
+
 
 class NOOPTransformConfiguration(TransformConfiguration):
 
@@ -104,6 +123,12 @@ class NOOPTransformConfiguration(TransformConfiguration):
             default="nothing",
             help="A dummy password which should be filtered out of the metadata",
         )
+        parser.add_argument(
+            f"--{streaming_batch_size_cli_param}",
+            type=int,
+            default=0,
+            help="If positive, process files in streaming mode, reading this many rows at a time",
+        )
 
     def apply_input_params(self, args: Namespace) -> bool:
         """
@@ -12,15 +12,35 @@
 
 from typing import Any
 
+import numpy as np
 import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 from data_processing.transform import AbstractBinaryTransform
 from data_processing.utils import TransformUtils
 
 
+streaming_batch_size_key = "streaming_batch_size"
+input_columns_key = "input_columns"
+# column added to projected tables, to be able to restore the columns not read by the transform
+row_index_column = "__dpk_row_index"
+
+
 class AbstractTableTransform(AbstractBinaryTransform):
     """
     Extends AbstractBinaryTransform to expect the byte arrays from to contain a pyarrow Table.
     Sub-classes are expected to implement transform() on the parsed Table instances.
+    Sub-classes can additionally implement transform_batch() to support streaming execution. In this mode,
+    enabled by setting streaming_batch_size in the configuration, the input file is read and transformed
+    one record batch at a time and the results are written incrementally to a single output file, so that
+    the amount of decoded data in memory depends on the batch size rather than the file size. The input file
+    and the encoded (compressed) output file are still held in memory as byte arrays, see
+    _transform_binary_streaming().
+    If the configuration contains input_columns (see TransformConfiguration.get_input_columns()), only these
+    columns are passed to transform() or transform_batch(). The remaining columns are restored in the output
+    tables based on the row index column, which the transform must preserve. As a result, projection can not
+    be used by transforms that create new rows or buffer tables for flush(). The remaining columns are still
+    decoded and re-encoded for the rows in the output, so projection only pays off for transforms filtering rows.
     """
 
     def __init__(self, config: dict[str, Any]):
@@ -31,6 +51,8 @@ class AbstractTableTransform(AbstractBinaryTransform):
 
         super().__init__(config)
         self.logger = get_logger(__name__)
+        self.streaming_batch_size = config.get(streaming_batch_size_key, 0)
+        self.input_columns = config.get(input_columns_key, None)
 
     def transform_binary(self, file_name: str, byte_array: bytes) -> tuple[list[tuple[bytes, str]], dict[str, Any]]:
         """
@@ -46,6 +68,10 @@ class AbstractTableTransform(AbstractBinaryTransform):
         if TransformUtils.get_file_extension(file_name)[1] != ".parquet":
             self.logger.warning(f"Get wrong file type {file_name}")
             return [], {"wrong file type": 1}
+        if self._is_streaming():
+            return self._transform_binary_streaming(file_name=file_name, byte_array=byte_array)
+        if self.input_columns is not None:
+            return self._transform_binary_projected(file_name=file_name, byte_array=byte_array)
         # convert to table
         table = TransformUtils.convert_binary_to_arrow(data=byte_array)
         if table is None:
@@ -75,6 +101,21 @@ class AbstractTableTransform(AbstractBinaryTransform):
         """
         raise NotImplemented("This method must be implemented by the subclass")
 
+    def transform_batch(
+        self, batch: pa.RecordBatch, file_name: str = None
+    ) -> tuple[list[pa.Table | pa.RecordBatch], dict[str, Any]]:
+        """
+        Converts a single record batch of the input file. This method is only used in the streaming mode, see
+        streaming_batch_size. All returned tables (batches) are appended to the same output file, which
+        requires them to share the same schema.
+        If there is an error, an exception must be raised - exit()ing is not generally allowed.
+        :param batch: input record batch
+        :param file_name: the file name of the file containing the given batch.
+        :return: a tuple of a list of 0 or more converted tables (batches) and a dictionary of statistics that
+        will be propagated to metadata
+        """
+        raise NotImplementedError("Streaming is not supported by this transform")
+
     def flush_binary(self) -> tuple[list[tuple[bytes, str]], dict[str, Any]]:
         """
         This is supporting method for transformers, that implement buffering of tables, for example coalesce.
@@ -100,6 +141,216 @@ class AbstractTableTransform(AbstractBinaryTransform):
         """
         return [], {}
 
+    def _is_streaming(self) -> bool:
+        """
+        Check whether streaming execution is requested and supported by the transform
+        :return: True if the transform should be executed one record batch at a time
+        """
+        if self.streaming_batch_size is None or self.streaming_batch_size <= 0:
+            return False
+        if type(self).transform_batch is AbstractTableTransform.transform_batch:
+            self.logger.warning(
+                f"{type(self).__name__} does not implement transform_batch(), ignoring streaming batch size"
+            )
+            self.streaming_batch_size = 0
+            return False
+        return True
+
+    def _transform_binary_streaming(
+        self, file_name: str, byte_array: bytes
+    ) -> tuple[list[tuple[bytes, str]], dict[str, Any]]:
+        """
+        Converts input file into 0 or 1 output files, reading, transforming and writing it one record batch
+        at a time. Only one batch is decoded at a time, but as transform_binary() gets and returns byte arrays,
+        the input file and the encoded output file are held in memory. The peak memory is therefore the size of
+        the input file, plus twice the size of the encoded output (output buffer and its copy to bytes), plus the
+        decoded batch, which is typically much less than the decoded table used by transform().
+        If input columns are defined, only these columns (and the row index column) are passed to
+        transform_batch(). The rest of the columns are read in the batches with the same rows and restored
+        in the output batches, see _transform_binary_projected().
+        :param file_name: the file name of the file containing the given byte_array.
+        :param byte_array: contents of the input file to be transformed.
+        :return: a tuple of a list of 0 or 1 tuples and a dictionary of statistics, see transform_binary()
+        """
+        try:
+            reader = pq.ParquetFile(pa.BufferReader(byte_array))
+        except Exception as e:
+            self.logger.warning(f"Could not open parquet file {file_name} for streaming: {e}")
+            return [], {"failed_reads": 1}
+        source_docs = reader.metadata.num_rows
+        if source_docs == 0:
+            self.logger.warning(f"table is empty, skipping processing")
+            return [], {"skipped empty tables": 1}
+        names = reader.schema_arrow.names
+        columns = None
+        passthrough_batches = None
+        if self.input_columns is not None:
+            # missing columns are reported by the transform itself
+            columns = [name for name in self.input_columns if name in names]
+            passthrough_columns = [name for name in names if name not in columns]
+            if len(passthrough_columns) > 0:
+                # batches of both readers contain the same rows, as they use the same batch size
+                passthrough_batches = reader.iter_batches(
+                    batch_size=self.streaming_batch_size, columns=passthrough_columns
+                )
+        sink = pa.BufferOutputStream()
+        writer = None
+        stats = {}
+        out_docs = 0
+        first_row = 0
+        try:
+            for batch in reader.iter_batches(batch_size=self.streaming_batch_size, columns=columns):
+                if passthrough_batches is not None:
+                    row_index = pa.array(np.arange(first_row, first_row + batch.num_rows, dtype=np.int64))
+                    first_row += batch.num_rows
+                    batch = pa.RecordBatch.from_arrays(
+                        batch.columns + [row_index], names=batch.schema.names + [row_index_column]
+                    )
+                out_tables, batch_stats = self.transform_batch(batch=batch, file_name=file_name)
+                for key, val in batch_stats.items():
+                    stats[key] = stats.get(key, 0) + val
+                if passthrough_batches is not None:
+                    passthrough = pa.Table.from_batches([next(passthrough_batches)])
+                    self._check_row_index(out_tables=out_tables, file_name=file_name)
+                    out_tables = [
+                        self._restore_columns(
+                            table=pa.Table.from_batches([out_table])
+                            if isinstance(out_table, pa.RecordBatch)
+                            else out_table,
+                            passthrough=passthrough,
+                            names=names,
+                            row_index=row_index,
+                        )
+                        for out_table in out_tables
+                    ]
+                for out_table in out_tables:
+                    if writer is None:
+                        if not TransformUtils.verify_no_duplicate_columns(table=out_table, file=file_name):
+                            self.logger.warning("Transformer created file with the duplicate columns")
+                            return [], {"duplicate columns result": 1}
+                        # Use the same compression as TransformUtils.convert_arrow_to_binary
+                        writer = pq.ParquetWriter(sink, schema=out_table.schema, compression="ZSTD")
+                    if isinstance(out_table, pa.RecordBatch):
+                        writer.write_batch(out_table)
+                    else:
+                        writer.write_table(out_table)
+                    out_docs += out_table.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+        stats = stats | {"source_doc_count": source_docs}
+        if writer is None:
+            # transform did not produce any output
+            return [], stats | {"result_doc_count": 0}
+        return [(bytes(sink.getvalue()), ".parquet")], stats | {"result_doc_count": out_docs}
+
+    def _transform_binary_projected(
+        self, file_name: str, byte_array: bytes
+    ) -> tuple[list[tuple[bytes, str]], dict[str, Any]]:
+        """
+        Converts input file into 0 or more output files, decoding only the input columns for the transform.
+        The rest of the columns are only decoded for the row groups containing output rows and are added to
+        the output tables unchanged. Parquet does not allow to copy them without decoding, so they are
+        re-encoded in the output.
+        :param file_name: the file name of the file containing the given byte_array.
+        :param byte_array: contents of the input file to be transformed.
+        :return: a tuple of a list of 0 or more tuples and a dictionary of statistics, see transform_binary()
+        """
+        try:
+            parquet_file = pq.ParquetFile(pa.BufferReader(byte_array))
+            names = parquet_file.schema_arrow.names
+            # missing columns are reported by the transform itself
+            columns = [name for name in self.input_columns if name in names]
+            table = parquet_file.read(columns=columns)
+        except Exception as e:
+            self.logger.warning(f"Could not read columns {self.input_columns} from file {file_name}: {e}")
+            return [], {"failed_reads": 1}
+        if table.num_rows == 0:
+            self.logger.warning(f"table is empty, skipping processing")
+            return [], {"skipped empty tables": 1}
+        source_docs = table.num_rows
+        passthrough_columns = [name for name in names if name not in columns]
+        if len(passthrough_columns) > 0:
+            row_index = pa.array(np.arange(source_docs, dtype=np.int64))
+            table = table.append_column(row_index_column, row_index)
+        # transform table
+        out_tables, stats = self.transform(table=table, file_name=file_name)
+        if len(passthrough_columns) > 0 and len(out_tables) > 0:
+            self._check_row_index(out_tables=out_tables, file_name=file_name)
+            passthrough, row_index = self._read_passthrough(
+                parquet_file=parquet_file, columns=passthrough_columns, out_tables=out_tables
+            )
+            out_tables = [
+                self._restore_columns(table=out_table, passthrough=passthrough, names=names, row_index=row_index)
+                for out_table in out_tables
+            ]
+        return self._check_and_convert_tables(out_tables=out_tables, stats=stats | {"source_doc_count": source_docs})
+
+    def _check_row_index(self, out_tables: list[pa.Table | pa.RecordBatch], file_name: str) -> None:
+        """
+        Check that the transform output contains the row index column, required for restoring the columns
+        not in the input columns
+        :param out_tables: transform output tables
+        :param file_name: input file name
+        :return: None
+        """
+        for out_table in out_tables:
+            if row_index_column not in out_table.schema.names:
+                raise ValueError(
+                    f"{type(self).__name__} output for {file_name} does not contain the {row_index_column} "
+                    f"column, that is required to restore the columns not in input columns "
+                    f"{self.input_columns}. Transforms declaring input columns must keep this column"
+                )
+
+    @staticmethod
+    def _read_passthrough(
+        parquet_file: pq.ParquetFile, columns: list[str], out_tables: list[pa.Table]
+    ) -> tuple[pa.Table, pa.Array]:
+        """
+        Read columns, that were not read by the transform, only from the row groups containing output rows
+        :param parquet_file: input parquet file
+        :param columns: columns to read
+        :param out_tables: transform output tables, containing row index column
+        :return: table of the read columns and the original row index of its rows
+        """
+        sizes = [parquet_file.metadata.row_group(i).num_rows for i in range(parquet_file.metadata.num_row_groups)]
+        starts = np.cumsum([0] + sizes[:-1], dtype=np.int64)
+        used = np.zeros(len(sizes), dtype=bool)
+        for out_table in out_tables:
+            indices = out_table[row_index_column].to_numpy()
+            used[np.searchsorted(starts, indices, side="right") - 1] = True
+        row_groups = [i for i in range(len(sizes)) if used[i]]
+        if len(row_groups) == len(sizes):
+            passthrough = parquet_file.read(columns=columns)
+        else:
+            passthrough = parquet_file.read_row_groups(row_groups, columns=columns)
+        if passthrough.num_rows == 0:
+            return passthrough, pa.array([], type=pa.int64())
+        row_index = np.concatenate([np.arange(starts[i], starts[i] + sizes[i], dtype=np.int64) for i in row_groups])
+        return passthrough, pa.array(row_index)
+
+    @staticmethod
+    def _restore_columns(table: pa.Table, passthrough: pa.Table, names: list[str], row_index: pa.Array) -> pa.Table:
+        """
+        Add columns, that were not read by the transform, to its output table
+        :param table: transform output table, containing row index column
+        :param passthrough: input table columns not read by the transform
+        :param names: input table column names, used to preserve column order
+        :param row_index: original row index of the passthrough rows
+        :return: table containing all of the columns
+        """
+        indices = table[row_index_column]
+        table = table.drop_columns([row_index_column])
+        missing = [name for name in passthrough.schema.names if name not in table.schema.names]
+        passthrough = passthrough.select(missing)
+        if table.num_rows != passthrough.num_rows or not pc.all(pc.equal(indices, row_index)).as_py():
+            # rows were removed or reordered, find positions of the output rows in the passthrough table
+            passthrough = passthrough.take(pc.index_in(indices, value_set=row_index))
+        for name in missing:
+            table = table.append_column(passthrough.schema.field(name), passthrough[name])
+        order = [name for name in names if name in table.schema.names]
+        return table.select(order + [name for name in table.schema.names if name not in names])
+
     def _check_and_convert_tables(
         self, out_tables: list[pa.Table], stats: dict[str, Any]
     ) -> tuple[list[tuple[bytes, str]], dict[str, Any]]:
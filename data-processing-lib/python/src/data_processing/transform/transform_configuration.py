@@ -14,6 +14,7 @@ from argparse import ArgumentParser
 from typing import Any
 
 from data_processing.transform import AbstractTransform
+from data_processing.transform.table_transform import input_columns_key
 from data_processing.utils import CLIArgumentProvider
 
 
@@ -63,12 +64,26 @@ class TransformConfiguration(CLIArgumentProvider):
             del self.params[key]
         return parameters
 
+    def get_input_columns(self) -> list[str]:
+        """
+        Get the list of input columns read by the transform. Only these columns are decoded and passed
+        to the table transform, the rest of the columns are restored in the output. They are still decoded and
+        re-encoded for the output rows, so this only pays off for transforms that filter rows, and requires
+        them to preserve the row index column of the table they get, see AbstractTableTransform.
+        Called after apply_input_params().
+        :return: list of column names or None (default), if the transform requires all of the columns
+        """
+        return None
+
     def get_transform_params(self) -> dict[str, Any]:
         """
          Get transform parameters
         :return: transform parameters
         """
-        return self.params
+        input_columns = self.get_input_columns()
+        if input_columns is None:
+            return self.params
+        return self.params | {input_columns_key: input_columns}
 
 
 def get_transform_config(
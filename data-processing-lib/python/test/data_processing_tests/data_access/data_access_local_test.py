@@ -17,6 +17,7 @@ from pathlib import Path
 from unittest.mock import patch
 
 import pyarrow
+import pyarrow.parquet
 import pytest
 from data_processing.data_access import DataAccessLocal
 from data_processing.utils import GB, MB, get_logger
@@ -56,10 +57,15 @@ class TestGetFilesFolder(TestInit):
         file_path = directory / "file.parquet"
         os.makedirs(directory, exist_ok=True)
         file_path.touch()
+        mtime = file_path.stat().st_mtime
         result = self.dal._get_files_folder(path=str(directory), files_to_use=None, cm_files=0)
         os.remove(file_path)
         os.rmdir(directory)
-        assert result == ([{'name': '/tmp/input_guf/empty_dir/file.parquet', 'size': 0}], self.size_stat_dict, 0)
+        assert result == (
+            [{"name": "/tmp/input_guf/empty_dir/file.parquet", "size": 0, "etag": "", "mtime": mtime}],
+            self.size_stat_dict,
+            0,
+        )
 
     def test_multiple_files(self):
         """
@@ -433,6 +439,49 @@ class TestReadPyarrowTable(TestInit):
         assert isinstance(table, pyarrow.Table)
 
 
+class TestReadProjectedTable(TestInit):
+    table = pyarrow.Table.from_pydict(mapping={"col1": [1, 2, 3, 4], "col2": ["a", "b", "c", "d"]})
+    pq_file_path = os.path.join(os.sep, "tmp", "test_projected_file.parquet")
+
+    def test_projected_read(self):
+        pyarrow.parquet.write_table(self.table, self.pq_file_path, row_group_size=2)
+        table, _ = self.dal.get_table(self.pq_file_path, columns=["col2"])
+        assert table.schema.names == ["col2"] and table.num_rows == 4
+        table, _ = self.dal.get_table(self.pq_file_path, columns=["col1"], row_groups=[1])
+        os.remove(self.pq_file_path)
+        assert table.to_pydict() == {"col1": [3, 4]}
+
+
+class TestGetBuffer(TestInit):
+    pq_file_path = os.path.join(os.sep, "tmp", "test_buffer_file.parquet")
+
+    def test_parquet_buffer(self):
+        table = pyarrow.Table.from_pydict(mapping={"a": [1, 2], "b": ["string1", "string2"]})
+        pyarrow.parquet.write_table(table, self.pq_file_path)
+        data, _ = self.dal.get_buffer(self.pq_file_path)
+        assert isinstance(data, pyarrow.Buffer)
+        with open(self.pq_file_path, "rb") as f:
+            assert data.to_pybytes() == f.read()
+        os.remove(self.pq_file_path)
+        assert pyarrow.parquet.read_table(pyarrow.BufferReader(data)).equals(table)
+
+    def test_nonexistent_file(self):
+        with pytest.raises(FileNotFoundError):
+            self.dal.get_buffer("nonexistent_file.parquet")
+
+
+class TestDeleteFile(TestInit):
+    file_path = os.path.join(os.sep, "tmp", "test_delete_file.bin")
+
+    def test_delete_file(self):
+        self.dal.save_file(self.file_path, b"data")
+        assert os.path.exists(self.file_path)
+        self.dal.delete_file(self.file_path)
+        assert not os.path.exists(self.file_path)
+        # deleting a nonexistent file is only logged
+        assert self.dal.delete_file(self.file_path) == 0
+
+
 class TestGetOutputLocation(TestInit):
     def test_get_output_location(self):
         in_path = os.path.join(self.dal.input_folder, "path", "to", "f.parquet")
@@ -617,6 +666,89 @@ class TestGetFolderFiles(TestInit):
         assert not contents
 
 
+class TestManifest:
+    @staticmethod
+    def _write_files(folder: Path, names: list[str]) -> None:
+        for name in names:
+            os.makedirs((folder / name).parent, exist_ok=True)
+            (folder / name).write_bytes(b" " * 10)
+
+    def test_manifest(self, tmp_path):
+        """
+        Tests creation, usage and refresh of the input folder manifest
+        """
+        input_folder = tmp_path / "input"
+        config = {"input_folder": str(input_folder), "output_folder": str(tmp_path / "output")}
+        manifest = str(tmp_path / "manifest.parquet")
+        self._write_files(input_folder, ["a/f1.parquet", "a/f2.parquet", "b/f3.parquet"])
+        dal = DataAccessLocal(config, manifest=manifest)
+        files, profile, _ = dal.get_files_to_process()
+        assert files == [str(input_folder / name) for name in ["a/f1.parquet", "a/f2.parquet", "b/f3.parquet"]]
+        table = pyarrow.parquet.read_table(manifest)
+        assert table.schema.names == ["name", "size", "etag", "mtime"]
+        assert table["name"].to_pylist() == ["a/f1.parquet", "a/f2.parquet", "b/f3.parquet"]
+        assert table["size"].to_pylist() == [10, 10, 10]
+        # sub folders are served from the manifest
+        files, _ = dal.get_folder_files(str(input_folder / "a"), return_data=False)
+        assert list(files.keys()) == [str(input_folder / "a/f1.parquet"), str(input_folder / "a/f2.parquet")]
+        # new data access refreshes the manifest with added and removed files, including the ones sorting earlier
+        os.remove(input_folder / "b/f3.parquet")
+        self._write_files(input_folder, ["0/f0.parquet", "c/f4.parquet"])
+        dal = DataAccessLocal(config, manifest=manifest)
+        files, profile, _ = dal.get_files_to_process()
+        names = ["0/f0.parquet", "a/f1.parquet", "a/f2.parquet", "c/f4.parquet"]
+        assert files == [str(input_folder / name) for name in names]
+        assert profile["total_file_size"] == 40 / MB
+        assert dal.get_input_file_sizes() == {name: 10 for name in files}
+        assert pyarrow.parquet.read_table(manifest)["name"].to_pylist() == names
+        # manifest is replaced atomically, without leaving temporary files
+        assert sorted(os.listdir(tmp_path)) == ["input", "manifest.parquet"]
+
+    def test_manifest_refresh_modes(self, tmp_path):
+        """
+        Tests incremental refresh and usage without refresh of the input folder manifest
+        """
+        input_folder = tmp_path / "input"
+        config = {"input_folder": str(input_folder), "output_folder": str(tmp_path / "output")}
+        manifest = str(tmp_path / "manifest.parquet")
+        self._write_files(input_folder, ["b/f1.parquet", "b/f2.parquet"])
+        files, _, _ = DataAccessLocal(config, manifest=manifest, manifest_refresh="none").get_files_to_process()
+        assert len(files) == 2
+        self._write_files(input_folder, ["a/f0.parquet", "c/f3.parquet"])
+        # manifest is used as is
+        dal = DataAccessLocal(config, manifest=manifest, manifest_refresh="none")
+        files, _, _ = dal.get_files_to_process()
+        assert files == [str(input_folder / name) for name in ["b/f1.parquet", "b/f2.parquet"]]
+        # only files after the last file in the manifest are added
+        dal = DataAccessLocal(config, manifest=manifest, manifest_refresh="incremental")
+        files, _, _ = dal.get_files_to_process()
+        assert files == [str(input_folder / name) for name in ["b/f1.parquet", "b/f2.parquet", "c/f3.parquet"]]
+
+
+class TestCompletionMarkers:
+    def test_checkpoint_markers(self, tmp_path):
+        """
+        Tests checkpointing based on completion markers
+        """
+        input_folder = tmp_path / "input"
+        config = {"input_folder": str(input_folder), "output_folder": str(tmp_path / "output")}
+        markers = str(tmp_path / "markers")
+        names = [str(input_folder / f"d{i}" / f"f{i}.parquet") for i in range(5)]
+        TestManifest._write_files(input_folder, [f"d{i}/f{i}.parquet" for i in range(5)])
+        dal = DataAccessLocal(config, checkpoint=True, checkpoint_markers=markers)
+        # no markers yet - output folder is used
+        os.makedirs(tmp_path / "output" / "d0")
+        (tmp_path / "output" / "d0" / "f0.parquet").touch()
+        files, _, _ = dal.get_files_to_process()
+        assert files == names[1:]
+        # markers are used instead of the output folder
+        dal.save_completion_markers(names[1:3])
+        dal.save_completion_markers([names[4]])
+        assert len(os.listdir(markers)) == 2
+        files, _, _ = dal.get_files_to_process()
+        assert files == [names[0], names[3]]
+
+
 class TestSaveFile(TestInit):
 
     new_file_path = os.path.join(os.sep, "tmp", "new_file.bin")
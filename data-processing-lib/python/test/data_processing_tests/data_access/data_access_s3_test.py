@@ -11,7 +11,11 @@
 ################################################################################
 
 import os
+from unittest.mock import patch
 
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
 from data_processing.data_access import DataAccessS3
 from moto import mock_aws
 
@@ -137,3 +141,124 @@ def test_files_to_process():
         assert 0.034458160400390625 == profile["max_file_size"]
         assert 0.034458160400390625 == profile["min_file_size"]
         assert 0.06891632080078125 == profile["total_file_size"]
+
+
+def test_multipart_read_write():
+    """
+    Testing ranged read and multipart upload of files above multipart threshold
+    :return: None
+    """
+    with mock_aws():
+        # create data access transferring files above 6MB in 5MB parts
+        config = s3_conf | {"multipart_threshold_mb": 6, "part_size_mb": 5, "max_concurrency": 4}
+        d_a = DataAccessS3(s3_credentials=s3_cred, s3_config=config, d_sets=None, checkpoint=False, m_files=-1)
+        d_a.arrS3.s3_client.create_bucket(Bucket="test")
+        for size in [0, 1024, 7 * 1024 * 1024, 12 * 1024 * 1024 + 1]:
+            data = os.urandom(size)
+            path = f"{s3_conf['output_folder']}file_{size}.bin"
+            res, _ = d_a.save_file(path=path, data=data)
+            assert res is not None
+            r_data, _ = d_a.get_file(path)
+            assert r_data == data
+        # multipart upload of a 12MB file consists of 3 parts
+        etag = d_a.arrS3.s3_client.head_object(Bucket="test", Key=path[len("test/") :])["ETag"]
+        assert etag.strip('"').endswith("-3")
+        assert len(d_a.arrS3.s3_client.list_multipart_uploads(Bucket="test").get("Uploads", [])) == 0
+        # part size is increased to stay within the max number of parts
+        with patch("data_processing.data_access.arrow_s3.s3_max_parts", 2):
+            d_a.save_file(path=path, data=data)
+        etag = d_a.arrS3.s3_client.head_object(Bucket="test", Key=path[len("test/") :])["ETag"]
+        assert etag.strip('"').endswith("-2")
+        r_data, _ = d_a.get_file(path)
+        assert r_data == data
+
+
+def test_multipart_upload_failure():
+    """
+    Testing that failed multipart upload is aborted and the original exception is raised,
+    even if the abort fails
+    :return: None
+    """
+    with mock_aws():
+        config = s3_conf | {"multipart_threshold_mb": 6, "part_size_mb": 5, "max_concurrency": 4}
+        d_a = DataAccessS3(s3_credentials=s3_cred, s3_config=config)
+        d_a.arrS3.s3_client.create_bucket(Bucket="test")
+        data = os.urandom(12 * 1024 * 1024)
+        with patch.object(d_a.arrS3, "_upload_part", side_effect=ValueError("part failed")):
+            with pytest.raises(ValueError, match="part failed"):
+                d_a.arrS3._save_multipart(bucket="test", prefix="file.bin", data=data)
+            assert len(d_a.arrS3.s3_client.list_multipart_uploads(Bucket="test").get("Uploads", [])) == 0
+            with patch.object(d_a.arrS3.s3_client, "abort_multipart_upload", side_effect=RuntimeError("abort failed")):
+                with pytest.raises(ValueError, match="part failed"):
+                    d_a.arrS3._save_multipart(bucket="test", prefix="file.bin", data=data)
+
+
+def test_parquet_file_ranged_read():
+    """
+    Testing reading of selected row groups of a parquet file without downloading the whole file
+    :return: None
+    """
+    with mock_aws():
+        d_a = DataAccessS3(s3_credentials=s3_cred, s3_config=s3_conf, d_sets=None, checkpoint=False, m_files=-1)
+        d_a.arrS3.s3_client.create_bucket(Bucket="test")
+        table = pa.table(
+            {"key": pa.array(range(100000), type=pa.int64()), "value": [os.urandom(16) for _ in range(100000)]}
+        )
+        writer = pa.BufferOutputStream()
+        pq.write_table(table, writer, row_group_size=10000)
+        data = bytes(writer.getvalue())
+        path = f"{s3_conf['input_folder']}row_groups.parquet"
+        d_a.save_file(path=path, data=data)
+        # count the bytes fetched by ranged reads
+        read_range = d_a.arrS3._read_range
+        fetched = []
+
+        def _read_range(**kwargs):
+            result = read_range(**kwargs)
+            fetched.append(len(result[0]))
+            return result
+
+        d_a.arrS3._read_range = _read_range
+        parquet_file, _ = d_a.get_parquet_file(path)
+        assert parquet_file.metadata.num_row_groups == 10
+        r_table = parquet_file.read_row_groups([3], columns=["key"])
+        assert r_table.column("key").to_pylist() == list(range(30000, 40000))
+        assert 0 < sum(fetched) < len(data) // 5
+        # missing file
+        parquet_file, _ = d_a.get_parquet_file(f"{s3_conf['input_folder']}missing.parquet")
+        assert parquet_file is None
+
+
+def test_sharded_listing_and_manifest():
+    """
+    Testing concurrent listing and input folder manifest stored in the bucket
+    :return: None
+    """
+    with mock_aws():
+        manifest = "test/manifest/input.parquet"
+        d_a = DataAccessS3(s3_credentials=s3_cred, s3_config=s3_conf, manifest=manifest)
+        d_a.arrS3.s3_client.create_bucket(Bucket="test")
+        for i in range(10):
+            for j in range(3):
+                d_a.save_file(path=f"{s3_conf['input_folder']}d{i}/s{j}/file.parquet", data=b"data")
+        d_a.save_file(path=f"{s3_conf['input_folder']}top.parquet", data=b"data")
+        # sharded listing returns the same files as a single paginator
+        files, _ = d_a.arrS3.list_files(key=s3_conf["input_folder"])
+        pages = d_a.arrS3.s3_client.get_paginator("list_objects_v2").paginate(Bucket="test", Prefix="table_read_write")
+        assert [f["name"] for f in files] == [f"test/{o['Key']}" for page in pages for o in page["Contents"]]
+        assert all(len(f["etag"]) > 0 and f["mtime"] > 0 for f in files)
+        folders, _ = d_a.arrS3.list_folders(key=s3_conf["input_folder"])
+        assert len(folders) == 40
+        # manifest is created on the first listing
+        files, _, _ = d_a.get_files_to_process()
+        assert len(files) == 31
+        manifest_files, _ = d_a.get_folder_files(path="test/manifest/", return_data=False)
+        assert list(manifest_files.keys()) == [manifest]
+        # and refreshed by the new data access, including files sorting before the last manifest file
+        d_a.save_file(path=f"{s3_conf['input_folder']}a/file.parquet", data=b"data")
+        d_a.save_file(path=f"{s3_conf['input_folder']}z/file.parquet", data=b"data")
+        d_a = DataAccessS3(s3_credentials=s3_cred, s3_config=s3_conf, manifest=manifest)
+        files, _, _ = d_a.get_files_to_process()
+        assert len(files) == 33
+        assert files[0] == f"{s3_conf['input_folder']}a/file.parquet"
+        assert files[-1] == f"{s3_conf['input_folder']}z/file.parquet"
@@ -11,12 +11,27 @@
 ################################################################################
 
 import os
+import threading
+from argparse import ArgumentParser
+from multiprocessing import Value
 
-from data_processing.runtime.pure_python import PythonTransformLauncher
+import pytest
+from data_processing.data_access import DataAccessFactory
+from data_processing.runtime.pure_python import (
+    PythonPoolTransformFileProcessor,
+    PythonTransformLauncher,
+)
+from data_processing.runtime.pure_python.transform_orchestrator import (
+    _process_transforms_multiprocessor,
+)
 from data_processing.test_support.launch.transform_test import (
     AbstractTransformLauncherTest,
 )
-from data_processing.test_support.transform import NOOPPythonTransformConfiguration
+from data_processing.test_support.transform import (
+    NOOPPythonTransformConfiguration,
+    NOOPTransform,
+)
+from data_processing.utils import ParamsUtils
 
 
 class TestPythonNOOPTransform(AbstractTransformLauncherTest):
@@ -35,3 +50,50 @@ class TestPythonNOOPTransform(AbstractTransformLauncherTest):
             {"noop_sleep_sec": 0, "runtime_num_processors": 2},
             basedir + "/input", basedir + "/expected"))
         return fixtures
+
+
+def test_failed_worker_flush(monkeypatch, tmp_path):
+    """
+    Verify that a flush failure in one of the workers is reported instead of blocking the other workers
+    """
+    basedir = "../../../../test-data/data_processing/python/noop/"
+    basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), basedir))
+    daf = DataAccessFactory()
+    parser = ArgumentParser()
+    daf.add_input_params(parser)
+    local_conf = {"input_folder": basedir + "/input", "output_folder": str(tmp_path)}
+    daf.apply_input_params(parser.parse_args(["--data_local_config", ParamsUtils.convert_to_ast(local_conf)]))
+    files, _, _ = daf.create_data_access().get_files_to_process()
+    # only the first flushing worker fails
+    failures = Value("i", 0)
+    flush = PythonPoolTransformFileProcessor.flush
+
+    def _flush(self):
+        with failures.get_lock():
+            failures.value += 1
+            if failures.value == 1:
+                raise RuntimeError("flush failed")
+        return flush(self)
+
+    monkeypatch.setattr(PythonPoolTransformFileProcessor, "flush", _flush)
+    errors = []
+
+    def _run():
+        try:
+            _process_transforms_multiprocessor(
+                files=files,
+                size=2,
+                print_interval=10,
+                data_access_factory=daf,
+                transform_params={"sleep_sec": 0},
+                transform_class=NOOPTransform,
+                is_folder=False,
+            )
+        except Exception as e:
+            errors.append(e)
+
+    runner = threading.Thread(target=_run, daemon=True)
+    runner.start()
+    runner.join(timeout=120)
+    assert not runner.is_alive()
+    assert len(errors) == 1 and "flush failed" in str(errors[0])
@@ -0,0 +1,84 @@
+# (C) Copyright IBM Corp. 2024.
+# Licensed under the Apache License, Version 2.0 (the “License”);
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#  http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an “AS IS” BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+import os
+import threading
+from argparse import ArgumentParser
+
+from data_processing.data_access import DataAccessFactory
+from data_processing.runtime.pure_python import (
+    PythonTransformFileProcessor,
+    PythonTransformLauncher,
+)
+from data_processing.test_support.launch.transform_test import (
+    AbstractTransformLauncherTest,
+)
+from data_processing.test_support.transform import (
+    NOOPPythonTransformConfiguration,
+    NOOPTransform,
+)
+from data_processing.transform import TransformStatistics
+from data_processing.utils import ParamsUtils
+
+
+basedir = "../../../../test-data/data_processing/python/noop/"
+basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), basedir))
+
+
+class TestPythonNOOPTransform(AbstractTransformLauncherTest):
+    """
+    Extends the super-class to define the test data for the tests defined there.
+    The name of this class MUST begin with the word Test so that pytest recognizes it as a test class.
+    """
+
+    def get_test_transform_fixtures(self) -> list[tuple]:
+        fixtures = []
+        launcher = PythonTransformLauncher(NOOPPythonTransformConfiguration())
+        fixtures.append(
+            (
+                launcher,
+                {"noop_sleep_sec": 0, "runtime_prefetch_depth": 2, "runtime_write_behind_depth": 2},
+                basedir + "/input",
+                basedir + "/expected",
+            )
+        )
+        return fixtures
+
+
+def test_flush_shuts_down_background_threads(tmp_path):
+    """
+    Verify that flush releases the prefetch and write behind threads of the file processor
+    """
+    daf = DataAccessFactory()
+    parser = ArgumentParser()
+    daf.add_input_params(parser)
+    local_conf = {"input_folder": basedir + "/input", "output_folder": str(tmp_path)}
+    daf.apply_input_params(parser.parse_args(["--data_local_config", ParamsUtils.convert_to_ast(local_conf)]))
+    files, _, _ = daf.create_data_access().get_files_to_process()
+    processor = PythonTransformFileProcessor(
+        data_access_factory=daf,
+        statistics=TransformStatistics(),
+        transform_params={"sleep_sec": 0},
+        transform_class=NOOPTransform,
+        is_folder=False,
+        prefetch_depth=2,
+        write_behind_depth=2,
+    )
+    for index, f_name in enumerate(files):
+        processor.prefetch(files[index : index + 3])
+        processor.process_file(f_name)
+    background = ("prefetch", "write_behind")
+    assert any(thread.name.startswith(background) for thread in threading.enumerate())
+    processor.flush()
+    assert processor.reader is None and processor.writer is None
+    assert not any(thread.name.startswith(background) for thread in threading.enumerate())
+    assert len(list(tmp_path.rglob("*.parquet"))) == len(files)
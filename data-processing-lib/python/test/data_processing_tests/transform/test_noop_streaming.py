@@ -0,0 +1,57 @@
+# (C) Copyright IBM Corp. 2024.
+# Licensed under the Apache License, Version 2.0 (the “License”);
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#  http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an “AS IS” BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+from typing import Any
+
+import pyarrow as pa
+from data_processing.test_support.transform.noop_transform import NOOPTransform
+from data_processing.transform import AbstractTableTransform
+from data_processing.utils import TransformUtils
+
+
+table = pa.Table.from_pydict({"name": pa.array(["Tom", "Dick", "Harry"]), "age": pa.array([0, 1, 2])})
+
+
+class FilterTransform(AbstractTableTransform):
+    """
+    Transform implementing only the table interface
+    """
+
+    def transform(self, table: pa.Table, file_name: str = None) -> tuple[list[pa.Table], dict[str, Any]]:
+        return [table.slice(0, 1)], {}
+
+
+def test_streaming_transform():
+    transform = NOOPTransform({"sleep_sec": 0, "streaming_batch_size": 2})
+    out_files, stats = transform.transform_binary(
+        file_name="test.parquet", byte_array=TransformUtils.convert_arrow_to_binary(table)
+    )
+    assert len(out_files) == 1
+    assert out_files[0][1] == ".parquet"
+    assert TransformUtils.convert_binary_to_arrow(out_files[0][0]).equals(table)
+    assert stats == {"nfiles": 1, "nrows": 3, "source_doc_count": 3, "result_doc_count": 3}
+    # statistics are the same as for the table execution
+    _, table_stats = NOOPTransform({"sleep_sec": 0}).transform_binary(
+        file_name="test.parquet", byte_array=TransformUtils.convert_arrow_to_binary(table)
+    )
+    assert stats == table_stats
+
+
+def test_streaming_not_supported():
+    # transform does not implement transform_batch(), so the whole table is processed
+    transform = FilterTransform({"streaming_batch_size": 2})
+    out_files, stats = transform.transform_binary(
+        file_name="test.parquet", byte_array=TransformUtils.convert_arrow_to_binary(table)
+    )
+    assert len(out_files) == 1
+    assert TransformUtils.convert_binary_to_arrow(out_files[0][0]).num_rows == 1
+    assert stats == {"source_doc_count": 3, "result_doc_count": 1}
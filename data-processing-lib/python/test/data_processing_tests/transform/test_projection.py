@@ -0,0 +1,115 @@
+# (C) Copyright IBM Corp. 2024.
+# Licensed under the Apache License, Version 2.0 (the “License”);
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#  http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an “AS IS” BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+from typing import Any
+from unittest.mock import patch
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pytest
+from data_processing.transform import AbstractTableTransform
+from data_processing.utils import TransformUtils
+
+
+table = pa.Table.from_pydict(
+    {"name": pa.array(["Tom", "Dick", "Harry"]), "age": pa.array([0, 1, 2]), "city": pa.array(["a", "b", "c"])}
+)
+
+
+class AdultsTransform(AbstractTableTransform):
+    """
+    Transform filtering rows and adding annotation column based on the age column only
+    """
+
+    def transform(self, table: pa.Table, file_name: str = None) -> tuple[list[pa.Table], dict[str, Any]]:
+        self.columns = table.schema.names
+        table = table.filter(pc.greater(table["age"], 0))
+        return [TransformUtils.add_column(table=table, name="adult", content=[True] * table.num_rows)], {}
+
+
+def _run(config: dict[str, Any]) -> tuple[AbstractTableTransform, pa.Table, dict[str, Any]]:
+    transform = AdultsTransform(config)
+    out_files, stats = transform.transform_binary(
+        file_name="test.parquet", byte_array=TransformUtils.convert_arrow_to_binary(table)
+    )
+    assert len(out_files) == 1
+    return transform, TransformUtils.convert_binary_to_arrow(out_files[0][0]), stats
+
+
+def test_projected_transform():
+    transform, full_result, full_stats = _run({})
+    assert transform.columns == ["name", "age", "city"]
+    transform, result, stats = _run({"input_columns": ["age"]})
+    # transform only gets input columns (and row index)
+    assert "name" not in transform.columns and "city" not in transform.columns
+    assert result.equals(full_result)
+    assert result.schema.names == ["name", "age", "city", "adult"]
+    assert result.column("name").to_pylist() == ["Dick", "Harry"]
+    assert stats == full_stats
+
+
+class FirstRowsTransform(AbstractTableTransform):
+    """
+    Transform keeping the first rows, optionally dropping the row index column
+    """
+
+    def transform(self, table: pa.Table, file_name: str = None) -> tuple[list[pa.Table], dict[str, Any]]:
+        table = table.slice(0, 3)
+        if self.config.get("drop_index", False):
+            table = table.select(["age"])
+        return [table], {}
+
+
+def test_projected_transform_row_groups():
+    large = pa.Table.from_pydict({"name": [f"name{i}" for i in range(100)], "age": list(range(100))})
+    sink = pa.BufferOutputStream()
+    pq.write_table(large, sink, row_group_size=10)
+    transform = FirstRowsTransform({"input_columns": ["age"]})
+    read_row_groups = pq.ParquetFile.read_row_groups
+    with patch.object(pq.ParquetFile, "read_row_groups", autospec=True, side_effect=read_row_groups) as read:
+        out_files, _ = transform.transform_binary(file_name="test.parquet", byte_array=sink.getvalue().to_pybytes())
+    # restored columns are only read from the row group containing the output rows
+    assert read.call_args.args[1] == [0]
+    result = TransformUtils.convert_binary_to_arrow(out_files[0][0])
+    assert result.equals(large.slice(0, 3))
+    transform = FirstRowsTransform({"input_columns": ["age"], "drop_index": True})
+    with pytest.raises(ValueError, match="__dpk_row_index"):
+        transform.transform_binary(file_name="test.parquet", byte_array=sink.getvalue().to_pybytes())
+
+
+class AdultsBatchTransform(AdultsTransform):
+    """
+    AdultsTransform supporting streaming execution
+    """
+
+    def transform_batch(
+        self, batch: pa.RecordBatch, file_name: str = None
+    ) -> tuple[list[pa.Table | pa.RecordBatch], dict[str, Any]]:
+        return self.transform(table=pa.Table.from_batches([batch]), file_name=file_name)
+
+
+def test_projected_streaming_transform():
+    large = pa.Table.from_pydict(
+        {"name": [f"name{i}" for i in range(100)], "age": [i % 3 for i in range(100)], "city": ["a"] * 100}
+    )
+    sink = pa.BufferOutputStream()
+    pq.write_table(large, sink, row_group_size=30)
+    full_result = AdultsTransform({}).transform(large)[0][0]
+    transform = AdultsBatchTransform({"input_columns": ["age"], "streaming_batch_size": 7})
+    out_files, stats = transform.transform_binary(file_name="test.parquet", byte_array=sink.getvalue().to_pybytes())
+    # batches only contain input columns (and row index)
+    assert transform.columns == ["age", "__dpk_row_index"]
+    assert len(out_files) == 1
+    result = TransformUtils.convert_binary_to_arrow(out_files[0][0])
+    assert result.equals(full_result)
+    assert stats == {"source_doc_count": 100, "result_doc_count": full_result.num_rows}
@@ -37,6 +37,7 @@ class RayTransformExecutionConfiguration(TransformExecutionConfiguration):
         self.worker_options = {}
         self.n_workers = 1
         self.creation_delay = 0
+        self.file_batch_mb = 0
 
     def add_input_params(self, parser: argparse.ArgumentParser) -> None:
         """
@@ -67,6 +68,13 @@ class RayTransformExecutionConfiguration(TransformExecutionConfiguration):
             + ParamsUtils.get_ast_help_text(help_example_dict),
         )
         parser.add_argument(f"--{cli_prefix}creation_delay", type=int, default=0, help="delay between actor' creation")
+        parser.add_argument(
+            f"--{cli_prefix}file_batch_mb",
+            type=float,
+            default=0,
+            help="files smaller then this size (MB) are grouped into batches of up to this size, processed by "
+            "a single actor call. 0 - every file is processed separately",
+        )
         return TransformExecutionConfiguration.add_input_params(self, parser=parser)
 
     def apply_input_params(self, args: argparse.Namespace) -> bool:
@@ -82,6 +90,10 @@ class RayTransformExecutionConfiguration(TransformExecutionConfiguration):
         self.worker_options = captured["worker_options"]
         self.n_workers = captured["num_workers"]
         self.creation_delay = captured["creation_delay"]
+        self.file_batch_mb = captured["file_batch_mb"]
+        if self.file_batch_mb < 0:
+            logger.error(f"file batch size {self.file_batch_mb} MB should be non negative")
+            return False
         self.job_details = {
             "job category": "preprocessing",
             "job name": self.name,
@@ -95,6 +107,7 @@ class RayTransformExecutionConfiguration(TransformExecutionConfiguration):
         # print them
         logger.info(f"number of workers {self.n_workers} worker options {self.worker_options}")
         logger.info(f"actor creation delay {self.creation_delay}")
+        logger.info(f"file batch size {self.file_batch_mb} MB")
         logger.info(f"job details {self.job_details}")
         return True
 
@@ -107,4 +120,5 @@ class RayTransformExecutionConfiguration(TransformExecutionConfiguration):
             "number of workers": self.n_workers,
             "worker options": self.worker_options,
             "actor creation delay": self.creation_delay,
-        }
+            "file batch MB": self.file_batch_mb,
+        } | TransformExecutionConfiguration.get_input_params(self)
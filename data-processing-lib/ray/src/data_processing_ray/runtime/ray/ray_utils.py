@@ -128,6 +128,38 @@ class RayUtils:
         print(f"created {actors}, alive {alive}")
         raise UnrecoverableException(f"out of {len(actors)} created actors only {len(alive)} alive")
 
+    @staticmethod
+    def schedule_files(files: list[str], file_sizes: dict[str, int] = None, batch_size: int = 0) -> list[list[str]]:
+        """
+        Build the processing schedule. Files are ordered by size, largest first, so that the largest files do
+        not end up processed at the end of the job. Files smaller then batch size are grouped into batches with
+        a total size of up to batch size, that are processed by a single actor call
+        :param files: list of files to process
+        :param file_sizes: optional dictionary of file sizes. If not defined, the original order is used
+        :param batch_size: max size of the batch (bytes), 0 - no batching
+        :return: list of batches (lists of files) in the order of processing
+        """
+        if file_sizes is None or len(file_sizes) == 0:
+            return [[f] for f in files]
+        files = sorted(files, key=lambda f: file_sizes.get(f, 0), reverse=True)
+        schedule = []
+        batch = []
+        batch_bytes = 0
+        for f in files:
+            size = file_sizes.get(f, 0)
+            if size >= batch_size:
+                schedule.append([f])
+                continue
+            if batch_bytes + size > batch_size and len(batch) > 0:
+                schedule.append(batch)
+                batch = []
+                batch_bytes = 0
+            batch.append(f)
+            batch_bytes += size
+        if len(batch) > 0:
+            schedule.append(batch)
+        return schedule
+
     @staticmethod
     def process_files(
         executors: ActorPool,
@@ -140,6 +172,9 @@ class RayUtils:
         available_memory_gauge: Gauge,
         object_memory_gauge: Gauge,
         logger: logging.Logger,
+        file_sizes: dict[str, int] = None,
+        batch_size: int = 0,
+        resources_refresh_interval: float = 10.0,
     ) -> int:
         """
         Process files
@@ -153,54 +188,66 @@ class RayUtils:
         :param available_memory_gauge: ray Gauge to report available memory
         :param object_memory_gauge: ray Gauge to report available object memory
         :param logger: logger
+        :param file_sizes: optional dictionary of file sizes, used for ordering and batching of files
+        :param batch_size: max size (bytes) of the batch of small files processed by a single actor call
+        :param resources_refresh_interval: min interval (sec) between refreshes of the available resources gauges
         :return: number of actors failures
         """
         logger.debug("Begin processing files")
         actor_failures = 0
-        RayUtils.get_available_resources(
-            available_cpus_gauge=available_cpus_gauge,
-            available_gpus_gauge=available_gpus_gauge,
-            available_memory_gauge=available_memory_gauge,
-            object_memory_gauge=object_memory_gauge,
-        )
-        terminate = False
+        last_refresh = time.time()
+
+        def _refresh_resources(force: bool = False) -> None:
+            nonlocal last_refresh
+            if force or time.time() - last_refresh >= resources_refresh_interval:
+                RayUtils.get_available_resources(
+                    available_cpus_gauge=available_cpus_gauge,
+                    available_gpus_gauge=available_gpus_gauge,
+                    available_memory_gauge=available_memory_gauge,
+                    object_memory_gauge=object_memory_gauge,
+                )
+                last_refresh = time.time()
+
+        # requests in flight - reply reference to the executing actor and the number of files of the request
+        in_flight = {}
+
+        def _submit(batch: list[str]) -> None:
+            actor = executors.pop_idle()
+            if len(batch) == 1:
+                reply = actor.process_file.remote(batch[0])
+            else:
+                reply = actor.process_files.remote(batch)
+            in_flight[reply] = (actor, len(batch))
+
+        _refresh_resources(force=True)
+        schedule = RayUtils.schedule_files(files=files, file_sizes=file_sizes, batch_size=batch_size)
+        logger.info(f"Processing {len(files)} files in {len(schedule)} requests")
         running = 0
         t_start = time.time()
         completed = 0
-        for path in files:
+        next_print = print_interval
+        for batch in schedule:
             if executors.has_free():  # still have room
-                executors.submit(lambda a, v: a.process_file.remote(v), path)
+                _submit(batch)
                 running += 1
                 files_in_progress_gauge.set(running)
             else:  # need to wait for some actors
-                while True:
-                    # we can have several workers fail here
-                    try:
-                        res = executors.get_next_unordered()
-                        break
-                    except Exception as e:
-                        if isinstance(e, RayError):
-                            # Ray exception - terminate
-                            logger.error(f"Got Ray worker exception {e}, terminating")
-                            terminate = True
-                            break
-                        logger.error(f"Failed to process request worker exception {e}")
-                        actor_failures += 1
-                        completed += 1
-                        break
-                if terminate:
+                # we can have several workers fail here
+                n_files, e = RayUtils._get_next_request(executors=executors, in_flight=in_flight)
+                completed += n_files
+                if isinstance(e, RayError):
+                    # Ray exception - terminate
+                    logger.error(f"Got Ray worker exception {e}, terminating")
                     raise UnrecoverableException
-                executors.submit(lambda a, v: a.process_file.remote(v), path)
+                if e is not None:
+                    logger.error(f"Failed to process request worker exception {e}")
+                    actor_failures += 1
+                _submit(batch)
 
-                completed += 1
                 files_completed_gauge.set(completed)
-                RayUtils.get_available_resources(
-                    available_cpus_gauge=available_cpus_gauge,
-                    available_gpus_gauge=available_gpus_gauge,
-                    available_memory_gauge=available_memory_gauge,
-                    object_memory_gauge=object_memory_gauge,
-                )
-                if completed % print_interval == 0:
+                _refresh_resources()
+                if completed >= next_print:
+                    next_print = completed + print_interval
                     logger.info(f"Completed {completed} files in {round((time.time() - t_start)/60., 3)} min")
         # Wait for completion
         files_completed_gauge.set(completed)
@@ -209,30 +256,41 @@ class RayUtils:
             f"Completed {completed} files ({round(100 * completed / len(files), 3)}%)  "
             f"in {round((time.time() - t_start)/60., 3)} min. Waiting for completion"
         )
-        while executors.has_next():
-            while True:
-                # we can have several workers fail here
-                try:
-                    executors.get_next_unordered()
-                    break
-                except Exception as e:
-                    logger.error(f"Failed to process request worker exception {e}")
-                    actor_failures += 1
-                    completed += 1
+        while len(in_flight) > 0:
+            # we can have several workers fail here
+            n_files, e = RayUtils._get_next_request(executors=executors, in_flight=in_flight)
+            completed += n_files
+            if e is not None:
+                logger.error(f"Failed to process request worker exception {e}")
+                actor_failures += 1
             running -= 1
-            completed += 1
             files_in_progress_gauge.set(running)
             files_completed_gauge.set(completed)
-            RayUtils.get_available_resources(
-                available_cpus_gauge=available_cpus_gauge,
-                available_gpus_gauge=available_gpus_gauge,
-                available_memory_gauge=available_memory_gauge,
-                object_memory_gauge=object_memory_gauge,
-            )
+            _refresh_resources()
 
         logger.info(f"Completed processing {completed} files in {round((time.time() - t_start)/60, 3)} min")
         return actor_failures
 
+    @staticmethod
+    def _get_next_request(
+        executors: ActorPool, in_flight: dict[ray.ObjectRef, tuple[ActorHandle, int]]
+    ) -> tuple[int, Exception]:
+        """
+        Wait for the completion of the next request in flight and return its actor to the pool. Requests are
+        tracked here, rather than by the actor pool, so that all the files of a failed batch are counted
+        :param executors: actor pool of executors
+        :param in_flight: requests in flight - reply reference to the actor and the number of files
+        :return: number of files of the completed request and exception, if the request failed
+        """
+        ready, _ = ray.wait(list(in_flight.keys()), num_returns=1)
+        actor, n_files = in_flight.pop(ready[0])
+        executors.push(actor)
+        try:
+            ray.get(ready[0])
+        except Exception as e:
+            return n_files, e
+        return n_files, None
+
     @staticmethod
     def wait_for_execution_completion(logger: logging.Logger, replies: list[ray.ObjectRef]) -> int:
         """
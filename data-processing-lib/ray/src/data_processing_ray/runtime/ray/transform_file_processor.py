@@ -10,6 +10,8 @@
 # limitations under the License.
 ################################################################################
 
+import threading
+import time
 from typing import Any
 
 import ray
@@ -31,18 +33,33 @@ class RayTransformFileProcessor(AbstractTransformFileProcessor):
             transform_class: local transform class
             transform_params: dictionary of parameters for local transform creation
             statistics: object reference to statistics
+            prefetch_depth: number of files read while the transform is running
+            write_behind_depth: max number of files written in the background
+            stats_push_interval: interval (sec) between pushes of the locally accumulated statistics
         """
         super().__init__(
             data_access_factory=params.get("data_access_factory", None),
             transform_parameters=dict(params.get("transform_params", {})),
-            is_folder=params.get("is_folder", False)
+            is_folder=params.get("is_folder", False),
+            prefetch_depth=params.get("prefetch_depth", 0),
+            write_behind_depth=params.get("write_behind_depth", 0),
         )
+        if params.get("prefetch_depth", 0) > 0:
+            # The actor is created with max_concurrency of prefetch_depth + 1, so that reads of the
+            # following files overlap transform execution. The transform itself is executed serially.
+            self.transform_lock = threading.Lock()
         # Create statistics
         self.stats = params.get("statistics", None)
         if self.stats is None:
             self.logger.error("Transform file processor: statistics is not specified")
             raise UnrecoverableException("statistics is None")
         self.transform_params["statistics"] = self.stats
+        # statistics are accumulated locally and pushed to the statistics actor periodically and on flush,
+        # reducing the amount of remote calls to the statistics actor
+        self.local_stats = {}
+        self.local_stats_lock = threading.Lock()
+        self.stats_push_interval = params.get("stats_push_interval", 10)
+        self.last_stats_push = time.time()
         # Create local processor
         try:
             self.transform = params.get("transform_class", None)(self.transform_params)
@@ -50,5 +67,46 @@ class RayTransformFileProcessor(AbstractTransformFileProcessor):
             self.logger.error(f"Exception creating transform  {e}")
             raise UnrecoverableException("failed creating transform")
 
+    def process_files(self, f_names: list[str]) -> int:
+        """
+        Process a batch of files in a single actor call. Reads of the batch files are overlapped
+        with processing, if prefetch is enabled
+        :param f_names: list of file names
+        :return: number of processed files
+        """
+        for index, f_name in enumerate(f_names):
+            self.prefetch(f_names[index : index + 1 + self.prefetch_depth])
+            self.process_file(f_name)
+        return len(f_names)
+
+    def flush(self) -> None:
+        """
+        Flush transform and push the remaining statistics. The push is synchronous, so that all of the
+        statistics are available once flush completes
+        :return: None
+        """
+        super().flush()
+        ray.get(self._push_stats())
+
     def _publish_stats(self, stats: dict[str, Any]) -> None:
-        self.stats.add_stats.remote(stats)
+        """
+        Accumulate statistics locally, pushing them to the statistics actor once push interval expires
+        :param stats: statistics
+        :return: None
+        """
+        with self.local_stats_lock:
+            for key, val in stats.items():
+                self.local_stats[key] = self.local_stats.get(key, 0) + val
+        if time.time() - self.last_stats_push >= self.stats_push_interval:
+            self._push_stats()
+
+    def _push_stats(self) -> ray.ObjectRef:
+        """
+        Push locally accumulated statistics to the statistics actor
+        :return: reference to the result of the remote call
+        """
+        with self.local_stats_lock:
+            stats = self.local_stats
+            self.local_stats = {}
+            self.last_stats_push = time.time()
+        return self.stats.add_stats.remote(stats)
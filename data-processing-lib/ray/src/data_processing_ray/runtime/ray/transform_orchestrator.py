@@ -17,6 +17,7 @@ from datetime import datetime
 import ray
 from data_processing.data_access import DataAccessFactoryBase
 from data_processing.transform import AbstractFolderTransform
+from data_processing.utils import MB
 from data_processing_ray.runtime.ray import (
     RayTransformExecutionConfiguration,
     RayTransformFileProcessor,
@@ -91,16 +92,24 @@ def orchestrate(
             ),
             "statistics": statistics,
             "is_folder": is_folder,
+            "prefetch_depth": preprocessing_params.prefetch_depth,
+            "write_behind_depth": preprocessing_params.write_behind_depth,
         }
         logger.debug("Creating actors")
+        actor_options = preprocessing_params.worker_options
+        # with prefetch every actor is executing several requests concurrently, reading files
+        # for the next requests, while processing the current one
+        concurrency = preprocessing_params.prefetch_depth + 1
+        if concurrency > 1:
+            actor_options = actor_options | {"max_concurrency": concurrency}
         processors = RayUtils.create_actors(
             clazz=RayTransformFileProcessor,
             params=processor_params,
-            actor_options=preprocessing_params.worker_options,
+            actor_options=actor_options,
             n_actors=preprocessing_params.n_workers,
             creation_delay=preprocessing_params.creation_delay,
         )
-        processors_pool = ActorPool(processors)
+        processors_pool = ActorPool(processors * concurrency)
         # create gauges
         files_in_progress_gauge = Gauge("files_in_progress", "Number of files in progress")
         files_completed_gauge = Gauge("files_processed_total", "Number of files completed")
@@ -121,6 +130,8 @@ def orchestrate(
             available_memory_gauge=available_memory_gauge,
             object_memory_gauge=available_object_memory_gauge,
             logger=logger,
+            file_sizes=None if is_folder else data_access.get_input_file_sizes(),
+            batch_size=int(preprocessing_params.file_batch_mb * MB),
         )
         if failures > 0:
             statistics.add_stats.remote({"actor failures": failures})
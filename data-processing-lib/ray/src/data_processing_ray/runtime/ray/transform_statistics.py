@@ -44,33 +44,28 @@ class TransformStatisticsRay(TransformStatistics):
             name="transform_exceptions", description="Transform exception occurred"
         )
         self.data_retries_counter = Counter(name="data_access_retries", description="Data access retries")
+        # counters fed by the statistics keys
+        self.counters = {
+            "source_files": self.source_files_counter,
+            "source_size": self.data_read_counter,
+            "result_files": self.result_files_counter,
+            "source_doc_count": self.source_documents_counter,
+            "result_doc_count": self.result_documents_counter,
+            "skipped empty tables": self.empty_table_counter,
+            "failed_reads": self.failed_read_counter,
+            "failed_writes": self.failed_write_counter,
+            "transform execution exception": self.transform_exceptions_counter,
+            "data access retries": self.data_retries_counter,
+        }
 
     def add_stats(self, stats=dict[str, Any]) -> None:
         """
-        Add statistics
+        Add statistics. Workers accumulate their statistics locally, so a single call typically carries
+        statistics of multiple files. Metrics counters are updated from the same (aggregated) values
         :param stats - dictionary creating new statistics
         :return: None
         """
         for key, val in stats.items():
             self.stats[key] = self.stats.get(key, 0) + val
-            if val > 0:
-                if key == "source_files":
-                    self.source_files_counter.inc(val)
-                if key == "source_size":
-                    self.data_read_counter.inc(val)
-                if key == "result_files":
-                    self.result_files_counter.inc(val)
-                if key == "source_doc_count":
-                    self.source_documents_counter.inc(val)
-                if key == "result_doc_count":
-                    self.result_documents_counter.inc(val)
-                if key == "skipped empty tables":
-                    self.empty_table_counter.inc(val)
-                if key == "failed_reads":
-                    self.failed_read_counter.inc(val)
-                if key == "failed_writes":
-                    self.failed_write_counter.inc(val)
-                if key == "transform execution exception":
-                    self.transform_exceptions_counter.inc(val)
-                if key == "data access retries":
-                    self.data_retries_counter.inc(val)
+            if val > 0 and key in self.counters:
+                self.counters[key].inc(val)
@@ -0,0 +1,64 @@
+# (C) Copyright IBM Corp. 2024.
+# Licensed under the Apache License, Version 2.0 (the “License”);
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#  http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an “AS IS” BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+import os
+import threading
+from argparse import ArgumentParser
+
+import ray
+from data_processing.data_access import DataAccessFactory
+from data_processing.test_support.transform import NOOPTransform
+from data_processing.utils import ParamsUtils
+from data_processing_ray.runtime.ray import TransformStatisticsRay
+from data_processing_ray.runtime.ray.transform_file_processor import (
+    RayTransformFileProcessor,
+)
+
+
+def test_process_files_prefetch(tmp_path):
+    """
+    Verify that the files of a batch are read by the prefetch threads of the file processor
+    """
+    basedir = "../../../../test-data/data_processing/ray/noop/"
+    basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), basedir))
+    daf = DataAccessFactory()
+    parser = ArgumentParser()
+    daf.add_input_params(parser)
+    local_conf = {"input_folder": basedir + "/input", "output_folder": str(tmp_path)}
+    args = parser.parse_args(["--data_local_config", ParamsUtils.convert_to_ast(local_conf)])
+    daf.apply_input_params(args)
+    files, _, _ = daf.create_data_access().get_files_to_process()
+    assert len(files) > 1
+
+    ray.init(ignore_reinit_error=True)
+    # use the actor class directly, so that the reads can be observed
+    processor = RayTransformFileProcessor.__ray_actor_class__(
+        {
+            "data_access_factory": daf,
+            "transform_class": NOOPTransform,
+            "transform_params": {"sleep_sec": 0},
+            "statistics": TransformStatisticsRay.remote({}),
+            "prefetch_depth": 2,
+        }
+    )
+    readers = []
+    read_file = processor._read_file
+
+    def _read_file(f_name: str) -> tuple[bytes, int]:
+        readers.append(threading.current_thread().name)
+        return read_file(f_name)
+
+    processor._read_file = _read_file
+    assert processor.process_files(files) == len(files)
+    assert len(readers) == len(files)
+    assert all(reader.startswith("prefetch") for reader in readers)
+    assert len([f for f in tmp_path.rglob("*.parquet")]) == len(files)
@@ -13,8 +13,10 @@
 import pyarrow as pa
 import pytest
 import ray
-from data_processing.utils import GB, TransformUtils
+from data_processing.utils import GB, TransformUtils, get_logger
 from data_processing_ray.runtime.ray import RayUtils, TransformStatisticsRay
+from ray.util import ActorPool
+from ray.util.metrics import Gauge
 
 
 params = {}
@@ -103,3 +105,60 @@ def test_actor_creation():
     assert 1 == res["memory"] - res1["memory"]
 
     ray.shutdown()
+
+
+def test_schedule_files():
+    sizes = {"a": 100, "b": 5, "c": 3, "d": 50, "e": 2, "f": 1}
+    # without sizes original order is used
+    assert RayUtils.schedule_files(files=list(sizes)) == [["a"], ["b"], ["c"], ["d"], ["e"], ["f"]]
+    # largest files first
+    assert RayUtils.schedule_files(files=list(sizes), file_sizes=sizes) == [["a"], ["d"], ["b"], ["c"], ["e"], ["f"]]
+    # small files are batched
+    assert RayUtils.schedule_files(files=list(sizes), file_sizes=sizes, batch_size=6) == [
+        ["a"],
+        ["d"],
+        ["b"],
+        ["c", "e", "f"],
+    ]
+
+
+@ray.remote
+class FailingProcessor:
+    """
+    File processor failing on the files with names starting with "bad"
+    """
+
+    def process_file(self, f_name: str) -> None:
+        if f_name.startswith("bad"):
+            raise ValueError(f"failed {f_name}")
+
+    def process_files(self, f_names: list[str]) -> int:
+        for f_name in f_names:
+            self.process_file(f_name)
+        return len(f_names)
+
+
+def test_process_files_failures():
+    ray.init(ignore_reinit_error=True)
+    executors = ActorPool([FailingProcessor.remote() for _ in range(2)])
+    gauge = Gauge("test_process_files", description="test gauge")
+    sizes = {"bad1": 100, "a": 50, "bad2": 5, "b": 5, "c": 5, "d": 5, "e": 5}
+    failures = RayUtils.process_files(
+        executors=executors,
+        files=list(sizes),
+        print_interval=100,
+        files_in_progress_gauge=gauge,
+        files_completed_gauge=gauge,
+        available_cpus_gauge=gauge,
+        available_gpus_gauge=gauge,
+        available_memory_gauge=gauge,
+        object_memory_gauge=gauge,
+        logger=get_logger(__name__),
+        file_sizes=sizes,
+        batch_size=15,
+    )
+    # single file request and a batch of 3 files failed
+    assert failures == 2
+    # all the actors are returned to the pool
+    assert executors.has_free() and executors.pop_idle() is not None and executors.pop_idle() is not None
+    ray.shutdown()
@@ -82,4 +82,4 @@ class SparkTransformExecutionConfiguration(TransformExecutionConfiguration):
         """
         return {
             "RDD parallelization": self.parallelization,
-        }
+        } | TransformExecutionConfiguration.get_input_params(self)
@@ -121,9 +121,13 @@ def orchestrate(
             runtime_configuration=runtime_conf,
             statistics=statistics,
             is_folder=is_folder,
+            prefetch_depth=prefetch_depth,
+            write_behind_depth=write_behind_depth,
         )
         first = True
-        for f in iterator:
+        # partition's file list is needed to read files ahead
+        partition_files = list(iterator)
+        for index, f in enumerate(partition_files):
             # for every file
             if first:
                 logger.debug(f"partition {f}")
@@ -137,6 +141,8 @@ def orchestrate(
                 # create transform with partition number
                 file_processor.create_transform(transform_params)
                 first = False
+            # read next files while processing the current one
+            file_processor.prefetch([name for name, _ in partition_files[index : index + 1 + prefetch_depth]])
             # process file
             file_processor.process_file(f_name=f[0])
         # flush
@@ -147,6 +153,8 @@ def orchestrate(
         return list(statistics.get_execution_stats().items())
 
     num_partitions = 0
+    prefetch_depth = execution_configuration.prefetch_depth
+    write_behind_depth = execution_configuration.write_behind_depth
     is_folder = issubclass(runtime_config.get_transform_class(), AbstractFolderTransform)
     try:
         if is_folder:
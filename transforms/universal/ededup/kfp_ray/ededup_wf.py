@@ -90,6 +90,7 @@ def ededup(
     ededup_doc_column: str = "contents",
     ededup_use_snapshot: bool = False,
     ededup_snapshot_directory: str = "",
+    ededup_local_cache_size: int = 0,
     # data sampling
     ededup_n_samples: int = 10,
     # additional parameters
@@ -132,6 +133,8 @@ def ededup(
     :param ededup_doc_column - key for accessing data
     :param ededup_use_snapshot - flag to start from existing snapshot
     :param ededup_snapshot_directory: str - snapshot directory
+    :param ededup_local_cache_size - number of hashes cached by each worker, 0 to disable the cache,
+                                     negative to size it from the estimated number of documents per worker
     :param ededup_n_samples - number of samples for parameters computation
     :return: None
     """
@@ -155,6 +158,7 @@ def ededup(
             ededup_use_snapshot=ededup_use_snapshot,
             ededup_snapshot_directory=ededup_snapshot_directory,
             ededup_n_samples=ededup_n_samples,
+            ededup_local_cache_size=ededup_local_cache_size,
         )
         ComponentUtils.add_settings_to_component(compute_exec_params, ONE_HOUR_SEC * 2)
         ComponentUtils.set_s3_env_vars_to_component(compute_exec_params, data_s3_access_secret)
@@ -25,6 +25,7 @@ def ededup_compute_execution_params(
     ededup_use_snapshot: bool,  # flag to start from snapshot
     ededup_snapshot_directory: str,  # snapshot directory
     ededup_n_samples: int,  # number of samples for parameters computation
+    ededup_local_cache_size: int = 0,  # local cache size, 0 - disabled, negative - sized from the data
 ) -> dict:
     """
     Compute exact dedup execution parameters
@@ -42,6 +43,8 @@ def ededup_compute_execution_params(
     :param ededup_use_snapshot - flag to start from existing snapshot
     :param ededup_snapshot_directory: str - snapshot directory
     :param ededup_n_samples - umber of samples for parameters computation
+    :param ededup_local_cache_size - number of hashes cached by each worker, 0 to disable the cache,
+                                     negative to size it from the estimated number of documents per worker
     :return: a dictionary with a Ray Job execution parameters
     """
     # required import
@@ -53,6 +56,7 @@ def ededup_compute_execution_params(
     from runtime_utils import KFPUtils
 
     EXECUTION_OF_KB_DOC = 0.00025
+    MAX_LOCAL_CACHE_SIZE = 1 << 24
 
     # Get cluster parameters
     w_options = worker_options
@@ -103,8 +107,16 @@ def ededup_compute_execution_params(
     # Limit amount of workers and processors to prevent S3 saturation
     if n_workers > 1000:
         n_workers = 1000
+    # local caches of hashes known to hash actors, if requested sized to the hashes seen by a worker.
+    # 32 bytes per hash, doubled for the hash table load
+    local_cache_size = ededup_local_cache_size
+    if local_cache_size < 0:
+        local_cache_size = min(math.ceil(number_of_docs / n_workers), MAX_LOCAL_CACHE_SIZE)
+    required_cache_mem = n_workers * local_cache_size * 32 * 2 / GB
+    if local_cache_size > 0:
+        print(f"Local cache size {local_cache_size}, required memory {required_cache_mem} GB")
     # validate that we have enough memory
-    r_mem = required_hash_mem * 2 + avg_table_size * 4 * n_workers
+    r_mem = required_hash_mem * 2 + avg_table_size * 4 * n_workers + required_cache_mem
     print(f"Required execution memory {r_mem} GB")
     if r_mem > cluster_memory:
         print(f"Not enough memory to run de duping, required {r_mem}, available {cluster_memory}")
@@ -128,4 +140,5 @@ def ededup_compute_execution_params(
         "ededup_use_snapshot": ededup_use_snapshot,
         "ededup_snapshot_directory": ededup_snapshot_directory,
         "ededup_num_hashes": n_hashes,
+        "ededup_local_cache_size": local_cache_size,
     }
@@ -10,16 +10,20 @@
 # limitations under the License.
 ################################################################################
 
+import hashlib
+import json
 import pickle
+import string
 from argparse import ArgumentParser, Namespace
-from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator
 
+import numpy as np
+import polars as pl
 import pyarrow as pa
-from data_processing.data_access import SnapshotUtils
-from data_processing.transform import (
-    AbstractTableTransform,
-    TransformConfiguration,
-)
+import pyarrow.compute as pc
+from data_processing.data_access import DataAccess, SnapshotUtils
+from data_processing.transform import AbstractTableTransform, TransformConfiguration
 from data_processing.utils import (
     GB,
     CLIArgumentProvider,
@@ -31,16 +35,499 @@ from data_processing.utils import (
 
 
 REQUEST_LEN = 8192
+MIN_HASH_SLICE_LEN = 1024
 short_name = "ededup"
 cli_prefix = f"{short_name}_"
 doc_column_name_key = "doc_column"
 int_column_name_key = "doc_id_column"
 use_snapshot_key = "use_snapshot"
 snapshot_directory_key = "snapshot_directory"
+hash_store_key = "hash_store"
+digest_bits_key = "digest_bits"
+hash_threads_key = "hash_threads"
+snapshot_format_key = "snapshot_format"
+snapshot_max_segments_key = "snapshot_max_segments"
 doc_column_name_cli_param = f"{cli_prefix}{doc_column_name_key}"
 int_column_name_cli_param = f"{cli_prefix}{int_column_name_key}"
 use_snapshot_cli_param = f"{cli_prefix}{use_snapshot_key}"
 snapshot_directory_cli_param = f"{cli_prefix}{snapshot_directory_key}"
+hash_store_cli_param = f"{cli_prefix}{hash_store_key}"
+digest_bits_cli_param = f"{cli_prefix}{digest_bits_key}"
+hash_threads_cli_param = f"{cli_prefix}{hash_threads_key}"
+snapshot_format_cli_param = f"{cli_prefix}{snapshot_format_key}"
+snapshot_max_segments_cli_param = f"{cli_prefix}{snapshot_max_segments_key}"
+
+hash_store_default = "array"
+digest_bits_default = 128
+hash_threads_default = 1
+snapshot_format_default = "full"
+snapshot_max_segments_default = 10
+snapshot_manifest_name = "hash_manifest.json"
+segment_magic = b"DPKSEG01"
+
+
+def _hash_docs(docs: pa.ChunkedArray) -> list[str]:
+    """
+    Compute hashes of documents, identical to TransformUtils.str_to_hash(TransformUtils.normalize_string(str(doc)))
+    for every document. Normalization is done on the whole column; white spaces are removed before, and
+    punctuation after lower casing, as lower casing of some characters depends on their neighbours
+    :param docs: documents column
+    :return: list of sha256 hex string hashes
+    """
+    if pa.types.is_string(docs.type) or pa.types.is_large_string(docs.type):
+        contents = pl.from_arrow(docs).fill_null("None")
+    else:
+        contents = pl.Series([str(doc) for doc in docs.to_pylist()], dtype=pl.String)
+    normalized = contents.str.replace_all("[ \n]", "").str.to_lowercase()
+    normalized = normalized.str.replace_many(list(string.punctuation), [""]).cast(pl.Binary)
+    return [hashlib.sha256(doc).hexdigest() for doc in normalized.to_list()]
+
+
+def get_doc_hashes(docs: pa.ChunkedArray, n_threads: int = hash_threads_default) -> list[str]:
+    """
+    Compute hashes of documents, using multiple threads for large columns. Both normalization and hashing
+    (of documents larger than 2KB) release the GIL, so threads are running in parallel
+    :param docs: documents column
+    :param n_threads: number of threads
+    :return: list of sha256 hex string hashes
+    """
+    slice_len = max(-(-len(docs) // n_threads), MIN_HASH_SLICE_LEN)
+    if slice_len >= len(docs):
+        return _hash_docs(docs)
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        slices = executor.map(_hash_docs, [docs.slice(start, slice_len) for start in range(0, len(docs), slice_len)])
+        return [h for hashes in slices for h in hashes]
+
+
+def hashes_to_digests(hashes: list[str] | np.ndarray, digest_words: int) -> np.ndarray:
+    """
+    Convert hashes to binary digests, kept as 64 bit words. Hashes are truncated to their first
+    digest_words words. Word 0 of a digest is never 0 (this value marks empty slots of hash stores),
+    so it is replaced by 1
+    :param hashes: list of hex string hashes or array of digests
+    :param digest_words: number of 64 bit words of digests
+    :return: np.array of uint64 digests of shape (number of hashes, digest_words)
+    """
+    if isinstance(hashes, np.ndarray):
+        if hashes.shape[1] < digest_words:
+            raise UnrecoverableException(f"Can not extend {hashes.shape[1] * 64} bit digests to {digest_words * 64}")
+        return hashes[:, :digest_words]
+    if len(hashes) == 0:
+        return np.zeros((0, digest_words), dtype=np.uint64)
+    # all hashes have the same length (hex digests of the same hash function)
+    b_digests = bytes.fromhex("".join(hashes))
+    digests = np.frombuffer(b_digests, dtype=">u8").reshape(len(hashes), -1)[:, :digest_words].astype(np.uint64)
+    digests[digests[:, 0] == 0, 0] = 1
+    return digests
+
+
+def get_shard_indices(hashes: list[str] | np.ndarray, n_shards: int) -> list[np.ndarray]:
+    """
+    Get positions of the hashes of every shard (hash actor), based on the first 64 bits of the hashes.
+    Hex string hashes and their digests are assigned to the same shard
+    :param hashes: list of hex string hashes or array of digests
+    :param n_shards: number of shards
+    :return: np.array of hash positions for every shard
+    """
+    shards = hashes_to_digests(hashes, 1)[:, 0] % np.uint64(n_shards)
+    return [np.flatnonzero(shards == shard) for shard in range(n_shards)]
+
+
+def shard_hashes(hashes: list[str] | np.ndarray, n_shards: int) -> list[list[str] | np.ndarray]:
+    """
+    Split hashes between shards (hash actors), see get_shard_indices
+    :param hashes: list of hex string hashes or array of digests
+    :param n_shards: number of shards
+    :return: hashes of every shard
+    """
+    indices = get_shard_indices(hashes, n_shards)
+    if isinstance(hashes, np.ndarray):
+        return [hashes[index] for index in indices]
+    return [[hashes[i] for i in index] for index in indices]
+
+
+class HashStore:
+    """
+    Base class of hash stores, keeping hashes of the documents seen so far
+    """
+
+    def add_hashes(self, hashes: list[str] | np.ndarray) -> None:
+        """
+        Add hashes
+        :param hashes: hashes to add
+        :return: None
+        """
+        raise NotImplementedError
+
+    def get_unique(self, hashes: list[str] | np.ndarray) -> list[str] | np.ndarray:
+        """
+        Get hashes not in the store and add them to the store
+        :param hashes: new hashes
+        :return: unique hashes, in the order of their first occurrence
+        """
+        indices = self.get_unique_indices(hashes)
+        if isinstance(hashes, np.ndarray):
+            return hashes[indices]
+        return [hashes[i] for i in indices]
+
+    def get_unique_indices(self, hashes: list[str] | np.ndarray) -> np.ndarray:
+        """
+        Get positions of hashes not in the store and add them to the store
+        :param hashes: new hashes
+        :return: np.array of positions of the first occurrences of unique hashes
+        """
+        raise NotImplementedError
+
+    def get_hashes(self) -> list[str] | np.ndarray:
+        """
+        Get content of the store
+        :return: all hashes of the store
+        """
+        raise NotImplementedError
+
+    def get_size(self) -> tuple[int, int]:
+        """
+        Get size of the store
+        :return: number of hashes and memory footprint in bytes
+        """
+        raise NotImplementedError
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize content of the store for snapshotting
+        :return: snapshot content
+        """
+        raise NotImplementedError
+
+
+class SetHashStore(HashStore):
+    """
+    Hash store keeping hex string hashes in a python set. Snapshots are pickled sets
+    """
+
+    def __init__(self, hashes: set[str] = None):
+        self.hashes = set() if hashes is None else hashes
+
+    def add_hashes(self, hashes: list[str] | np.ndarray) -> None:
+        if isinstance(hashes, np.ndarray):
+            raise UnrecoverableException("set hash store can not restore hashes from binary digests")
+        self.hashes.update(hashes)
+
+    def get_unique_indices(self, hashes: list[str] | np.ndarray) -> np.ndarray:
+        if isinstance(hashes, np.ndarray):
+            raise UnrecoverableException("set hash store can not check binary digests")
+        unique = []
+        for i, h in enumerate(hashes):
+            if h not in self.hashes:
+                # If a hash does not exist, add it to unique and add to the local set
+                self.hashes.add(h)
+                unique.append(i)
+        return np.array(unique, dtype=np.int64)
+
+    def get_hashes(self) -> list[str] | np.ndarray:
+        return list(self.hashes)
+
+    def get_size(self) -> tuple[int, int]:
+        return len(self.hashes), TransformUtils.deep_get_size(self.hashes)
+
+    def to_bytes(self) -> bytes:
+        return pickle.dumps(self.hashes)
+
+
+class ArrayHashStore(HashStore):
+    """
+    Hash store keeping binary digests (64 bit or 128 bit) in an open addressing (linear probing) hash
+    table, implemented as a numpy array of shape (capacity, digest words). Lookups and insertions are
+    done for a batch of hashes at once. Snapshots are a header followed by the raw table, so restoring
+    from a (memory mapped) snapshot does not copy or rehash the content until new hashes are added
+    """
+
+    magic = b"DPKHASH1"
+    header_size = 32
+    initial_capacity = 1 << 10
+    max_load = 0.75
+
+    def __init__(self, digest_bits: int = digest_bits_default, buffer: pa.Buffer | bytes = None):
+        """
+        Create a store
+        :param digest_bits: number of bits of digests, 64 or 128
+        :param buffer: snapshot content (created by to_bytes) to restore the store from
+        """
+        if buffer is None:
+            if digest_bits not in [64, 128]:
+                raise UnrecoverableException(f"digest bits should be 64 or 128, got {digest_bits}")
+            self.digest_words = digest_bits // 64
+            self.count = 0
+            self.table = np.zeros((self.initial_capacity, self.digest_words), dtype=np.uint64)
+            return
+        if bytes(buffer[:8]) != self.magic:
+            raise UnrecoverableException("unknown format of hash snapshot")
+        header = np.frombuffer(buffer, dtype=np.uint64, count=4)
+        self.digest_words, self.count, capacity = int(header[1]), int(header[2]), int(header[3])
+        # read only view of the snapshot, copied on the first insertion
+        self.table = np.frombuffer(
+            buffer, dtype=np.uint64, count=capacity * self.digest_words, offset=self.header_size
+        ).reshape(capacity, self.digest_words)
+
+    def add_hashes(self, hashes: list[str] | np.ndarray) -> None:
+        self.get_unique(hashes)
+
+    def get_unique_indices(self, hashes: list[str] | np.ndarray) -> np.ndarray:
+        if len(hashes) == 0:
+            return np.zeros(0, dtype=np.int64)
+        digests = hashes_to_digests(hashes, self.digest_words)
+        # only first occurrences of a hash in the batch are candidates for insertion
+        order = np.lexsort(digests.T[::-1])
+        sorted_digests = digests[order]
+        first = order[np.r_[True, np.any(sorted_digests[1:] != sorted_digests[:-1], axis=1)]]
+        first.sort()
+        return first[self._insert(digests[first])]
+
+    def get_hashes(self) -> list[str] | np.ndarray:
+        return self.table[self.table[:, 0] != 0]
+
+    def contains(self, hashes: list[str] | np.ndarray) -> np.ndarray:
+        """
+        Check which hashes are in the store, without adding them
+        :param hashes: hashes to check
+        :return: boolean np.array, True for hashes in the store
+        """
+        digests = hashes_to_digests(hashes, self.digest_words)
+        mask = len(self.table) - 1
+        slots = self._slots(digests)
+        found = np.zeros(len(digests), dtype=bool)
+        pending = np.arange(len(digests))
+        while len(pending) > 0:
+            current = self.table[slots[pending]]
+            matching = np.all(current == digests[pending], axis=1)
+            found[pending[matching]] = True
+            # probing stops at an empty slot
+            pending = pending[~matching & (current[:, 0] != 0)]
+            slots[pending] = (slots[pending] + 1) & mask
+        return found
+
+    def get_size(self) -> tuple[int, int]:
+        return self.count, self.table.nbytes
+
+    def to_bytes(self) -> bytes:
+        header = np.array([self.digest_words, self.count, len(self.table)], dtype=np.uint64).tobytes()
+        return self.magic + header + self.table.tobytes()
+
+    def _slots(self, digests: np.ndarray) -> np.ndarray:
+        """
+        Get home slots of digests, using Fibonacci hashing of their first word, so that digests of a
+        single shard (sharing their low bits) are spread over the table
+        :param digests: digests
+        :return: np.array of slot indices
+        """
+        shift = np.uint64(64 - (len(self.table).bit_length() - 1))
+        return ((digests[:, 0] * np.uint64(0x9E3779B97F4A7C15)) >> shift).astype(np.int64)
+
+    def _insert(self, digests: np.ndarray) -> np.ndarray:
+        """
+        Insert distinct digests into the table. All digests are probed in parallel: digests finding
+        themselves are done, digests finding an empty slot are inserted (one per slot, the others retry
+        the same slot) and digests finding another digest move to the next slot
+        :param digests: distinct digests
+        :return: boolean np.array, True for inserted (new) digests
+        """
+        capacity = len(self.table)
+        while self.count + len(digests) > capacity * self.max_load:
+            capacity *= 2
+        if capacity != len(self.table):
+            self._resize(capacity)
+        elif not self.table.flags.writeable:
+            self.table = self.table.copy()
+        mask = capacity - 1
+        slots = self._slots(digests)
+        inserted = np.zeros(len(digests), dtype=bool)
+        pending = np.arange(len(digests))
+        while len(pending) > 0:
+            pending_slots = slots[pending]
+            current = self.table[pending_slots]
+            # digests probing empty slots claim them, one of the digests claiming the same slot wins
+            empty = current[:, 0] == 0
+            self.table[pending_slots[empty]] = digests[pending[empty]]
+            current[empty] = self.table[pending_slots[empty]]
+            found = np.all(current == digests[pending], axis=1)
+            inserted[pending[empty & found]] = True
+            self.count += int(np.count_nonzero(empty & found))
+            # digests colliding with other digests are probing the next slot
+            pending = pending[~found]
+            slots[pending] = (slots[pending] + 1) & mask
+        return inserted
+
+    def _resize(self, capacity: int) -> None:
+        """
+        Rebuild the table with a given capacity (power of 2)
+        :param capacity: new capacity
+        :return: None
+        """
+        digests = self.get_hashes()
+        self.table = np.zeros((capacity, self.digest_words), dtype=np.uint64)
+        self.count = 0
+        if len(digests) > 0:
+            self._insert(digests)
+
+
+def create_hash_store(params: dict[str, Any], snapshot: pa.Buffer | bytes = None) -> HashStore:
+    """
+    Create a hash store, optionally restoring it from a snapshot. Array stores can be restored from
+    snapshots of either store type, so existing (pickled) snapshots are converted to the binary format
+    :param params: parameters, including hash_store ("array" or "set") and digest_bits (64 or 128)
+    :param snapshot: snapshot content
+    :return: hash store
+    """
+    store_type = params.get(hash_store_key, hash_store_default)
+    digest_bits = params.get(digest_bits_key, digest_bits_default)
+    if store_type not in ["array", "set"]:
+        raise UnrecoverableException(f"unknown hash store {store_type}")
+    if snapshot is None:
+        return ArrayHashStore(digest_bits=digest_bits) if store_type == "array" else SetHashStore()
+    if bytes(snapshot[:8]) != ArrayHashStore.magic:
+        hashes = pickle.loads(snapshot)
+        if store_type == "set":
+            return SetHashStore(hashes)
+        store = ArrayHashStore(digest_bits=digest_bits)
+        store.add_hashes(list(hashes))
+        return store
+    if store_type == "set":
+        raise UnrecoverableException("set hash store can not be restored from a binary snapshot")
+    store = ArrayHashStore(buffer=snapshot)
+    if store.digest_words * 64 != digest_bits:
+        # snapshot taken with a different digest size
+        digests = store.get_hashes()
+        store = ArrayHashStore(digest_bits=digest_bits)
+        store.add_hashes(digests)
+    return store
+
+
+def get_snapshot_hashes(snapshot: pa.Buffer | bytes) -> list[str] | np.ndarray:
+    """
+    Get hashes of a snapshot of any hash store type
+    :param snapshot: snapshot content
+    :return: list of hex string hashes or array of digests
+    """
+    if bytes(snapshot[:8]) == ArrayHashStore.magic:
+        return ArrayHashStore(buffer=snapshot).get_hashes()
+    return list(pickle.loads(snapshot))
+
+
+def segment_to_bytes(digests: np.ndarray) -> bytes:
+    """
+    Serialize digests as a snapshot segment: a header followed by the sorted digests. Segments are
+    immutable, every run writes new segments and references the ones of previous runs in a manifest
+    :param digests: digests
+    :return: segment content
+    """
+    digests = digests[np.lexsort(digests.T[::-1])]
+    header = np.array([digests.shape[1], len(digests)], dtype=np.uint64).tobytes()
+    return segment_magic + header + digests.tobytes()
+
+
+def segment_to_digests(segment: pa.Buffer | bytes) -> np.ndarray:
+    """
+    Get digests of a snapshot segment, without copying them
+    :param segment: segment content (created by segment_to_bytes)
+    :return: np.array of digests
+    """
+    if bytes(segment[:8]) != segment_magic:
+        raise UnrecoverableException("unknown format of hash snapshot segment")
+    header = np.frombuffer(segment, dtype=np.uint64, count=3)
+    digest_words, count = int(header[1]), int(header[2])
+    return np.frombuffer(segment, dtype=np.uint64, count=count * digest_words, offset=24).reshape(count, digest_words)
+
+
+def get_snapshot_directory(params: dict[str, Any], data_access: DataAccess) -> str:
+    """
+    Get directory of the snapshot to continue from
+    :param params: parameters, including optional snapshot_directory
+    :param data_access: data access
+    :return: snapshot directory, ending with /
+    """
+    snapshot_path = params.get(snapshot_directory_key, None)
+    if snapshot_path is None or len(snapshot_path) == 0:
+        return SnapshotUtils.get_snapshot_folder(data_access)
+    return snapshot_path if snapshot_path.endswith("/") else f"{snapshot_path}/"
+
+
+def read_snapshot_manifest(data_access: DataAccess, folder: str) -> tuple[dict[str, Any], int]:
+    """
+    Read manifest of a segmented snapshot. Segments in the folder of the manifest are referenced by
+    their names, the other ones (written by previous runs elsewhere) by their paths
+    :param data_access: data access
+    :param folder: snapshot directory, ending with /
+    :return: manifest with segment paths, None if the folder has no manifest, and number of retries
+    """
+    files, retries = data_access.get_folder_files(path=folder, extensions=[".json"])
+    # folder files are listed recursively, manifests of sub folders are ignored
+    name = f"{folder}{snapshot_manifest_name}"
+    if files.get(name) is not None:
+        manifest = json.loads(files[name])
+        for segment in manifest["segments"]:
+            if "/" not in segment["path"]:
+                segment["path"] = f"{folder}{segment['path']}"
+        return manifest, retries
+    return None, retries
+
+
+def get_snapshot_generation(params: dict[str, Any], manifest: dict[str, Any]) -> tuple[int, bool]:
+    """
+    Get generation of the segments written by this run and whether they compact the snapshot, that is
+    contain all hashes instead of the ones added by this run. Snapshots are compacted when continuing from
+    full snapshots or once the number of segment generations reaches snapshot_max_segments
+    :param params: parameters, including use_snapshot and snapshot_max_segments
+    :param manifest: manifest of the snapshot to continue from
+    :return: generation and compaction flag
+    """
+    if manifest is None:
+        # first run, or continuing from a full snapshot
+        return 1, params.get(use_snapshot_key, False)
+    generations = {segment["generation"] for segment in manifest["segments"]}
+    max_segments = params.get(snapshot_max_segments_key, snapshot_max_segments_default)
+    return manifest["generation"] + 1, len(generations) >= max_segments
+
+
+def save_snapshot_manifest(
+    data_access: DataAccess,
+    manifest: dict[str, Any],
+    segments: list[dict[str, Any]],
+    generation: int,
+    compact: bool,
+) -> None:
+    """
+    Save manifest of a segmented snapshot, appending segments written by this run to the ones of the snapshot
+    it continued from, or replacing them when compacting
+    :param data_access: data access
+    :param manifest: manifest of the snapshot this run continued from, None if there is none
+    :param segments: segments written by this run (per shard, None for shards without new hashes). Hashes
+        of a shard are the ones with their first 64 bits modulo the number of shards equal to the shard
+    :param generation: generation of this run
+    :param compact: flag specifying whether segments of this run contain all hashes
+    :return: None
+    """
+    folder = SnapshotUtils.get_snapshot_folder(data_access)
+    previous = [] if manifest is None or compact else manifest["segments"]
+    current = [
+        {
+            "path": segment["path"],
+            "shard": shard,
+            "n_shards": len(segments),
+            "count": segment["count"],
+            "generation": generation,
+        }
+        for shard, segment in enumerate(segments)
+        if segment is not None
+    ]
+    entries = []
+    for segment in previous + current:
+        path = segment["path"]
+        if path.startswith(folder) and "/" not in path[len(folder) :]:
+            path = path[len(folder) :]
+        entries.append(segment | {"path": path})
+    content = {"generation": generation, "segments": entries}
+    data_access.save_file(f"{folder}{snapshot_manifest_name}", json.dumps(content, indent=2).encode("utf-8"))
+
 
 class HashFilter:
     """
@@ -49,34 +536,50 @@ class HashFilter:
 
     def __init__(self, params: dict[str, Any]):
         """
-        initialize set of local hashes
+        initialize hash store
+        :param params: parameters, including optional hash_store and digest_bits used for the store creation,
+            snapshot - path of a full snapshot to restore from
+            snapshot_segments - paths of snapshot segments to restore from
+            snapshot_generation, snapshot_compact - generation and compaction flag of segments written by snapshot
         """
         self.logger = get_logger(__name__)
         self.actor_id = params.get("id", 1)
+        self.snapshot_format = params.get(snapshot_format_key, snapshot_format_default)
+        self.generation = params.get("snapshot_generation", 1)
+        self.compact = params.get("snapshot_compact", False)
+        # digests of hashes added by this run, written as a segment by segmented snapshots
+        self.delta = []
         data_access_factory = params.get("data_access_factory", None)
         if data_access_factory is None:
             self.data_access = None
-            self.hashes = set()
+            self.hashes = create_hash_store(params)
         else:
             self.data_access = data_access_factory.create_data_access()
             snapshot = params.get("snapshot", None)
             if snapshot is None:
-                self.hashes = set()
+                self.hashes = create_hash_store(params)
             else:
                 try:
-                    b_hashes, _ = self.data_access.get_file(snapshot)
-                    self.hashes = pickle.loads(b_hashes)
+                    b_hashes, _ = self.data_access.get_buffer(snapshot)
+                    self.hashes = create_hash_store(params, snapshot=b_hashes)
                 except Exception as e:
                     self.logger.warning(f"Failed to load hashes collector {self.actor_id} with exception {e}")
                     raise UnrecoverableException("failed to load hashes")
+            for segment in params.get("snapshot_segments", []):
+                try:
+                    b_segment, _ = self.data_access.get_buffer(segment)
+                    self.hashes.add_hashes(segment_to_digests(b_segment))
+                except Exception as e:
+                    self.logger.warning(f"Failed to load hashes segment {segment} with exception {e}")
+                    raise UnrecoverableException("failed to load hashes")
 
-    def add_hashes(self, hashes: set[str]) -> None:
+    def add_hashes(self, hashes: list[str] | np.ndarray) -> None:
         """
         Adding hashes
-        :param hashes: set of hashes to add
+        :param hashes: hashes to add
         :return: None
         """
-        self.hashes.update(hashes)
+        self.hashes.add_hashes(hashes)
 
     def get_unique(self, ha: list[str]) -> list[str]:
         """
@@ -84,29 +587,43 @@ class HashFilter:
         :param ha: new set of hashes
         :return: list of unique ones
         """
-        unique = []
-        for h in ha:
-            if h not in self.hashes:
-                # If a hash does not exist, add it to unique and add to the local set
-                self.hashes.add(h)
-                unique.append(h)
-        return unique
+        indices = self.get_unique_indices(ha)
+        if isinstance(ha, np.ndarray):
+            return ha[indices]
+        return [ha[i] for i in indices]
+
+    def get_unique_indices(self, ha: list[str] | np.ndarray) -> np.ndarray:
+        """
+        Get positions of unique hashes. Used by remote callers, replying with positions is cheaper
+        than with the hashes
+        :param ha: new hashes (hex strings or binary digests)
+        :return: np.array of positions of unique hashes
+        """
+        indices = self.hashes.get_unique_indices(ha)
+        if self.snapshot_format == "segments" and not self.compact and len(indices) > 0:
+            unique = ha[indices] if isinstance(ha, np.ndarray) else [ha[i] for i in indices]
+            self.delta.append(hashes_to_digests(unique, self.hashes.digest_words))
+        return indices
 
     def get_hash_size(self) -> tuple[int, float]:
         """
         Get size of created hashes for statistics
-        :return: size of the local set and its memory footprint
+        :return: number of hashes and their memory footprint
         """
-        return len(self.hashes), TransformUtils.deep_get_size(self.hashes) / GB
+        h_size, h_memory = self.hashes.get_size()
+        return h_size, h_memory / GB
 
-    def snapshot(self) -> None:
+    def snapshot(self) -> dict[str, Any]:
         """
-        Snapshot content
-        :return: None
+        Snapshot content. Full snapshots rewrite all hashes, segmented ones write a new segment with the hashes
+        added by this run, or all hashes when compacting
+        :return: None for full snapshots, path and number of hashes of the written segment otherwise
         """
+        if self.snapshot_format == "segments":
+            return self._snapshot_segment()
         try:
-            # pickle content
-            b_doc = pickle.dumps(self.hashes)
+            # serialize content
+            b_doc = self.hashes.to_bytes()
             # Save it
             self.data_access.save_file(
                 f"{SnapshotUtils.get_snapshot_folder(self.data_access)}hash_collector_{self.actor_id}", b_doc
@@ -115,6 +632,27 @@ class HashFilter:
             self.logger.warning(f"Failed to snapshot doc collector {self.actor_id} with exception {e}")
             raise e
 
+    def _snapshot_segment(self) -> dict[str, Any]:
+        """
+        Write a snapshot segment
+        :return: path and number of hashes of the written segment, None if there is nothing to write
+        """
+        if self.compact:
+            digests = self.hashes.get_hashes()
+        elif len(self.delta) > 0:
+            digests = np.concatenate(self.delta)
+        else:
+            return None
+        if len(digests) == 0:
+            return None
+        path = f"{SnapshotUtils.get_snapshot_folder(self.data_access)}hash_segment_{self.generation}_{self.actor_id}"
+        try:
+            self.data_access.save_file(path, segment_to_bytes(digests))
+        except Exception as e:
+            self.logger.warning(f"Failed to snapshot segment {path} with exception {e}")
+            raise e
+        return {"path": path, "count": len(digests)}
+
 
 class EdedupTransformBase(AbstractTableTransform):
     """
@@ -130,6 +668,9 @@ class EdedupTransformBase(AbstractTableTransform):
         super().__init__(config)
         self.doc_column = config.get(doc_column_name_key, "contents")
         self.doc_id_column = config.get(int_column_name_key, "document_id")
+        self.hash_threads = config.get(hash_threads_key, hash_threads_default)
+        # number of rows hashed at once, can be adapted by runtimes while a table is processed
+        self.request_len = REQUEST_LEN
 
     def transform(self, table: pa.Table, file_name: str = None) -> tuple[list[pa.Table], dict[str, Any]]:
         """
@@ -140,40 +681,15 @@ class EdedupTransformBase(AbstractTableTransform):
         """
         # make sure that the doc column exists
         TransformUtils.validate_columns(table=table, required=[self.doc_column, self.doc_id_column])
-        # Inner variables
-        docs = table[self.doc_column]
         doc_ids = table[self.doc_id_column]
-        hashes = set()
-        unique = []
-        hd = {}
-        # Compute unique hashes for the table
-        for n in range(table.num_rows):
-            doc = docs[n].as_py()
-            doc_id = doc_ids[n].as_py()
-            # Compute doc hash
-            h = TransformUtils.str_to_hash(TransformUtils.normalize_string(str(doc)))
-            if h not in hashes:  # Processing this hash for the first time
-                hashes.add(h)  # Remember it locally
-                hd[h] = doc_id
-                if len(hd) >= REQUEST_LEN:  # time to check remotely
-                    unique = unique + self._process_cached_hashes(hd=hd)
-                    hd = {}
-        if len(hd) > 0:  # Process remaining hashes
-            unique = unique + self._process_cached_hashes(hd=hd)
-
-        # Remove duplicates
-        unique_set = set(unique)
-        mask = [False] * table.num_rows
-        removed = []
-        index = 0
-        for id in table[self.doc_id_column]:
-            str_id = str(id)
-            if str_id in unique_set:
-                mask[index] = True
-                unique_set.remove(str_id)
-            else:
-                removed.append(str_id)
-            index += 1
+        unique = self._get_unique_ids(self._get_hash_batches(table[self.doc_column], doc_ids))
+
+        # Remove duplicates, keeping the first row of every unique document id
+        mask = pc.and_(
+            pc.is_in(doc_ids, value_set=pa.array(unique, type=doc_ids.type)),
+            pl.from_arrow(doc_ids).is_first_distinct().to_arrow(),
+        )
+        removed = pc.cast(doc_ids.filter(pc.invert(mask)), pa.string()).to_pylist()
         # Create output table
         out_table = table.filter(mask)
         # populate removed columns
@@ -186,6 +702,41 @@ class EdedupTransformBase(AbstractTableTransform):
         stats = {"source_documents": table.num_rows, "result_documents": out_table.num_rows}
         return [out_table], stats
 
+    def _get_hash_batches(self, docs: pa.ChunkedArray, doc_ids: pa.ChunkedArray) -> Iterator[dict[str, Any]]:
+        """
+        Compute document hashes, request_len rows at a time, so that runtimes can check the uniqueness
+        of a batch while the next one is hashed
+        :param docs: documents column
+        :param doc_ids: document ids column
+        :return: iterator over dictionaries of hash to document id, for hashes seen for the first time in
+                 the table (documents of a hash are represented by the first one)
+        """
+        seen = set()
+        start = 0
+        while start < len(docs):
+            length = self.request_len
+            hashes = get_doc_hashes(docs.slice(start, length), n_threads=self.hash_threads)
+            ids = doc_ids.slice(start, length).to_pylist()
+            hd = {}
+            for h, doc_id in zip(hashes, ids):
+                if h not in seen:
+                    seen.add(h)
+                    hd[h] = doc_id
+            if len(hd) > 0:
+                yield hd
+            start += length
+
+    def _get_unique_ids(self, batches: Iterator[dict[str, Any]]) -> list[Any]:
+        """
+        check hashes uniqueness with the distributed cache of hashes, one batch at a time
+        :param batches: iterator over dictionaries of hash to document id
+        :return: unique documents
+        """
+        unique = []
+        for hd in batches:
+            unique.extend(self._process_cached_hashes(hd=hd))
+        return unique
+
     def _process_cached_hashes(self, hd: dict[str, str]) -> list[str]:
         """
         check hashes uniqueness with the distributed cache of hashes
@@ -218,12 +769,13 @@ class EdedupTransformConfigurationBase(TransformConfiguration):
             f"--{doc_column_name_cli_param}",
             type=str,
             default="contents",
-            help="name of the column containing document")
+            help="name of the column containing document",
+        )
         parser.add_argument(
             f"--{int_column_name_cli_param}",
             type=str,
             default="document_id",
-            help="name of the column containing document id"
+            help="name of the column containing document id",
         )
         parser.add_argument(
             f"--{use_snapshot_cli_param}",
@@ -236,6 +788,40 @@ class EdedupTransformConfigurationBase(TransformConfiguration):
         parser.add_argument(
             f"--{snapshot_directory_cli_param}", type=str, default=None, help="location of snapshot files"
         )
+        parser.add_argument(
+            f"--{hash_store_cli_param}",
+            type=str,
+            choices=["array", "set"],
+            default=hash_store_default,
+            help="hash store: binary digests in numpy arrays (array) or hex strings in a python set (set)",
+        )
+        parser.add_argument(
+            f"--{digest_bits_cli_param}",
+            type=int,
+            choices=[64, 128],
+            default=digest_bits_default,
+            help="number of bits of the digests kept by the array hash store",
+        )
+        parser.add_argument(
+            f"--{hash_threads_cli_param}",
+            type=int,
+            default=hash_threads_default,
+            help="number of threads used for computing document hashes",
+        )
+        parser.add_argument(
+            f"--{snapshot_format_cli_param}",
+            type=str,
+            choices=["full", "segments"],
+            default=snapshot_format_default,
+            help="snapshot format: all hashes rewritten by every run (full) or "
+            "immutable segments of new hashes listed in a manifest (segments)",
+        )
+        parser.add_argument(
+            f"--{snapshot_max_segments_cli_param}",
+            type=int,
+            default=snapshot_max_segments_default,
+            help="number of segment generations of a snapshot at which it is compacted",
+        )
 
     def apply_input_params(self, args: Namespace) -> bool:
         """
@@ -246,4 +832,24 @@ class EdedupTransformConfigurationBase(TransformConfiguration):
         captured = CLIArgumentProvider.capture_parameters(args, cli_prefix, False)
         self.params = self.params | captured
         self.logger.info(f"exact dedup params are {self.params}")
+        if self.params.get(hash_threads_key, hash_threads_default) < 1:
+            self.logger.info(f"Number of hash threads should be at least 1, provided {self.params[hash_threads_key]}")
+            return False
+        if self.params.get(snapshot_format_key, snapshot_format_default) == "segments":
+            if self.params.get(hash_store_key, hash_store_default) != "array":
+                self.logger.info("Segmented snapshots require the array hash store")
+                return False
+            if self.params.get(snapshot_max_segments_key, snapshot_max_segments_default) < 1:
+                self.logger.info(
+                    f"Maximum number of snapshot segments should be at least 1, "
+                    f"provided {self.params[snapshot_max_segments_key]}"
+                )
+                return False
         return True
+
+    def get_input_columns(self) -> list[str]:
+        """
+        Exact dedup only reads document and document id columns
+        :return: list of input columns
+        """
+        return [self.params.get(doc_column_name_key, "contents"), self.params.get(int_column_name_key, "document_id")]
@@ -12,7 +12,7 @@
 from argparse import Namespace
 from typing import Any
 
-from data_processing.data_access import DataAccessFactoryBase, SnapshotUtils
+from data_processing.data_access import DataAccessFactoryBase
 from data_processing.runtime.pure_python import (
     DefaultPythonTransformRuntime,
     PythonTransformLauncher,
@@ -23,8 +23,14 @@ from ededup_transform_base import (
     EdedupTransformBase,
     EdedupTransformConfigurationBase,
     HashFilter,
+    get_snapshot_directory,
+    get_snapshot_generation,
+    read_snapshot_manifest,
+    save_snapshot_manifest,
+    snapshot_format_default,
+    snapshot_format_key,
+    use_snapshot_key,
 )
-from ededup_transform_base import use_snapshot_key, snapshot_directory_key
 
 
 class EdedupTransform(EdedupTransformBase):
@@ -61,12 +67,16 @@ class EdedupRuntime(DefaultPythonTransformRuntime):
 
     def __init__(self, params: dict[str, Any]):
         from data_processing.utils import get_logger
+
         super().__init__(params=params)
         self.filter = None
+        self.data_access = None
+        # manifest of the segmented snapshot to continue from, generation and compaction flag of this run
+        self.manifest = None
+        self.generation = 1
+        self.compact = False
         self.logger = get_logger(__name__)
 
-
-
     def get_transform_config(
         self, data_access_factory: DataAccessFactoryBase, statistics: TransformStatistics, files: list[str]
     ) -> dict[str, Any]:
@@ -81,20 +91,26 @@ class EdedupRuntime(DefaultPythonTransformRuntime):
         :param files - list of files to process
         :return: dictionary of transform init params
         """
+        self.data_access = data_access_factory.create_data_access()
+        filter_params = {"data_access_factory": data_access_factory, "id": 1}
         if self.params.get(use_snapshot_key, False):
-            snapshot_path = self.params.get(snapshot_directory_key, None)
-            if snapshot_path is None or len(snapshot_path) == 0:
-                snapshot_path = (
-                    f"{SnapshotUtils.get_snapshot_folder(data_access_factory.create_data_access())}"
-                    f"hash_collector_1"
-                )
+            snapshot_directory = get_snapshot_directory(params=self.params, data_access=self.data_access)
+            self.manifest, retries = read_snapshot_manifest(data_access=self.data_access, folder=snapshot_directory)
+            if retries > 0:
+                statistics.add_stats({"data access retries": retries})
+            if self.manifest is None:
+                snapshot_path = f"{snapshot_directory}hash_collector_1"
+                self.logger.info(f"continuing from the hash snapshot {snapshot_path}")
+                filter_params["snapshot"] = snapshot_path
             else:
-                snapshot_path = f"{snapshot_path}/hash_collector_1"
-            self.logger.info(f"continuing from the hash snapshot {snapshot_path}")
-            self.filter = HashFilter({"data_access_factory": data_access_factory, "id": 1, "snapshot": snapshot_path})
+                self.logger.info(f"continuing from the hash snapshot segments in {snapshot_directory}")
+                filter_params["snapshot_segments"] = [segment["path"] for segment in self.manifest["segments"]]
         else:
             self.logger.info("Starting from the beginning")
-            self.filter = HashFilter({"data_access_factory": data_access_factory, "id": 1})
+        self.generation, self.compact = get_snapshot_generation(params=self.params, manifest=self.manifest)
+        self.filter = HashFilter(
+            self.params | filter_params | {"snapshot_generation": self.generation, "snapshot_compact": self.compact}
+        )
         return self.params | {"filter": self.filter}
 
     def compute_execution_stats(self, stats: TransformStatistics) -> None:
@@ -110,7 +126,15 @@ class EdedupRuntime(DefaultPythonTransformRuntime):
         dedup_prst = 100 * (1.0 - current.get("result_documents", 1) / current.get("source_documents", 1))
         stats.add_stats({"de duplication %": dedup_prst})
         # snapshot execution result
-        self.filter.snapshot()
+        segment = self.filter.snapshot()
+        if self.params.get(snapshot_format_key, snapshot_format_default) == "segments":
+            save_snapshot_manifest(
+                data_access=self.data_access,
+                manifest=self.manifest,
+                segments=[segment],
+                generation=self.generation,
+                compact=self.compact,
+            )
 
 
 class EdedupTransformConfiguration(EdedupTransformConfigurationBase):
@@ -13,11 +13,18 @@
 import os
 from typing import Tuple
 
+import ededup_transform_base
+import pyarrow as pa
 from data_processing.test_support import get_tables_in_folder
 from data_processing.test_support.transform import AbstractTableTransformTest
-from ededup_transform_base import HashFilter
+from data_processing.utils import TransformUtils
+from ededup_transform_base import (
+    HashFilter,
+    doc_column_name_key,
+    get_doc_hashes,
+    int_column_name_key,
+)
 from ededup_transform_python import EdedupTransform
-from ededup_transform_base import doc_column_name_key, int_column_name_key
 
 
 class TestEdedupTransform(AbstractTableTransformTest):
@@ -36,3 +43,29 @@ class TestEdedupTransform(AbstractTableTransformTest):
         return [
             (EdedupTransform(config), input_tables, expected_tables, expected_metadata_list),
         ]
+
+
+def test_doc_hashes(monkeypatch):
+    docs = ["Hello, World!", "hello world", "ΟΔΟΣ ΟΔΟΣ", "ΑΣ,Α", "İstanbul\n", "tab\tand\r", "", None]
+    expected = [TransformUtils.str_to_hash(TransformUtils.normalize_string(str(doc))) for doc in docs]
+    assert get_doc_hashes(pa.chunked_array([docs], type=pa.string())) == expected
+    # enough documents for 3 slices, hashed by different threads, with chunks crossing slice boundaries
+    many_docs = [f"{doc} {i}" if doc is not None else None for i in range(400) for doc in docs]
+    column = pa.chunked_array([many_docs[:1000], many_docs[1000:2500], many_docs[2500:]], type=pa.large_string())
+    single = get_doc_hashes(column)
+    sliced = []
+    hash_docs = ededup_transform_base._hash_docs
+    monkeypatch.setattr(ededup_transform_base, "_hash_docs", lambda d: sliced.append(len(d)) or hash_docs(d))
+    assert get_doc_hashes(column, n_threads=3) == single
+    assert sliced == [1067, 1067, 1066]
+    assert single[: len(docs)] == [
+        TransformUtils.str_to_hash(TransformUtils.normalize_string(str(doc))) for doc in many_docs[: len(docs)]
+    ]
+
+
+def test_int_doc_ids():
+    table = pa.table({"contents": ["a", "b", "A.", "c", "b"], "document_id": [5, 6, 7, 8, 9]})
+    transform = EdedupTransform({doc_column_name_key: "contents", int_column_name_key: "document_id"})
+    out_tables, stats = transform.transform(table)
+    assert out_tables[0]["document_id"].to_pylist() == [5, 6, 8]
+    assert out_tables[0]["removed"].to_pylist() == [["7", "9"], [], []]
@@ -0,0 +1,123 @@
+# (C) Copyright IBM Corp. 2024.
+# Licensed under the Apache License, Version 2.0 (the “License”);
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#  http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an “AS IS” BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+import random
+
+import numpy as np
+import pytest
+from data_processing.data_access import DataAccessFactory
+from data_processing.utils import TransformUtils
+from ededup_transform_base import (
+    ArrayHashStore,
+    HashFilter,
+    SetHashStore,
+    create_hash_store,
+    get_snapshot_generation,
+    hashes_to_digests,
+    read_snapshot_manifest,
+    save_snapshot_manifest,
+    segment_to_bytes,
+    segment_to_digests,
+    shard_hashes,
+)
+
+
+hashes = [TransformUtils.str_to_hash(str(i)) for i in range(5000)]
+
+
+@pytest.mark.parametrize("digest_bits", [64, 128])
+def test_array_hash_store(digest_bits: int):
+    store = ArrayHashStore(digest_bits=digest_bits)
+    reference = SetHashStore()
+    rng = random.Random(42)
+    for _ in range(10):
+        # batches with repeated hashes, growing the table several times
+        batch = [hashes[rng.randrange(len(hashes))] for _ in range(1000)]
+        assert store.get_unique(batch) == reference.get_unique(batch)
+    assert store.get_size()[0] == len(reference.hashes)
+    # snapshot round trip, including conversion of the digest size
+    for bits in [64, 128] if digest_bits == 128 else [64]:
+        restored = create_hash_store({"digest_bits": bits}, snapshot=store.to_bytes())
+        assert restored.get_size()[0] == len(reference.hashes)
+        assert restored.get_unique(hashes) == [h for h in hashes if h not in reference.hashes]
+
+
+def test_legacy_snapshot():
+    reference = SetHashStore(set(hashes[:100]))
+    store = create_hash_store({}, snapshot=reference.to_bytes())
+    assert isinstance(store, ArrayHashStore)
+    assert store.get_unique(hashes[:200]) == hashes[100:200]
+    assert isinstance(create_hash_store({"hash_store": "set"}, snapshot=reference.to_bytes()), SetHashStore)
+
+
+def test_shard_hashes():
+    shards = shard_hashes(hashes, 3)
+    assert sum(len(shard) for shard in shards) == len(hashes)
+    # digests are assigned to the same shards as their hex string hashes
+    for shard, digest_shard in zip(shards, shard_hashes(hashes_to_digests(hashes, 2), 3)):
+        assert np.array_equal(hashes_to_digests(shard, 2), digest_shard)
+
+
+def test_unique_indices():
+    for store in [ArrayHashStore(), SetHashStore()]:
+        assert store.get_unique_indices(hashes[:10] + hashes[5:15]).tolist() == list(range(10)) + list(range(15, 20))
+
+
+def test_contains():
+    store = ArrayHashStore(digest_bits=64)
+    store.add_hashes(hashes[:2000])
+    assert store.contains(hashes[1000:3000]).tolist() == [True] * 1000 + [False] * 1000
+    assert store.get_size()[0] == 2000
+
+
+def test_segment():
+    digests = hashes_to_digests(hashes[:1000], 2)
+    segment = segment_to_digests(segment_to_bytes(digests))
+    assert segment.tolist() == sorted(digests.tolist())
+    assert segment_to_digests(segment_to_bytes(digests[:0])).shape == (0, 2)
+
+
+def test_segmented_snapshots(tmp_path):
+    params = {"snapshot_format": "segments", "snapshot_max_segments": 2, "use_snapshot": True}
+    manifest = None
+    for run, batch in enumerate([hashes[:2000], hashes[1000:3000], hashes[2000:4000]]):
+        # every run continues from the snapshot of the previous one
+        factory = DataAccessFactory()
+        factory.apply_input_params(
+            {"data_local_config": {"input_folder": str(tmp_path), "output_folder": str(tmp_path / str(run))}}
+        )
+        generation, compact = get_snapshot_generation(params=params, manifest=manifest)
+        segments = [] if manifest is None else [segment["path"] for segment in manifest["segments"]]
+        hash_filter = HashFilter(
+            params
+            | {
+                "data_access_factory": factory,
+                "snapshot_segments": segments,
+                "snapshot_generation": generation,
+                "snapshot_compact": compact,
+            }
+        )
+        # half of every batch was seen by the previous runs
+        assert hash_filter.get_unique(batch) == (batch if run == 0 else batch[len(batch) // 2 :])
+        data_access = factory.create_data_access()
+        save_snapshot_manifest(
+            data_access=data_access,
+            manifest=manifest,
+            segments=[hash_filter.snapshot()],
+            generation=generation,
+            compact=compact,
+        )
+        manifest, _ = read_snapshot_manifest(data_access=data_access, folder=f"{tmp_path / str(run)}/snapshot/")
+    # the last run compacted the snapshot
+    assert [(segment["generation"], segment["count"]) for segment in manifest["segments"]] == [(3, 4000)]
+    # manifests of sub folders are not used
+    assert read_snapshot_manifest(data_access=data_access, folder=f"{tmp_path}/")[0] is None
@@ -10,13 +10,15 @@
 # limitations under the License.
 ################################################################################
 
-import pickle
+import time
 from argparse import ArgumentParser, Namespace
-from typing import Any
+from typing import Any, Iterator
 
+import numpy as np
+import pyarrow as pa
 import ray
-from data_processing.data_access import DataAccessFactoryBase, SnapshotUtils
-from data_processing.utils import TransformUtils, UnrecoverableException
+from data_processing.data_access import DataAccessFactoryBase
+from data_processing.utils import UnrecoverableException
 from data_processing_ray.runtime.ray import (
     DefaultRayTransformRuntime,
     RayTransformLauncher,
@@ -25,19 +27,46 @@ from data_processing_ray.runtime.ray.runtime_configuration import (
     RayTransformRuntimeConfiguration,
 )
 from ededup_transform_base import (
+    ArrayHashStore,
     EdedupTransformBase,
     EdedupTransformConfigurationBase,
     HashFilter,
     cli_prefix,
+    digest_bits_default,
+    digest_bits_key,
+    get_shard_indices,
+    get_snapshot_directory,
+    get_snapshot_generation,
+    get_snapshot_hashes,
+    hash_store_default,
+    hash_store_key,
+    hashes_to_digests,
+    read_snapshot_manifest,
+    save_snapshot_manifest,
+    segment_to_digests,
+    shard_hashes,
+    snapshot_format_default,
+    snapshot_format_key,
+    use_snapshot_key,
 )
 from ray.actor import ActorHandle
-from ededup_transform_base import use_snapshot_key
 
 
 hash_cpu_key = "hash_cpu"
 num_hashes_key = "num_hashes"
+max_in_flight_key = "max_in_flight"
+local_cache_size_key = "local_cache_size"
 hash_cpu_cli_params = f"{cli_prefix}{hash_cpu_key}"
 num_hashes_cli_params = f"{cli_prefix}{num_hashes_key}"
+max_in_flight_cli_params = f"{cli_prefix}{max_in_flight_key}"
+local_cache_size_cli_params = f"{cli_prefix}{local_cache_size_key}"
+
+max_in_flight_default = 4
+local_cache_size_default = 0
+# bounds of the number of rows hashed and checked at once, and the round trip targeted by its adaptation
+min_request_len = 1024
+max_request_len = 131072
+target_round_trip = 0.2
 
 
 class EdedupRayTransform(EdedupTransformBase):
@@ -51,42 +80,126 @@ class EdedupRayTransform(EdedupTransformBase):
         The dictionary should contain the following:
             doc_column - name of the doc column
             hashes - list of hash actors, references
+            max_in_flight - maximum number of batches checked by hash actors at the same time
+            local_cache_size - maximum number of hashes known to the hash actors kept locally, 0 to disable
         """
         super().__init__(config)
         self.hashes = config.get("hashes", [])
+        self.max_in_flight = config.get(max_in_flight_key, max_in_flight_default)
+        if config.get(hash_store_key, hash_store_default) == "array":
+            self.digest_words = config.get(digest_bits_key, digest_bits_default) // 64
+        else:
+            self.digest_words = None
+        # hashes already stored by the hash actors. A local hit is a duplicate for sure, so it is not sent
+        self.local_cache_size = config.get(local_cache_size_key, local_cache_size_default)
+        self.local_hashes = None
+        if self.local_cache_size > 0:
+            self.local_hashes = ArrayHashStore(digest_bits=config.get(digest_bits_key, digest_bits_default))
+        self.local_hits = 0
 
-    def _process_cached_hashes(self, hd: dict[str, str]) -> list[str]:
+    def transform(self, table: pa.Table, file_name: str = None) -> tuple[list[pa.Table], dict[str, Any]]:
         """
-        check hashes uniqueness with the distributed cache of hashes
-        :param hd: dictionary of hash to document
-        :return: unique documents
+        De duplicate a table, adding the number of hashes resolved by the local cache to the statistics
+        :param table: table
+        :param file_name: name of the file
+        :return: resulting table, statistics
         """
-        # Build requests - We are building requests for individual hash actors
-        request = [[] for _ in range(len(self.hashes))]
-
-        for h in hd.keys():
-            request[TransformUtils.str_to_int(h) % len(self.hashes)].append(h)
+        self.local_hits = 0
+        out_tables, stats = super().transform(table=table, file_name=file_name)
+        if self.local_hashes is not None:
+            stats["local_cache_hits"] = self.local_hits
+        return out_tables, stats
 
-        # Submit requests to appropriate hash actors
-        remote_replies = []
-        i = 0
-        for req in request:
-            if len(req) > 0:  # Only submit if the length is greater then 0
-                remote_replies.append(self.hashes[i].get_unique.remote(req))
-            i = i + 1
-        # Process replies
+    def _get_unique_ids(self, batches: Iterator[dict[str, Any]]) -> list[Any]:
+        """
+        check hashes uniqueness with the hash actors. Requests of up to max_in_flight batches are in
+        flight at any time, so that the next batch is hashed while the previous ones are checked. The
+        batch size is adapted to keep batch round trips around target_round_trip. The bookkeeping of
+        requests in flight is local to the call, so that a failure does not affect the following files
+        :param batches: iterator over dictionaries of hash to document id
+        :return: unique documents
+        """
         unique = []
-        while remote_replies:
-            # Wait for replies
-            ready, not_ready = ray.wait(remote_replies)
-            # Populate uniques for completed replies
-            for red in ray.get(ready):
-                for uh in red:
-                    unique.append(hd[uh])
-            # Continue waiting for not completed replies
-            remote_replies = not_ready
+        # requests in flight and batches in flight, batch number to submission time and number of pending replies
+        in_flight = {}
+        pending = {}
+        for batch, hd in enumerate(batches):
+            self._submit_requests(hd=hd, batch=batch, in_flight=in_flight, pending=pending)
+            while len(pending) >= self.max_in_flight:
+                self._collect_replies(in_flight=in_flight, pending=pending, unique=unique)
+        while in_flight:
+            self._collect_replies(in_flight=in_flight, pending=pending, unique=unique)
         return unique
 
+    def _submit_requests(
+        self, hd: dict[str, Any], batch: int, in_flight: dict[ray.ObjectRef, tuple], pending: dict[int, list]
+    ) -> None:
+        """
+        Submit requests for a batch of hashes to the hash actors, without waiting for the replies.
+        Hashes found in the local cache are duplicates and are not sent
+        :param hd: dictionary of hash to document id
+        :param batch: batch number
+        :param in_flight: requests in flight, reply reference to document ids, batch and local digests of the request
+        :param pending: batches in flight, batch number to submission time and number of pending replies
+        :return: None
+        """
+        hashes = list(hd.keys())
+        doc_ids = list(hd.values())
+        digests = None
+        if self.local_hashes is not None:
+            digests = hashes_to_digests(hashes, self.local_hashes.digest_words)
+            remote = np.flatnonzero(~self.local_hashes.contains(digests))
+            self.local_hits += len(hashes) - len(remote)
+            if len(remote) < len(hashes):
+                hashes = [hashes[i] for i in remote]
+                doc_ids = [doc_ids[i] for i in remote]
+                digests = digests[remote]
+            if len(hashes) == 0:
+                return
+        # array hash stores get binary digests instead of hex strings
+        payload = hashes if self.digest_words is None else hashes_to_digests(hashes, self.digest_words)
+        pending[batch] = [time.time(), 0]
+        for actor, indices in zip(self.hashes, get_shard_indices(payload, len(self.hashes))):
+            if len(indices) > 0:  # Only submit if the length is greater then 0
+                request = [hashes[i] for i in indices] if self.digest_words is None else payload[indices]
+                local = None if digests is None else digests[indices]
+                in_flight[actor.get_unique_indices.remote(request)] = ([doc_ids[i] for i in indices], batch, local)
+                pending[batch][1] += 1
+
+    def _collect_replies(
+        self, in_flight: dict[ray.ObjectRef, tuple], pending: dict[int, list], unique: list[Any]
+    ) -> None:
+        """
+        Wait for at least one reply of hash actors and populate unique documents. Once replied, all
+        hashes of a request are stored by the hash actor, so they are added to the local cache, while it has room
+        :param in_flight: requests in flight, reply reference to document ids, batch and local digests of the request
+        :param pending: batches in flight, batch number to submission time and number of pending replies
+        :param unique: unique documents
+        :return: None
+        """
+        ready, _ = ray.wait(list(in_flight.keys()), num_returns=1)
+        for ref in ready:
+            doc_ids, batch, digests = in_flight.pop(ref)
+            unique.extend([doc_ids[i] for i in ray.get(ref)])
+            if digests is not None and self.local_hashes.get_size()[0] < self.local_cache_size:
+                self.local_hashes.add_hashes(digests)
+            pending[batch][1] -= 1
+            if pending[batch][1] == 0:
+                submitted, _ = pending.pop(batch)
+                self._adapt_request_len(round_trip=time.time() - submitted)
+
+    def _adapt_request_len(self, round_trip: float) -> None:
+        """
+        Adapt the number of rows hashed and checked at once to the round trip of a batch. Short round
+        trips are dominated by the per request overhead, long ones reduce overlapping of hashing and checking
+        :param round_trip: time between the submission of a batch and its last reply, sec
+        :return: None
+        """
+        if round_trip < target_round_trip / 2:
+            self.request_len = min(self.request_len * 2, max_request_len)
+        elif round_trip > target_round_trip * 2:
+            self.request_len = max(self.request_len // 2, min_request_len)
+
 
 class EdedupRayRuntime(DefaultRayTransformRuntime):
     """
@@ -105,6 +218,11 @@ class EdedupRayRuntime(DefaultRayTransformRuntime):
 
         super().__init__(params)
         self.filters = []
+        self.data_access = None
+        # manifest of the segmented snapshot to continue from, generation and compaction flag of this run
+        self.manifest = None
+        self.generation = 1
+        self.compact = False
         self.logger = get_logger(__name__)
 
     def get_transform_config(
@@ -117,34 +235,82 @@ class EdedupRayRuntime(DefaultRayTransformRuntime):
         :param files - list of files to process
         :return: dictionary of transform init params
         """
-        # create hashes
         n_filters = self.params.get(num_hashes_key, 1)
+        self.data_access = data_access_factory.create_data_access()
+        snapshot_directory = None
+        # segments sharded as the hash actors are loaded by hash actors themselves, the other ones are resharded
+        segments = [[] for _ in range(n_filters)]
+        resharded = []
+        if self.params.get(use_snapshot_key, False):
+            snapshot_directory = get_snapshot_directory(params=self.params, data_access=self.data_access)
+            self.manifest, retries = read_snapshot_manifest(data_access=self.data_access, folder=snapshot_directory)
+            if retries > 0:
+                statistics.add_stats.remote({"data access retries": retries})
+            for segment in [] if self.manifest is None else self.manifest["segments"]:
+                if segment["n_shards"] == n_filters:
+                    segments[segment["shard"]].append(segment["path"])
+                else:
+                    resharded.append(segment)
+        self.generation, self.compact = get_snapshot_generation(params=self.params, manifest=self.manifest)
+        # create hashes
         self.filters = [None] * n_filters
         for i in range(n_filters):
             self.filters[i] = (
                 ray.remote(HashFilter)
                 .options(num_cpus=self.params.get(hash_cpu_key, 0.5))
-                .remote({"id": i, "data_access_factory": data_access_factory})
+                .remote(
+                    self.params
+                    | {
+                        "id": i,
+                        "data_access_factory": data_access_factory,
+                        "snapshot_segments": segments[i],
+                        "snapshot_generation": self.generation,
+                        "snapshot_compact": self.compact,
+                    }
+                )
             )
-        if self.params.get(use_snapshot_key, False):
-            self._load_snapshots(data_access_factory=data_access_factory, statistics=statistics)
+        if snapshot_directory is not None and self.manifest is None:
+            self._load_snapshots(snapshot_path=snapshot_directory, statistics=statistics)
+        if len(resharded) > 0:
+            self._load_segments(segments=resharded)
         return {"hashes": self.filters} | self.params
 
-    def _load_snapshots(self, data_access_factory: DataAccessFactoryBase, statistics: ActorHandle) -> None:
+    def _load_segments(self, segments: list[dict[str, Any]]) -> None:
         """
-        Load snapshots
-        :param data_access_factory - data access factory
+        Load snapshot segments sharded differently from the hash actors. Segments are read one at a time and
+        their hashes are distributed between hash actors, while the next segment is read
+        :param segments: manifest entries of the segments
+        :return: None
+        """
+        self.logger.info(f"Resharding {len(segments)} snapshot segments to {len(self.filters)} hash actors")
+        remote_replies = []
+        for segment in segments:
+            try:
+                b_segment, _ = self.data_access.get_buffer(segment["path"])
+                digests = segment_to_digests(b_segment)
+            except Exception as e:
+                self.logger.warning(f"Failed to load hashes segment {segment['path']} with exception {e}")
+                raise UnrecoverableException("failed to load hashes")
+            # wait for the previous segment
+            ray.get(remote_replies)
+            remote_replies = [
+                f.add_hashes.remote(req)
+                for f, req in zip(self.filters, shard_hashes(digests, len(self.filters)))
+                if len(req) > 0
+            ]
+        ray.get(remote_replies)
+
+    def _load_snapshots(self, snapshot_path: str, statistics: ActorHandle) -> None:
+        """
+        Load full snapshots
+        :param snapshot_path - snapshot directory
         :param statistics - reference to the statistics object
         :return: None
         """
         # we are using snapshots. Note here that the amount of files might be different
         # from the current amount of hashes
-        snapshot_path = self.params.get("snapshot_directory", None)
-        if snapshot_path is None or len(snapshot_path) == 0:
-            snapshot_path = f"{SnapshotUtils.get_snapshot_folder(data_access_factory.create_data_access())}"
-        data_access = data_access_factory.create_data_access()
         # get snapshot files
-        files, retries = data_access.get_folder_files(path=snapshot_path)
+        files, retries = self.data_access.get_folder_files(path=snapshot_path)
         if retries > 0:
             statistics.add_stats.remote({"data access retries": retries})
         self.logger.info(f"Found the following snapshot files {files.keys()}")
@@ -152,13 +318,11 @@ class EdedupRayRuntime(DefaultRayTransformRuntime):
         for file in files.values():
             # convert the file
             try:
-                snaps = pickle.loads(file)
+                snaps = get_snapshot_hashes(file)
             except Exception as e:
                 self.logger.warning(f"Failed to load hashes with exception {e}")
                 raise UnrecoverableException("failed to load hashes")
-            request = [[] for _ in range(len(self.filters))]
-            for h in snaps:
-                request[TransformUtils.str_to_int(h) % len(self.filters)].append(h)
+            request = shard_hashes(snaps, len(self.filters))
             # Submit requests to appropriate hash actors
             remote_replies = []
             i = 0
@@ -193,11 +357,15 @@ class EdedupRayRuntime(DefaultRayTransformRuntime):
             remote_replies = not_ready
         dedup_prst = 100 * (1.0 - stats.get("result_documents", 1) / stats.get("source_documents", 1))
         # snapshot execution results
-        remote_replies = [f.snapshot.remote() for f in self.filters]
-        while remote_replies:
-            # Wait for replies
-            ready, not_ready = ray.wait(remote_replies)
-            remote_replies = not_ready
+        segments = ray.get([f.snapshot.remote() for f in self.filters])
+        if self.params.get(snapshot_format_key, snapshot_format_default) == "segments":
+            save_snapshot_manifest(
+                data_access=self.data_access,
+                manifest=self.manifest,
+                segments=segments,
+                generation=self.generation,
+                compact=self.compact,
+            )
         return {"number of hashes": sum_hash, "hash memory, GB": sum_hash_mem, "de duplication %": dedup_prst} | stats
 
 
@@ -217,6 +385,18 @@ class EdedupRayTransformConfiguration(EdedupTransformConfigurationBase):
         super().add_input_params(parser)
         parser.add_argument(f"--{hash_cpu_cli_params}", type=float, default=0.5, help="number of CPUs per hash")
         parser.add_argument(f"--{num_hashes_cli_params}", type=int, default=0, help="number of hash actors to use")
+        parser.add_argument(
+            f"--{max_in_flight_cli_params}",
+            type=int,
+            default=max_in_flight_default,
+            help="maximum number of batches of hashes checked by hash actors at the same time, per transform",
+        )
+        parser.add_argument(
+            f"--{local_cache_size_cli_params}",
+            type=int,
+            default=local_cache_size_default,
+            help="maximum number of hashes known to the hash actors cached by each transform, 0 to disable",
+        )
 
     def apply_input_params(self, args: Namespace) -> bool:
         """
@@ -224,10 +404,19 @@ class EdedupRayTransformConfiguration(EdedupTransformConfigurationBase):
         :param args: user defined arguments.
         :return: True, if validate pass or False otherwise
         """
-        super().apply_input_params(args)
+        if not super().apply_input_params(args):
+            return False
         if self.params[num_hashes_key] <= 0:
             self.logger.info(f"Number of hashes should be greater then zero, provided {self.params['num_hashes']}")
             return False
+        if self.params[max_in_flight_key] <= 0:
+            self.logger.info(
+                f"Number of batches in flight should be greater then zero, provided {self.params[max_in_flight_key]}"
+            )
+            return False
+        if self.params[local_cache_size_key] < 0:
+            self.logger.info(f"Local cache size should be non negative, provided {self.params[local_cache_size_key]}")
+            return False
         return True
 
 
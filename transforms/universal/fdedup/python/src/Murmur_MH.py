@@ -94,6 +94,35 @@ class Murmur_MH:
             doc_id,
         )
 
+    def minhash_batch(self, shingles: List[str], offsets: np.ndarray) -> np.ndarray:
+        """
+        Batched version of minhash, computing minhashes of multiple documents at once. Produces the same
+        values as minhash for the shingles of every document, but hashes all the shingles in bulk
+        and computes per-document minimums using a segmented reduction, one permutation at a time,
+        so no (num_shingles x num_perm) matrix is materialized
+        :param shingles: shingles of all documents (concatenated)
+        :param offsets: np.array of document offsets into shingles (num_docs + 1 elements). Every
+                        document should have at least one shingle
+        :return: np.array of uint32 minhashes of shape (num_docs, num_perm)
+        """
+        offsets = np.asarray(offsets, dtype=np.int64)
+        num_docs = len(offsets) - 1
+        result = np.empty((num_docs, self.num_perm), dtype=np.uint32)
+        if num_docs == 0:
+            return result
+        if np.any(np.diff(offsets) <= 0):
+            raise ValueError("every document should have at least one shingle")
+        hash_values = np.fromiter(
+            (mmh3.hash(shingle, signed=False) for shingle in shingles), dtype=np.uint64, count=len(shingles)
+        )
+        values = np.empty_like(hash_values)
+        for index, permutation in enumerate(self.permutations):
+            np.multiply(hash_values, permutation, out=values)
+            np.right_shift(values, np.uint64(32), out=values)
+            # shifted values fit in 32 bits, so minimum over uint64 is the same as over uint32
+            result[:, index] = np.minimum.reduceat(values, offsets[:-1])
+        return result
+
     @staticmethod
     def jaccard(mh1: np.array, mh2: np.array) -> float:
         """
@@ -9,14 +9,20 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 ################################################################################
+import base64
 import io
 import os
 import re
 from argparse import ArgumentParser, Namespace
-from typing import Any, List
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any
 
 import numpy as np
 import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+from data_processing.data_access import DataAccess
 from data_processing.transform import AbstractFolderTransform, TransformConfiguration
 from data_processing.utils import (
     CLIArgumentProvider,
@@ -24,7 +30,6 @@ from data_processing.utils import (
     UnrecoverableException,
     get_logger,
 )
-from Murmur_MH import Murmur_MH
 
 
 short_name = "cluster"
@@ -39,6 +44,12 @@ jaccard_similarity_threshold_key = "jaccard_similarity_threshold"
 """ This key holds the Jaccard similarity threshold above which two documents are duplicates"""
 sort_output_key = "sort_output"
 """ This key is used to sort"""
+num_threads_key = "num_threads"
+""" This key holds the number of threads used to analyze large clusters"""
+index_folder_key = "index_folder"
+""" This key holds the location of the band hash index used for incremental fuzzy dedup"""
+max_docs_per_task_key = "max_docs_per_task"
+""" This key holds the number of documents above which a band segment is split into multiple tasks"""
 
 # command line arguments
 num_bands_cli_param = f"{cli_prefix}{num_bands_key}"
@@ -49,12 +60,21 @@ num_segments_cli_param = f"{cli_prefix}{num_segments_key}"
 """ The number of segments dividing the hashing space for each band"""
 sort_output_cli_param = f"{cli_prefix}{sort_output_key}"
 """ Sort the output"""
+num_threads_cli_param = f"{cli_prefix}{num_threads_key}"
+""" The number of threads used to analyze large clusters"""
+index_folder_cli_param = f"{cli_prefix}{index_folder_key}"
+""" Location of the band hash index used for incremental fuzzy dedup"""
+max_docs_per_task_cli_param = f"{cli_prefix}{max_docs_per_task_key}"
+""" Number of documents above which a band segment is split into multiple tasks"""
 
 captured_arg_keys = [
     num_bands_key,
     num_segments_key,
     jaccard_similarity_threshold_key,
     sort_output_key,
+    num_threads_key,
+    index_folder_key,
+    max_docs_per_task_key,
 ]
 
 # defaults
@@ -65,6 +85,101 @@ jaccard_similarity_threshold_default = 0.75
 num_segments_default = 1
 """ Default number of segments dividing the hashing space for each band"""
 sort_output_default = False
+num_threads_default = 1
+""" Default number of threads used to analyze large clusters"""
+large_cluster_size = 1024
+""" Clusters with at least this amount of documents are analyzed by the thread pool"""
+index_folder_default = None
+""" Default location of the band hash index, no index is used (the whole data set is analyzed)"""
+index_row_group_size = 16384
+""" Number of rows in a row group of the band hash index files, the unit of index lookups"""
+index_partition_bits = 6
+""" Band hash index files are partitioned by the first index_partition_bits bits of the band hash"""
+index_max_files = 8
+""" Number of files of an index partition above which they are compacted into a single file"""
+index_bloom_bits = 16
+""" Number of bits per band hash in the bloom filters of the index row groups"""
+index_bloom_hashes = 4
+""" Number of hash functions of the bloom filters of the index row groups"""
+index_bloom_key = b"band_hash_bloom_filters"
+""" Key of the index file metadata holding the (base64 encoded) bloom filters of all row groups"""
+max_docs_per_task_default = 0
+""" Default number of documents above which a band segment is split, 0 means band segments are never split"""
+
+
+def get_segment_bounds(num_segments: int) -> list[int]:
+    """
+    Get the bounds of the band hash segments, segment s covers band hashes in (bounds[s], bounds[s + 1]],
+    same as in signature calculation
+    :param num_segments: number of segments of every band
+    :return: list of num_segments + 1 bounds
+    """
+    upper_bound = int(np.iinfo(np.uint64).max)
+    segment_len = upper_bound // num_segments
+    return [s * segment_len for s in range(num_segments)] + [upper_bound]
+
+
+def get_band_segment_folders(
+    data_access: DataAccess, num_bands: int, num_segments: int, max_docs_per_task: int = 0
+) -> list[str]:
+    """
+    Get the folders (tasks) processed by cluster analysis, one for every band segment. When max_docs_per_task
+    is specified, band segments with more documents are split into parts of similar size, using quantiles
+    of the band hash histograms saved by signature calculation. A part of a band segment is described
+    by a folder name with a hash range: band=b/segment=s/range=start-end (both ends included)
+    :param data_access: data access, with the band signatures (bands folder) as input folder
+    :param num_bands: number of bands
+    :param num_segments: number of segments of every band
+    :param max_docs_per_task: number of documents above which a band segment is split, 0 to disable splitting
+    :return: list of folder names
+    """
+    logger = get_logger(__name__)
+    folders = [f"band={b}/segment={s}" for b in range(num_bands) for s in range(num_segments)]
+    if max_docs_per_task <= 0:
+        return folders
+    # histograms are saved by signature calculation next to the bands folder
+    histogram_folder = os.path.join(os.path.dirname(data_access.input_folder.rstrip("/")), "histograms")
+    files, _ = data_access.get_folder_files(path=histogram_folder, extensions=[".parquet"])
+    if len(files) == 0:
+        logger.warning(f"No band hash histograms in {histogram_folder}, band segments are not split")
+        return folders
+    histograms = (
+        pl.concat([pl.read_parquet(io.BytesIO(contents)) for contents in files.values()])
+        .group_by(["band", "bin_start", "bin_end"])
+        .agg(pl.sum("count"))
+        .sort(["band", "bin_start"])
+    )
+    bounds = get_segment_bounds(num_segments)
+    folders = []
+    for b in range(num_bands):
+        band_histogram = histograms.filter(pl.col("band") == b)
+        for s in range(num_segments):
+            segment_histogram = band_histogram.filter(
+                (pl.col("bin_end") > bounds[s]) & (pl.col("bin_start") <= bounds[s + 1])
+            )
+            # bins partly overlapping the segment only count the part of their documents in the segment
+            bin_starts = segment_histogram["bin_start"].to_numpy().astype(np.float64)
+            bin_ends = segment_histogram["bin_end"].to_numpy().astype(np.float64)
+            overlaps = (
+                np.minimum(bin_ends, float(bounds[s + 1])) - np.maximum(bin_starts, float(bounds[s] + 1)) + 1
+            ) / (bin_ends - bin_starts + 1)
+            counts = np.cumsum(segment_histogram["count"].to_numpy() * np.clip(overlaps, 0.0, 1.0))
+            num_docs = int(round(counts[-1])) if len(counts) > 0 else 0
+            num_parts = -(-num_docs // max_docs_per_task)
+            if num_parts <= 1:
+                folders.append(f"band={b}/segment={s}")
+                continue
+            # split points are the ends of the bins where the cumulative count reaches the quantiles
+            quantiles = np.arange(1, num_parts) * num_docs / num_parts
+            split_bins = np.unique(np.searchsorted(counts, quantiles, side="left"))
+            ends = [min(int(end), bounds[s + 1]) for end in segment_histogram["bin_end"].to_numpy()[split_bins]]
+            start = bounds[s] + 1
+            for end in sorted(set(ends)) + [bounds[s + 1]]:
+                if end >= start:
+                    folders.append(f"band={b}/segment={s}/range={start}-{end}")
+                    start = end + 1
+    logger.info(f"{len(folders)} cluster analysis tasks for {num_bands} bands and {num_segments} segments")
+    return folders
 
 
 class ClusterAnalysisTransform(AbstractFolderTransform):
@@ -90,10 +205,25 @@ class ClusterAnalysisTransform(AbstractFolderTransform):
     to keep (the largest size document), and mark the other documents as
     duplicates. The resulting clusters are saved in a file for further analysis.
 
+    When `index_folder` is specified, fuzzy dedup runs incrementally: the input
+    only contains the band signatures of new documents, and the band signatures of
+    the documents processed by previous runs are kept in a band hash index, in the
+    subfolder `band=b/segment=s` of the index folder. The index is partitioned by
+    the band hash prefix (subfolders `part=p`), and every run adds to the partitions
+    of its new band hashes a file with its new band signatures, sorted by band hash,
+    with a bloom filter of the band hashes of every row group. Only the partitions
+    of the new band hashes are read, and in their files only the row groups whose
+    bloom filters can contain some of the new band hashes. As most new band hashes
+    are not in the index, the cost of a run is proportional to the number of new
+    documents and of their clusters, rather than to the size of the index. Once a
+    partition has more than `index_max_files` files, they are compacted into one.
+
     The following internal variables are initialized from the config parameter:
         num_bands: number of bands used in the banding technique
         jaccard_similarity_threshold: Jaccard similarity threshold above which two documents are duplicates
         num_segments: the number of segments dividing the hashing space for each band
+        num_threads: the number of threads used to analyze large clusters
+        index_folder: location of the band hash index, None if fuzzy dedup is not incremental
     """
 
     def __init__(self, config: dict[str, Any]):
@@ -109,6 +239,8 @@ class ClusterAnalysisTransform(AbstractFolderTransform):
             jaccard_similarity_threshold_key, jaccard_similarity_threshold_default
         )
         self.sort_output = config.get(sort_output_key, sort_output_default)
+        self.num_threads = config.get(num_threads_key, num_threads_default)
+        self.index_folder = config.get(index_folder_key, index_folder_default)
         self.data_access = config.get("data_access")
         if self.data_access is None:
             raise UnrecoverableException("Could not get a pointer to the data access object inside the transform.")
@@ -117,58 +249,396 @@ class ClusterAnalysisTransform(AbstractFolderTransform):
     def transform(self, folder_name: str) -> tuple[list[tuple[bytes, str]], dict[str, Any]]:
         self.logger.debug(f"Cluster analysis for folder {folder_name}")
         metadata = {}
-        input_folder = TransformUtils.clean_path(os.path.join(self.data_access.input_folder, folder_name))
-        files, retries = self.data_access.get_folder_files(
-            path=input_folder,
-            extensions=[".parquet"],
-            return_data=True,
-        )
-        if retries > 0:
-            metadata |= {"data_access_retries": retries}
-        match = re.match(r"^band=(\d+)/segment=(\d+)$", folder_name)
+        match = re.match(r"^band=(\d+)/segment=(\d+)(/range=(\d+)-(\d+))?$", folder_name)
         if match:
             band = int(match.group(1))
             segment = int(match.group(2))
         else:
-            raise ValueError(f"Wrong folder_name {folder_name}, should be band=b/segment=s")
+            raise ValueError(f"Wrong folder_name {folder_name}, should be band=b/segment=s[/range=start-end]")
         output_folder = TransformUtils.clean_path(self.data_access.output_folder)
-        output_path = os.path.join(output_folder, f"band_{band}_segment_{segment}.parquet")
+        if match.group(3) is None:
+            hash_range = None
+            output_path = os.path.join(output_folder, f"band_{band}_segment_{segment}.parquet")
+        else:
+            # part of a band segment, documents with band hashes in the range
+            hash_range = (int(match.group(4)), int(match.group(5)))
+            output_path = os.path.join(output_folder, f"band_{band}_segment_{segment}_range_{hash_range[0]}.parquet")
+        input_folder = TransformUtils.clean_path(
+            os.path.join(self.data_access.input_folder, f"band={band}", f"segment={segment}")
+        )
+        files, retries = self.data_access.get_folder_files(
+            path=input_folder,
+            extensions=[".parquet"],
+            return_data=False,
+        )
 
         # consolidate into a single data frame band hashes computed by workers
-        band_segment_dataframe, consolidation_stats = self._consolidate_band_segment_files(files)
+        # with an index, new documents can be part of a cluster with indexed documents, so all of them are kept
+        band_segment_dataframe, consolidation_stats = self._consolidate_band_segment_files(
+            list(files.keys()), clusters_only=self.index_folder is None, hash_range=hash_range
+        )
+        retries += consolidation_stats.pop("data_access_retries", 0)
+        if self.index_folder is not None:
+            band_segment_dataframe, index_stats = self.update_band_segment_index(
+                band, segment, band_segment_dataframe, hash_range=hash_range
+            )
+            retries += index_stats.pop("data_access_retries", 0)
+            consolidation_stats |= index_stats
+        if retries > 0:
+            metadata |= {"data_access_retries": retries}
         metadata |= consolidation_stats
+        docs_to_remove_dataframe, analysis_stats = self.analyze_band_segment(band_segment_dataframe)
+        metadata |= analysis_stats
+        output_data = TransformUtils.convert_arrow_to_binary(docs_to_remove_dataframe.to_arrow())
+        return [(output_data, output_path)], metadata
+
+    def analyze_band_segment(self, band_segment_dataframe: pl.DataFrame) -> tuple[pl.DataFrame, dict[str, Any]]:
+        """
+        Find documents to remove in the band signatures of a band segment
+        :param band_segment_dataframe: band signatures (band hash and document data) of a band segment
+        :return: data frame of the documents to remove and analysis statistics
+        """
         # cluster grouping by band hashes
         cluster_dataframe, cluster_stats = self._get_clusters(band_segment_dataframe)
-        metadata |= cluster_stats
         # cluster analysis using jaccard similarity
         jaccard_cluster_dataframe, jaccard_stats = self._analyze_clusters(cluster_dataframe)
-        metadata |= jaccard_stats
         # Generate the docs_to_remove dataframe
         docs_to_remove_dataframe = jaccard_cluster_dataframe.explode("docs_to_remove")
-        output_data = TransformUtils.convert_arrow_to_binary(docs_to_remove_dataframe.to_arrow())
         self.logger.debug(f"{len(docs_to_remove_dataframe)} documents marked to remove")
-        metadata |= {"num_duplicate_documents": len(docs_to_remove_dataframe)}
-        return [(output_data, output_path)], metadata
+        return docs_to_remove_dataframe, cluster_stats | jaccard_stats | {
+            "num_duplicate_documents": len(docs_to_remove_dataframe)
+        }
+
+    def update_band_segment_index(
+        self, band: int, segment: int, band_segment_dataframe: pl.DataFrame, hash_range: tuple[int, int] = None
+    ) -> tuple[pl.DataFrame, dict[str, Any]]:
+        """
+        Merge band signatures of new documents with the band signatures of the same band hashes from the
+        band hash index, and add the new band signatures to the index. Only the index partitions of the new
+        band hashes are read, and in their files only the row groups that can contain new band hashes
+        according to their band hash range and bloom filter. Partitions with too many files are compacted
+        :param band: band index
+        :param segment: segment index
+        :param band_segment_dataframe: band signatures (band hash and document data) of new documents
+        :param hash_range: band hash range (both ends included) of the band signatures, None for a whole segment
+        :return: band signatures of new and indexed documents sharing band hashes, and index statistics
+        """
+        if len(band_segment_dataframe) == 0:
+            return band_segment_dataframe, {}
+        index_path = TransformUtils.clean_path(os.path.join(self.index_folder, f"band={band}", f"segment={segment}"))
+        index_files, retries = self.data_access.get_folder_files(
+            path=index_path, extensions=[".parquet"], return_data=False
+        )
+        partition_files = {}
+        for fname in sorted(index_files.keys()):
+            match = re.search(r"part=(\d+)/[^/]+$", fname)
+            if match:
+                partition_files.setdefault(int(match.group(1)), []).append(fname)
+        partition_shift = 64 - index_partition_bits
+        new_dataframe = band_segment_dataframe.with_columns(
+            pl.col("document_data").struct.field("int_id_column").alias("document_id"),
+            (pl.col("band_hash") // pl.lit(1 << partition_shift, dtype=pl.UInt64)).alias("index_partition"),
+        )
+        band_hashes = new_dataframe.select("band_hash").unique()
+        new_band_hashes = np.sort(band_hashes["band_hash"].to_numpy())
+        new_partitions = new_band_hashes >> np.uint64(partition_shift)
+        index_dataframes = []
+        num_row_groups = 0
+        num_row_groups_read = 0
+        for partition in np.unique(new_partitions):
+            partition_band_hashes = new_band_hashes[new_partitions == partition]
+            for fname in partition_files.get(int(partition), []):
+                parquet_file, retries1 = self.data_access.get_parquet_file(fname)
+                retries += retries1
+                if parquet_file is None:
+                    raise UnrecoverableException(f"Failed to read index file {fname}")
+                row_groups = self._get_index_row_groups(parquet_file, partition_band_hashes)
+                num_row_groups += parquet_file.metadata.num_row_groups
+                num_row_groups_read += len(row_groups)
+                if len(row_groups) > 0:
+                    index_dataframe = pl.from_arrow(parquet_file.read_row_groups(row_groups))
+                    index_dataframes.append(index_dataframe.join(band_hashes, on="band_hash", how="semi"))
+        if len(index_dataframes) > 0:
+            # rows of an interrupted compaction can be in two files of a partition, they are read once
+            index_dataframe = (
+                pl.concat(index_dataframes)
+                .with_columns(pl.col("document_data").struct.field("int_id_column").alias("document_id"))
+                .unique(subset=["band_hash", "document_id"], keep="first", maintain_order=True)
+            )
+            # documents already in the index (i.e. processed again) are not added twice
+            new_dataframe = new_dataframe.join(index_dataframe, on=["band_hash", "document_id"], how="anti")
+            index_dataframe = index_dataframe.drop("document_id")
+        else:
+            index_dataframe = band_segment_dataframe.clear()
+        # add the new band signatures to the index partitions
+        num_files_compacted = 0
+        index_name = f"index_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+        if hash_range is not None:
+            # parts of a band segment are analyzed concurrently, and add index files to the same folders
+            index_name = f"{index_name}_range_{hash_range[0]}"
+        for (partition,), partition_dataframe in new_dataframe.partition_by("index_partition", as_dict=True).items():
+            partition_dataframe = partition_dataframe.drop(["document_id", "index_partition"])
+            files = partition_files.get(partition, [])
+            compact = len(files) >= index_max_files and self._owns_index_partition(segment, partition, hash_range)
+            if compact:
+                # all files of the partition are merged with the new band signatures
+                partition_dataframe, retries1 = self._read_index_files(files, partition_dataframe)
+                retries += retries1
+            index_file = os.path.join(index_path, f"part={partition}", f"{index_name}.parquet")
+            retries += self._write_index_file(index_file, partition_dataframe)
+            if compact:
+                # compacted files are deleted once the merged file is saved
+                for fname in files:
+                    retries += self.data_access.delete_file(fname)
+                num_files_compacted += len(files)
+        new_dataframe = new_dataframe.drop(["document_id", "index_partition"])
+        index_stats = {
+            "index_files": len(index_files),
+            "index_row_groups": num_row_groups,
+            "index_row_groups_read": num_row_groups_read,
+            "index_rows_read": len(index_dataframe),
+            "index_rows_added": len(new_dataframe),
+            "index_files_compacted": num_files_compacted,
+            "data_access_retries": retries,
+        }
+        return pl.concat([index_dataframe, new_dataframe]), index_stats
+
+    def _owns_index_partition(self, segment: int, partition: int, hash_range: tuple[int, int] = None) -> bool:
+        """
+        Check whether an index partition of a segment is only updated by this task, so that it can be compacted.
+        This is the case for a whole segment, or for a part of a segment including the whole partition
+        :param segment: segment index
+        :param partition: index partition
+        :param hash_range: band hash range (both ends included) of the task, None for a whole segment
+        :return: True if the partition can be compacted by this task
+        """
+        if hash_range is None:
+            return True
+        bounds = get_segment_bounds(self.num_segments)
+        partition_shift = 64 - index_partition_bits
+        partition_start = max(partition << partition_shift, bounds[segment] + 1)
+        partition_end = min(((partition + 1) << partition_shift) - 1, bounds[segment + 1])
+        return hash_range[0] <= partition_start and partition_end <= hash_range[1]
 
-    def _consolidate_band_segment_files(self, files: dict[str, bytes]) -> tuple[pl.DataFrame, dict[str, Any]]:
-        band_segment_dataframe = pl.DataFrame()
+    def _read_index_files(self, files: list[str], dataframe: pl.DataFrame) -> tuple[pl.DataFrame, int]:
+        """
+        Read all band signatures of index files, for compaction
+        :param files: index files
+        :param dataframe: band signatures added to the ones of the index files
+        :return: band signatures of the files and of the given data frame, and number of retries
+        """
+        retries = 0
+        dataframes = []
+        for fname in files:
+            parquet_file, retries1 = self.data_access.get_parquet_file(fname)
+            retries += retries1
+            if parquet_file is None:
+                raise UnrecoverableException(f"Failed to read index file {fname}")
+            dataframes.append(pl.from_arrow(parquet_file.read()))
+        merged = pl.concat(dataframes + [dataframe]).with_columns(
+            pl.col("document_data").struct.field("int_id_column").alias("document_id")
+        )
+        return merged.unique(subset=["band_hash", "document_id"], keep="first").drop("document_id"), retries
+
+    def _write_index_file(self, index_file: str, dataframe: pl.DataFrame) -> int:
+        """
+        Write band signatures to an index file, sorted by band hash, with the bloom filters of all
+        row groups in the file metadata
+        :param index_file: index file name
+        :param dataframe: band signatures
+        :return: number of retries
+        """
+        table = dataframe.sort("band_hash").to_arrow()
+        band_hashes = table["band_hash"].to_numpy()
+        bloom_filters = [
+            self._build_bloom_filter(band_hashes[start : start + index_row_group_size])
+            for start in range(0, len(band_hashes), index_row_group_size)
+        ]
+        writer = pa.BufferOutputStream()
+        pq.write_table(
+            table.replace_schema_metadata({index_bloom_key: base64.b64encode(b"".join(bloom_filters))}),
+            writer,
+            compression="ZSTD",
+            row_group_size=index_row_group_size,
+        )
+        result, retries = self.data_access.save_file(index_file, bytes(writer.getvalue()))
+        if result is None:
+            raise UnrecoverableException(f"Failed to save index file {index_file}")
+        return retries
+
+    @staticmethod
+    def _bloom_filter_positions(band_hashes: np.ndarray, num_bits: int) -> np.ndarray:
+        """
+        Get positions of band hashes in a bloom filter. Band hashes are uniformly distributed, so
+        the positions are derived from their two halves by double hashing
+        :param band_hashes: np.array of band hashes
+        :param num_bits: number of bits of the bloom filter
+        :return: np.array of positions (index_bloom_hashes x number of band hashes)
+        """
+        low = band_hashes & np.uint64(0xFFFFFFFF)
+        high = band_hashes >> np.uint64(32)
+        return np.stack([(low + np.uint64(i) * high) % np.uint64(num_bits) for i in range(index_bloom_hashes)])
+
+    @staticmethod
+    def _bloom_filter_size(num_rows: int) -> int:
+        """
+        Get size (bytes) of the bloom filter of a row group
+        :param num_rows: number of rows of the row group
+        :return: number of bytes
+        """
+        return max(8, -(-num_rows * index_bloom_bits // 8))
+
+    @staticmethod
+    def _build_bloom_filter(band_hashes: np.ndarray) -> bytes:
+        """
+        Build the bloom filter of the band hashes of a row group
+        :param band_hashes: np.array of band hashes
+        :return: bloom filter bits
+        """
+        num_bits = 8 * ClusterAnalysisTransform._bloom_filter_size(len(band_hashes))
+        bits = np.zeros(num_bits, dtype=bool)
+        bits[ClusterAnalysisTransform._bloom_filter_positions(band_hashes, num_bits).ravel()] = True
+        return np.packbits(bits).tobytes()
+
+    @staticmethod
+    def _get_index_row_groups(parquet_file: pq.ParquetFile, band_hashes: np.ndarray) -> list[int]:
+        """
+        Get the row groups of an index file that can contain any of the given band hashes, according to
+        their band hash range and to their bloom filters
+        :param parquet_file: index file
+        :param band_hashes: sorted np.array of band hashes
+        :return: list of row group indexes
+        """
+        row_groups = []
+        metadata = parquet_file.metadata
+        band_hash_column = parquet_file.schema_arrow.get_field_index("band_hash")
+        bloom_filters = (metadata.metadata or {}).get(index_bloom_key)
+        if bloom_filters is not None:
+            bloom_filters = base64.b64decode(bloom_filters)
+        offset = 0
+        for row_group in range(metadata.num_row_groups):
+            bloom_filter_size = ClusterAnalysisTransform._bloom_filter_size(metadata.row_group(row_group).num_rows)
+            bloom_filter = None
+            if bloom_filters is not None:
+                bloom_filter = np.frombuffer(bloom_filters, dtype=np.uint8, count=bloom_filter_size, offset=offset)
+                offset += bloom_filter_size
+            statistics = metadata.row_group(row_group).column(band_hash_column).statistics
+            if statistics is None or not statistics.has_min_max:
+                candidates = band_hashes
+            else:
+                # band hashes in the range [min, max] of the row group
+                start = np.searchsorted(band_hashes, np.uint64(statistics.min), side="left")
+                end = np.searchsorted(band_hashes, np.uint64(statistics.max), side="right")
+                candidates = band_hashes[start:end]
+            if len(candidates) == 0:
+                continue
+            if bloom_filter is not None:
+                bits = np.unpackbits(bloom_filter).astype(bool)
+                positions = ClusterAnalysisTransform._bloom_filter_positions(candidates, len(bits))
+                if not np.any(np.all(bits[positions], axis=0)):
+                    continue
+            row_groups.append(row_group)
+        return row_groups
+
+    def _consolidate_band_segment_files(
+        self, files: list[str], clusters_only: bool = True, hash_range: tuple[int, int] = None
+    ) -> tuple[pl.DataFrame, dict[str, Any]]:
+        """
+        Consolidate band segment files into a single data frame. Files are read one at a time, and only
+        documents with a band hash shared with other documents (that can be part of a cluster) are kept,
+        so memory is bounded by the size of the clusters, rather than by the size of the input.
+        Band segment files are sorted by band hash, so for a hash range only the row groups that can
+        contain band hashes in the range are read
+        :param files: list of file names
+        :param clusters_only: keep only documents with a band hash shared with other documents
+        :param hash_range: keep only documents with a band hash in this range (both ends included), if specified
+        :return: consolidated data frame and consolidation statistics
+        """
+
+        def _read_band_signatures(fname: str, columns: list[str] = None) -> tuple[pl.DataFrame, int, int]:
+            parquet_file, r = self.data_access.get_parquet_file(fname)
+            if parquet_file is None:
+                raise UnrecoverableException(f"Failed to read file {fname}")
+            row_groups = self._get_range_row_groups(parquet_file, hash_range)
+            metadata = parquet_file.metadata
+            read_bytes = sum(
+                metadata.row_group(rg).column(c).total_compressed_size
+                for rg in row_groups
+                for c in range(metadata.num_columns)
+            )
+            df = pl.from_arrow(parquet_file.read_row_groups(row_groups, columns=columns))
+            if hash_range is not None:
+                df = df.filter(
+                    pl.col("band_hash").is_between(
+                        pl.lit(hash_range[0], dtype=pl.UInt64), pl.lit(hash_range[1], dtype=pl.UInt64)
+                    )
+                )
+            return df, read_bytes, r
+
+        retries = 0
+        # first pass: find band hashes shared by multiple documents, reading band hashes only
+        band_hashes = []
+        for fname in files if clusters_only else []:
+            df, _, retries1 = _read_band_signatures(fname, columns=["band_hash"])
+            retries += retries1
+            band_hashes.append(df)
+        if not clusters_only:
+            cluster_band_hashes = None
+        elif len(band_hashes) > 0:
+            counts = pl.concat(band_hashes).group_by("band_hash").len()
+            cluster_band_hashes = counts.filter(pl.col("len") > 1).select("band_hash")
+        else:
+            cluster_band_hashes = pl.DataFrame({"band_hash": []}, schema={"band_hash": pl.UInt64})
+        del band_hashes
+        # second pass: read documents, keeping the ones with shared band hashes
+        dataframes = []
         total_input_rows = 0
-        for fname, contents in files.items():
-            df = pl.read_parquet(io.BytesIO(contents))
+        total_input_bytes = 0
+        for fname in files:
+            df, read_bytes, retries1 = _read_band_signatures(fname)
+            retries += retries1
             total_input_rows += len(df)
+            total_input_bytes += read_bytes
             self.logger.debug(f"{fname} has {len(df)} rows")
-            band_segment_dataframe = band_segment_dataframe.vstack(df)
+            if cluster_band_hashes is not None:
+                df = df.join(cluster_band_hashes, on="band_hash", how="semi")
+            dataframes.append(df)
+        band_segment_dataframe = pl.concat(dataframes) if len(dataframes) > 0 else pl.DataFrame()
 
         consolidation_stats = {
             "input_files": len(files),
-            "input_bytes": sum(len(v) for v in files.values()),
+            "input_bytes": total_input_bytes,
             "input_rows": total_input_rows,
             "consolidated_files": 1,
             "consolidated_bytes": band_segment_dataframe.to_arrow().nbytes,
             "consolidated_rows": len(band_segment_dataframe),
+            "data_access_retries": retries,
         }
         return band_segment_dataframe, consolidation_stats
 
+    @staticmethod
+    def _get_range_row_groups(parquet_file: pq.ParquetFile, hash_range: tuple[int, int] = None) -> list[int]:
+        """
+        Get the row groups of a band segment file that can contain band hashes in the given range
+        :param parquet_file: band segment file
+        :param hash_range: band hash range (both ends included), None for all row groups
+        :return: list of row group indexes
+        """
+        num_row_groups = parquet_file.metadata.num_row_groups
+        if hash_range is None:
+            return list(range(num_row_groups))
+        row_groups = []
+        band_hash_column = parquet_file.schema_arrow.get_field_index("band_hash")
+        for row_group in range(num_row_groups):
+            statistics = parquet_file.metadata.row_group(row_group).column(band_hash_column).statistics
+            if (
+                statistics is None
+                or not statistics.has_min_max
+                or (statistics.min <= hash_range[1] and statistics.max >= hash_range[0])
+            ):
+                row_groups.append(row_group)
+        return row_groups
+
     def _get_clusters(self, band_segment_dataframe: pl.DataFrame) -> tuple[pl.DataFrame, dict[str, Any]]:
         groupby_dataframe = band_segment_dataframe.group_by("band_hash").agg("document_data")
         cluster_dataframe = groupby_dataframe.with_columns(cluster_length=pl.col("document_data").list.len()).filter(
@@ -199,17 +669,40 @@ class ClusterAnalysisTransform(AbstractFolderTransform):
         schema = {"first_doc": pl.Int64, "docs_to_remove": pl.List(pl.Int64), "docs_to_remove_length": pl.Int64}
         doc_ids_lists = []
         docs_to_remove_lists = []
-        len_of_docs2remove_lists = []
-        for row in df.iter_rows(named=True):
-            doc_ids_list, docs_to_remove_list, len_of_docs2remove_list = self._jaccard_distance_calculation(row)
-            doc_ids_lists += doc_ids_list
-            docs_to_remove_lists += docs_to_remove_list
-            len_of_docs2remove_lists += len_of_docs2remove_list
+        if len(df) > 0:
+            # flatten documents of all clusters into columnar arrays, with cluster offsets
+            offsets = np.concatenate(([0], np.cumsum(df["cluster_length"].to_numpy(), dtype=np.int64)))
+            documents = df.select(pl.col("document_data").explode()).unnest("document_data")
+            doc_ids = documents["int_id_column"].to_numpy()
+            doc_lengths = documents["document_length"].to_numpy()
+            minhashes = documents["minhashes"].explode().to_numpy().reshape(len(documents), -1)
+            clusters = [
+                (doc_ids[start:end], doc_lengths[start:end], minhashes[start:end])
+                for start, end in zip(offsets[:-1], offsets[1:])
+            ]
+            if self.num_threads > 1 and any(len(cluster[0]) >= large_cluster_size for cluster in clusters):
+                # analyze large clusters in parallel, numpy releases GIL for comparisons of large arrays
+                with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
+                    results = [
+                        (
+                            executor.submit(self._jaccard_distance_calculation, *cluster)
+                            if len(cluster[0]) >= large_cluster_size
+                            else self._jaccard_distance_calculation(*cluster)
+                        )
+                        for cluster in clusters
+                    ]
+                    results = [result if isinstance(result, list) else result.result() for result in results]
+            else:
+                results = [self._jaccard_distance_calculation(*cluster) for cluster in clusters]
+            for result in results:
+                for first_doc, docs_to_remove in result:
+                    doc_ids_lists.append(first_doc)
+                    docs_to_remove_lists.append(docs_to_remove)
         jaccard_cluster_dataframe = pl.DataFrame(
             {
                 "first_doc": doc_ids_lists,
                 "docs_to_remove": docs_to_remove_lists,
-                "docs_to_remove_length": len_of_docs2remove_lists,
+                "docs_to_remove_length": [len(docs_to_remove) for docs_to_remove in docs_to_remove_lists],
             },
             schema=schema,
         )
@@ -235,45 +728,35 @@ class ClusterAnalysisTransform(AbstractFolderTransform):
             filtered_jaccard_dataframe = filtered_jaccard_dataframe.sort(by="first_doc")
         return filtered_jaccard_dataframe, jaccard_stats
 
-    def _jaccard_distance_calculation(self, row: List[pl.Series]) -> list[list]:
-        # Process row and return a new list of Series or a new row
+    def _jaccard_distance_calculation(
+        self, doc_ids: np.ndarray, doc_lengths: np.ndarray, minhashes: np.ndarray
+    ) -> list[tuple[int, list[int]]]:
+        """
+        Split a cluster into similarity clusters. The largest document (smallest id for the same size)
+        is kept, and all of the remaining documents similar to it are marked for removal. The process
+        repeats for the documents that are not similar to the kept one
+        :param doc_ids: np.array of document ids of the cluster
+        :param doc_lengths: np.array of document lengths
+        :param minhashes: np.array of document minhashes (num_docs x num_minhashes)
+        :return: list of (kept document id, ids of documents to remove)
+        """
         threshold = self.jaccard_similarity_threshold
-        doc_ids_list = []
-        docs_to_remove_list = []
-        len_of_docs2remove_list = []
-        # sort documents
-        document_data = row["document_data"]
-
-        # Sort the list by 'document_length'
-        sorted_document_data = sorted(document_data, key=lambda x: (-x["document_length"], x["int_id_column"]))
-
-        # Extracting int_id_column values into a list
-        doc_list = [item["int_id_column"] for item in sorted_document_data]
-
-        # Creating a dictionary with int_id_column as key and minhashes as value
-        doc_minhashes = {item["int_id_column"]: item["minhashes"] for item in sorted_document_data}
-
+        result = []
+        # sort documents by length (descending) and id
+        doc_list = np.lexsort((doc_ids, -doc_lengths))
+        num_minhashes = minhashes.shape[1]
         while len(doc_list) > 1:
-            docs_to_remove = []
-            new_doc_list = []
             # this is the document we are going to keep
             first_doc = doc_list[0]
-            first_mh = doc_minhashes[first_doc]
-            for int_id_column in doc_list[1:]:
-                doc_mh = doc_minhashes[int_id_column]
-                distance = Murmur_MH.jaccard(np.array(first_mh), np.array(doc_mh))
-                if distance >= threshold:
-                    docs_to_remove.append(int_id_column)
-                else:
-                    new_doc_list.append(int_id_column)
-            if len(docs_to_remove) > 0:
-                docs_to_remove = list(set(docs_to_remove))
-                doc_ids_list.append(first_doc)
-                docs_to_remove_list.append(docs_to_remove)
-                len_of_docs2remove_list.append(len(docs_to_remove))
-            doc_list = new_doc_list
-
-        return doc_ids_list, docs_to_remove_list, len_of_docs2remove_list
+            rest = doc_list[1:]
+            # Jaccard similarity of the kept document with all the remaining documents at once
+            distance = np.count_nonzero(minhashes[rest] == minhashes[first_doc], axis=1) / num_minhashes
+            similar = distance >= threshold
+            if np.any(similar):
+                docs_to_remove = list(set(doc_ids[rest[similar]].tolist()))
+                result.append((int(doc_ids[first_doc]), docs_to_remove))
+            doc_list = rest[~similar]
+        return result
 
 
 class ClusterAnalysisTransformConfiguration(TransformConfiguration):
@@ -322,6 +805,24 @@ class ClusterAnalysisTransformConfiguration(TransformConfiguration):
             default=sort_output_default,
             help="Sort the similarity clusters by the document ID of the kept doc (used primarily for testing)",
         )
+        parser.add_argument(
+            f"--{num_threads_cli_param}",
+            type=int,
+            default=num_threads_default,
+            help=f"The number of threads used to analyze clusters of at least {large_cluster_size} documents",
+        )
+        parser.add_argument(
+            f"--{index_folder_cli_param}",
+            type=str,
+            default=index_folder_default,
+            help="Location of the band hash index, for incremental fuzzy dedup of new documents",
+        )
+        parser.add_argument(
+            f"--{max_docs_per_task_cli_param}",
+            type=int,
+            default=max_docs_per_task_default,
+            help="The number of documents above which a band segment is split into multiple tasks (0 - no split)",
+        )
 
     def apply_input_params(self, args: Namespace) -> bool:
         """
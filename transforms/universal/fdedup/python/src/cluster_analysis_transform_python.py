@@ -10,12 +10,14 @@
 # limitations under the License.
 ################################################################################
 
-import os
 import time
 from typing import Any
 
 from cluster_analysis_transform import (
     ClusterAnalysisTransformConfiguration,
+    get_band_segment_folders,
+    max_docs_per_task_default,
+    max_docs_per_task_key,
     num_bands_key,
     num_segments_key,
 )
@@ -46,10 +48,12 @@ class ClusterAnalysisPythonRuntime(DefaultPythonTransformRuntime):
         :param data_access - data access object
         :return: list of folder paths
         """
-        bands = self.params[num_bands_key]
-        segments = self.params[num_segments_key]
-        folders = [os.path.join(f"band={b}", f"segment={s}") for b in range(bands) for s in range(segments)]
-        return folders
+        return get_band_segment_folders(
+            data_access=data_access,
+            num_bands=self.params[num_bands_key],
+            num_segments=self.params[num_segments_key],
+            max_docs_per_task=self.params.get(max_docs_per_task_key, max_docs_per_task_default),
+        )
 
 
 class ClusterAnalysisPythonTransformConfiguration(PythonTransformRuntimeConfiguration):
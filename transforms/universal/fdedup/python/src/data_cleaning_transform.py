@@ -14,6 +14,7 @@ import os
 from argparse import ArgumentParser, Namespace
 from typing import Any
 
+import numpy as np
 import polars as pl
 import pyarrow as pa
 from data_processing.data_access import DataAccessFactory
@@ -58,6 +59,24 @@ dataclean_data_factory_key = "dc_data_factory"
 dataclean_data_access_key = "dc_data_access"
 
 
+def get_docs_to_remove_ids(contents: Any) -> np.ndarray:
+    """
+    Build the lookup structure used by the data cleaning transform: a sorted array of unique
+    int64 document ids. The array is compact (8 bytes per document), can be shared as-is by
+    all the workers of a node (e.g. through the Ray object store), and is probed using binary search.
+    :param contents: list of documents to remove, either as a parquet file content, a data frame
+                     with a docs_to_remove column, or an already built array of ids
+    :return: sorted np.array of unique int64 document ids
+    """
+    if isinstance(contents, np.ndarray):
+        return contents
+    if isinstance(contents, pl.DataFrame):
+        docs_to_remove = contents["docs_to_remove"]
+    else:
+        docs_to_remove = pl.read_parquet(io.BytesIO(contents), columns=["docs_to_remove"])["docs_to_remove"]
+    return np.unique(docs_to_remove.drop_nulls().cast(pl.Int64).to_numpy())
+
+
 class DataCleaningTransform(AbstractTableTransform):
     """
     This is the third transform of the fuzzy dedup pipeline. It takes as input
@@ -84,31 +103,37 @@ class DataCleaningTransform(AbstractTableTransform):
         self.document_id_column = config.get(document_id_column_key, document_id_column_default)
         self.duplicate_list_location = config.get(duplicate_list_location_key, duplicate_list_location_default)
         self.operation_mode = config.get(operation_mode_key, operation_mode_default)
-        contents = config.get("df")
-        self.docs_to_remove_df = pl.read_parquet(io.BytesIO(contents))
-        self.logger.debug(f"Got docs_to_remove_df with {len(self.docs_to_remove_df)} rows")
-        self.docs_to_remove_df = self.docs_to_remove_df.rename({"docs_to_remove": self.document_id_column})
+        # sorted ids of the documents to remove, built once by the runtime; parquet file content
+        # or data frame are also accepted, and converted here
+        self.docs_to_remove = get_docs_to_remove_ids(config.get("df"))
+        self.logger.debug(f"Got {len(self.docs_to_remove)} documents to remove")
+
+    def _is_duplicate(self, doc_ids: pl.Series) -> np.ndarray:
+        """
+        Vectorized lookup of document ids in the sorted list of documents to remove
+        :param doc_ids: document ids
+        :return: np.array of booleans, True for the documents that are in the list
+        """
+        doc_ids = doc_ids.cast(pl.Int64)
+        valid = doc_ids.is_not_null().to_numpy()
+        doc_ids = doc_ids.fill_null(0).to_numpy()
+        if len(self.docs_to_remove) == 0:
+            return np.zeros(len(doc_ids), dtype=bool)
+        index = np.searchsorted(self.docs_to_remove, doc_ids)
+        np.minimum(index, len(self.docs_to_remove) - 1, out=index)
+        return (self.docs_to_remove[index] == doc_ids) & valid
 
     def transform(self, table: pa.Table, file_name: str = None) -> tuple[list[pa.Table], dict[str, Any]]:
         self.logger.debug(f"Transforming table with {table.num_rows} rows from file {file_name}")
         input_df = pl.from_arrow(table)
-        # handle the case when the doc_id columns in the input dataframe and the
-        # docs_to_remove_df  have different types, i.e. one is int32 and the
-        # other is int64
-        input_doc_id_type = input_df[self.document_id_column].dtype
-        if input_doc_id_type != self.docs_to_remove_df[self.document_id_column].dtype:
-            self.docs_to_remove_df = self.docs_to_remove_df.select(
-                pl.col(self.document_id_column).cast(input_doc_id_type)
-            )
+        # doc ids of any integer type (i.e. int32 or int64) are compared as int64
+        is_duplicate = self._is_duplicate(input_df[self.document_id_column])
         if self.operation_mode == "filter_duplicates":
-            result_df = input_df.join(self.docs_to_remove_df, on=self.document_id_column, how="anti")
+            result_df = input_df.filter(pl.Series(~is_duplicate))
         elif self.operation_mode == "filter_non_duplicates":
-            result_df = input_df.join(self.docs_to_remove_df, on=self.document_id_column, how="inner")
+            result_df = input_df.filter(pl.Series(is_duplicate))
         else:  # self.operation_mode == "annotation"
-            duplicates_df = self.docs_to_remove_df.with_columns(pl.lit("d").alias("duplicate"))
-            result_df = input_df.join(duplicates_df, on=self.document_id_column, how="left").with_columns(
-                pl.col("duplicate").fill_null("")
-            )
+            result_df = input_df.with_columns(pl.Series("duplicate", np.where(is_duplicate, "d", ""), dtype=pl.String))
         result_table = result_df.to_arrow()
         metadata = {
             "input_files": 1,
@@ -0,0 +1,426 @@
+# (C) Copyright IBM Corp. 2024.
+# Licensed under the Apache License, Version 2.0 (the “License”);
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#  http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an “AS IS” BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+STAGES = ["minhash", "signature_calc", "cluster_analysis", "get_duplicate_list", "data_cleaning"]
+""" Benchmarked stages, in pipeline order"""
+
+SERVICES = {
+    "signature_calc": "minhash",
+    "cluster_analysis": "cluster",
+    "get_duplicate_list": "fdlist",
+    "data_cleaning": "fdclean",
+}
+""" Fuzzy dedup services (short names) of the stages running on the pure python runtime"""
+
+STAGE_OUTPUT_FOLDERS = {
+    "signature_calc": ["bands", "histograms"],
+    "cluster_analysis": ["docs_to_remove"],
+    "get_duplicate_list": ["docs_to_remove_consolidated"],
+    "data_cleaning": ["cleaned"],
+}
+""" Output folders of every stage, relative to the output folder of fuzzy dedup"""
+
+
+def generate_corpus(
+    num_docs: int,
+    duplicate_rate: float = 0.1,
+    cluster_skew: float = 1.0,
+    min_words: int = 50,
+    max_words: int = 500,
+    vocabulary_size: int = 10000,
+    edit_rate: float = 0.01,
+    seed: int = 42,
+) -> pa.Table:
+    """
+    Generate a synthetic corpus with near duplicate documents. Original documents are sequences of words
+    drawn from a random vocabulary with Zipf distributed frequencies. Duplicates are copies of original
+    documents, with a fraction of their words replaced by random words. The number of duplicates of an
+    original document follows a power law, with cluster_skew as exponent: 0 gives clusters of similar
+    size, larger values give a few very large clusters
+    :param num_docs: number of documents (originals and duplicates)
+    :param duplicate_rate: fraction of documents that are near duplicates of an original document
+    :param cluster_skew: exponent of the power law distribution of the number of duplicates of originals
+    :param min_words: minimum number of words of a document
+    :param max_words: maximum number of words of a document
+    :param vocabulary_size: number of distinct words
+    :param edit_rate: fraction of the words of a duplicate replaced by random words
+    :param seed: seed of the random number generator
+    :return: table with document ids (int_id_column) and contents (contents) columns
+    """
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    vocabulary = np.array(
+        ["".join(rng.choice(letters, size=length)) for length in rng.integers(2, 11, size=vocabulary_size)]
+    )
+    word_weights = 1.0 / np.arange(1, vocabulary_size + 1)
+    word_weights /= word_weights.sum()
+    num_duplicates = int(num_docs * duplicate_rate)
+    num_originals = num_docs - num_duplicates
+    # original documents
+    lengths = rng.integers(min_words, max_words + 1, size=num_originals)
+    words = rng.choice(vocabulary_size, size=lengths.sum(), p=word_weights)
+    originals = np.split(words, np.cumsum(lengths)[:-1])
+    # duplicates, assigned to originals with power law distributed probabilities
+    cluster_weights = 1.0 / np.power(rng.permutation(num_originals) + 1.0, cluster_skew)
+    cluster_weights /= cluster_weights.sum()
+    duplicates = []
+    for source in rng.choice(num_originals, size=num_duplicates, p=cluster_weights):
+        duplicate = originals[source].copy()
+        edits = rng.random(len(duplicate)) < edit_rate
+        duplicate[edits] = rng.choice(vocabulary_size, size=int(edits.sum()), p=word_weights)
+        duplicates.append(duplicate)
+    contents = [" ".join(vocabulary[document]) for document in originals + duplicates]
+    order = rng.permutation(num_docs)
+    return pa.table(
+        {
+            "int_id_column": pa.array(np.arange(num_docs, dtype=np.int64)),
+            "contents": pa.array([contents[index] for index in order], type=pa.string()),
+        }
+    )
+
+
+def write_corpus(table: pa.Table, folder: str, num_files: int) -> None:
+    """
+    Write a corpus as a set of parquet files of similar size
+    :param table: corpus
+    :param folder: output folder
+    :param num_files: number of files
+    :return: None
+    """
+    os.makedirs(folder, exist_ok=True)
+    bounds = np.linspace(0, table.num_rows, num_files + 1, dtype=np.int64)
+    for index in range(num_files):
+        pq.write_table(
+            table.slice(bounds[index], bounds[index + 1] - bounds[index]),
+            os.path.join(folder, f"corpus_{index}.parquet"),
+        )
+
+
+def get_folder_size(folder: str) -> int:
+    """
+    Get the total size of the files of a folder (and of its subfolders)
+    :param folder: folder
+    :return: size in bytes
+    """
+    size = 0
+    for root, _, files in os.walk(folder):
+        size += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return size
+
+
+def get_peak_rss() -> int:
+    """
+    Get the peak resident set size of the current process
+    :return: peak RSS in bytes
+    """
+    import resource
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # reported in bytes on macOS, and in kilobytes on Linux
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+def _run_minhash(input_folder: str, params: dict[str, Any]) -> tuple[int, float, int]:
+    """
+    Benchmark minhash calculation (Murmur_MH.minhash_batch) on word shingles of the corpus
+    :param input_folder: corpus folder
+    :param params: benchmark parameters
+    :return: number of documents, processing time and bytes written
+    """
+    from Murmur_MH import Murmur_MH
+
+    contents = pq.read_table(input_folder, columns=["contents"])["contents"].to_pylist()
+    window_size = params["word_shingle_size"]
+    shingles = []
+    offsets = [0]
+    for text in contents:
+        words = text.split()
+        shingles.extend(
+            " ".join(words[index : index + window_size]) for index in range(max(1, len(words) - window_size + 1))
+        )
+        offsets.append(len(shingles))
+    mm_min_hash = Murmur_MH(num_perm=params["num_permutations"], seed=params["seed"])
+    start = time.time()
+    mm_min_hash.minhash_batch(shingles, np.array(offsets))
+    return len(contents), time.time() - start, 0
+
+
+def _run_service(stage: str, work_folder: str, params: dict[str, Any]) -> tuple[int, float, int]:
+    """
+    Run a fuzzy dedup stage standalone, with the pure python runtime
+    :param stage: stage name
+    :param work_folder: benchmark folder, with the corpus in the input subfolder
+    :param params: benchmark parameters
+    :return: number of documents, processing time and bytes written
+    """
+    from fdedup_transform_python import ServiceOrchestrator, parse_args
+
+    output_folder = os.path.join(work_folder, "output")
+    for folder in STAGE_OUTPUT_FOLDERS[stage]:
+        shutil.rmtree(os.path.join(output_folder, folder), ignore_errors=True)
+    sys.argv = [
+        "fdedup_benchmark",
+        "--input_folder",
+        os.path.join(work_folder, "input"),
+        "--output_folder",
+        output_folder,
+        "--num_permutations",
+        str(params["num_permutations"]),
+        "--num_bands",
+        str(params["num_bands"]),
+        "--num_minhashes_per_band",
+        str(params["num_minhashes_per_band"]),
+        "--word_shingle_size",
+        str(params["word_shingle_size"]),
+        "--num_segments",
+        str(params["num_segments"]),
+        "--jaccard_similarity_threshold",
+        str(params["jaccard_similarity_threshold"]),
+        "--seed",
+        str(params["seed"]),
+        "--operation_mode",
+        "filter_duplicates",
+    ]
+    orchestrator = ServiceOrchestrator(global_params=parse_args())
+    service_short_name = SERVICES[stage]
+    service_params = orchestrator.get_arguments(orchestrator.global_params, service_short_name)
+    start = time.time()
+    status = orchestrator.execute_service(service_short_name, service_params)
+    elapsed = time.time() - start
+    if status != 0:
+        raise RuntimeError(f"Stage {stage} failed with status {status}")
+    bytes_written = sum(get_folder_size(os.path.join(output_folder, folder)) for folder in STAGE_OUTPUT_FOLDERS[stage])
+    return params["num_docs"], elapsed, bytes_written
+
+
+def _run_stage(stage: str, work_folder: str, params: dict[str, Any], log_level: str, connection: Any) -> None:
+    """
+    Run a stage in a separate process, so that the peak RSS is measured for this stage only
+    :param stage: stage name
+    :param work_folder: benchmark folder
+    :param params: benchmark parameters
+    :param log_level: minimum level of the stage log messages
+    :param connection: pipe connection used for sending the results
+    :return: None
+    """
+    # some loggers of the stages are created with an explicit level, so messages below log_level are disabled
+    os.environ["DPK_LOG_LEVEL"] = log_level
+    logging.disable(logging.getLevelName(log_level) - 1)
+    try:
+        if stage == "minhash":
+            num_docs, elapsed, bytes_written = _run_minhash(os.path.join(work_folder, "input"), params)
+        else:
+            num_docs, elapsed, bytes_written = _run_service(stage, work_folder, params)
+        connection.send(
+            {
+                "docs": num_docs,
+                "time_sec": elapsed,
+                "peak_rss_bytes": get_peak_rss(),
+                "bytes_written": bytes_written,
+            }
+        )
+    except Exception as e:
+        connection.send({"error": f"{type(e).__name__}: {e}"})
+    finally:
+        connection.close()
+
+
+def run_stage(stage: str, work_folder: str, params: dict[str, Any], log_level: str = "WARNING") -> dict[str, Any]:
+    """
+    Run a stage in a new process
+    :param stage: stage name
+    :param work_folder: benchmark folder
+    :param params: benchmark parameters
+    :param log_level: minimum level of the stage log messages
+    :return: stage results: documents, time, docs/sec, peak RSS and bytes written
+    """
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run_stage, args=(stage, work_folder, params, log_level, sender))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = {"error": "stage process terminated"}
+    process.join()
+    if "error" in result:
+        raise RuntimeError(f"Stage {stage} failed: {result['error']}")
+    result["docs_per_sec"] = round(result["docs"] / result["time_sec"], 1) if result["time_sec"] > 0 else None
+    result["time_sec"] = round(result["time_sec"], 3)
+    return result
+
+
+def run_benchmark(
+    params: dict[str, Any], stages: list[str], work_folder: str, log_level: str = "WARNING"
+) -> dict[str, Any]:
+    """
+    Generate a synthetic corpus and benchmark fuzzy dedup stages. Stages that the selected stages depend
+    on are executed too, but not reported. Every stage runs repeats times, and the fastest run is reported
+    :param params: benchmark parameters
+    :param stages: stages to benchmark
+    :param work_folder: benchmark folder
+    :param log_level: minimum level of the stage log messages
+    :return: benchmark results
+    """
+    start = time.time()
+    corpus = generate_corpus(
+        num_docs=params["num_docs"],
+        duplicate_rate=params["duplicate_rate"],
+        cluster_skew=params["cluster_skew"],
+        min_words=params["min_words"],
+        max_words=params["max_words"],
+        vocabulary_size=params["vocabulary_size"],
+        edit_rate=params["edit_rate"],
+        seed=params["seed"],
+    )
+    corpus_bytes = corpus.nbytes
+    write_corpus(corpus, os.path.join(work_folder, "input"), params["num_files"])
+    del corpus
+    print(f"Generated corpus of {params['num_docs']} documents in {round(time.time() - start, 3)} sec")
+    results = {}
+    last_stage = max(STAGES.index(stage) for stage in stages)
+    for stage in STAGES[: last_stage + 1]:
+        if stage not in stages and stage == "minhash":
+            continue
+        repeats = params["repeats"] if stage in stages else 1
+        runs = [run_stage(stage, work_folder, params, log_level) for _ in range(repeats)]
+        if stage in stages:
+            result = min(runs, key=lambda run: run["time_sec"])
+            result["peak_rss_bytes"] = max(run["peak_rss_bytes"] for run in runs)
+            results[stage] = result
+            print(f"{stage}: {result}")
+    return {
+        "params": params,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "corpus_bytes": corpus_bytes,
+        "stages": results,
+    }
+
+
+def compare_results(baseline: dict[str, Any], current: dict[str, Any], max_regression: float) -> list[str]:
+    """
+    Compare benchmark results with results of a baseline (e.g. another commit)
+    :param baseline: baseline results
+    :param current: current results
+    :param max_regression: maximum allowed relative decrease of docs/sec, or increase of peak RSS
+    :return: list of regressions, empty if there are none
+    """
+    regressions = []
+    if baseline.get("params") != current["params"]:
+        print("Warning: baseline results were produced with different benchmark parameters")
+    for stage, result in current["stages"].items():
+        baseline_result = baseline.get("stages", {}).get(stage)
+        if baseline_result is None:
+            print(f"{stage}: no baseline")
+            continue
+        speedup = result["docs_per_sec"] / baseline_result["docs_per_sec"]
+        rss_ratio = result["peak_rss_bytes"] / baseline_result["peak_rss_bytes"]
+        bytes_ratio = (
+            result["bytes_written"] / baseline_result["bytes_written"] if baseline_result["bytes_written"] > 0 else 1
+        )
+        print(f"{stage}: docs/sec x{speedup:.2f}, peak RSS x{rss_ratio:.2f}, bytes written x{bytes_ratio:.2f}")
+        if speedup < 1 - max_regression:
+            regressions.append(f"{stage} docs/sec decreased by {(1 - speedup) * 100:.1f}%")
+        if rss_ratio > 1 + max_regression:
+            regressions.append(f"{stage} peak RSS increased by {(rss_ratio - 1) * 100:.1f}%")
+    return regressions
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fuzzy dedup benchmark")
+    parser.add_argument("--output_file", type=str, default=None, help="JSON file for the benchmark results")
+    parser.add_argument("--compare", type=str, default=None, help="JSON file with baseline benchmark results")
+    parser.add_argument(
+        "--max_regression",
+        type=float,
+        default=0.1,
+        help="maximum relative docs/sec decrease or peak RSS increase compared to baseline",
+    )
+    parser.add_argument(
+        "--stages", type=str, default=",".join(STAGES), help=f"comma separated list of stages, from {STAGES}"
+    )
+    parser.add_argument("--work_folder", type=str, default=None, help="benchmark folder, temporary by default")
+    parser.add_argument(
+        "--log_level",
+        type=str,
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        default="WARNING",
+        help="minimum level of the log messages of the stages",
+    )
+    parser.add_argument("--repeats", type=int, default=1, help="number of runs of every stage")
+    parser.add_argument("--num_docs", type=int, default=20000, help="number of documents")
+    parser.add_argument("--num_files", type=int, default=4, help="number of corpus files")
+    parser.add_argument("--duplicate_rate", type=float, default=0.1, help="fraction of near duplicate documents")
+    parser.add_argument("--cluster_skew", type=float, default=1.0, help="power law exponent of cluster sizes")
+    parser.add_argument("--min_words", type=int, default=50, help="minimum number of words of a document")
+    parser.add_argument("--max_words", type=int, default=500, help="maximum number of words of a document")
+    parser.add_argument("--vocabulary_size", type=int, default=10000, help="number of distinct words")
+    parser.add_argument("--edit_rate", type=float, default=0.01, help="fraction of changed words of duplicates")
+    parser.add_argument("--seed", type=int, default=42, help="seed of the random number generators")
+    parser.add_argument("--num_permutations", type=int, default=112, help="number of minhashes")
+    parser.add_argument("--num_bands", type=int, default=14, help="number of bands")
+    parser.add_argument("--num_minhashes_per_band", type=int, default=8, help="number of minhashes of a band")
+    parser.add_argument("--word_shingle_size", type=int, default=5, help="number of words of a shingle")
+    parser.add_argument("--num_segments", type=int, default=1, help="number of segments of a band")
+    parser.add_argument("--jaccard_similarity_threshold", type=float, default=0.75, help="Jaccard threshold")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    stages = args.stages.split(",")
+    for stage in stages:
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage {stage}, must be one of {STAGES}")
+    benchmark_params = {
+        key: value
+        for key, value in vars(args).items()
+        if key not in ["output_file", "compare", "max_regression", "stages", "work_folder", "log_level"]
+    }
+    benchmark_folder = args.work_folder if args.work_folder is not None else tempfile.mkdtemp(prefix="fdedup_bench_")
+    try:
+        benchmark_results = run_benchmark(benchmark_params, stages, benchmark_folder, args.log_level)
+    finally:
+        if args.work_folder is None:
+            shutil.rmtree(benchmark_folder, ignore_errors=True)
+    if args.output_file is not None:
+        with open(args.output_file, "w") as f:
+            json.dump(benchmark_results, f, indent=2)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline_results = json.load(f)
+        found_regressions = compare_results(baseline_results, benchmark_results, args.max_regression)
+        for regression in found_regressions:
+            print(f"Regression: {regression}")
+        sys.exit(1 if len(found_regressions) > 0 else 0)
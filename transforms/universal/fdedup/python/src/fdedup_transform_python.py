@@ -14,20 +14,48 @@ import argparse
 import ast
 import os
 import sys
+import time
+from datetime import datetime
+from typing import Any
 
 import cluster_analysis_transform
 import data_cleaning_transform
 import get_duplicate_list_transform
+import polars as pl
 import signature_calc_transform
+from cluster_analysis_transform import (
+    ClusterAnalysisTransform,
+    ClusterAnalysisTransformConfiguration,
+)
 from cluster_analysis_transform_python import (
     ClusterAnalysisPythonTransformConfiguration,
 )
+from data_cleaning_transform import (
+    DataCleaningTransform,
+    DataCleaningTransformConfiguration,
+)
 from data_cleaning_transform_python import DataCleaningPythonTransformConfiguration
+from data_processing.data_access import DataAccess, DataAccessFactory
 from data_processing.runtime.pure_python import PythonTransformLauncher
-from data_processing.utils import ParamsUtils, get_logger, str2bool
+from data_processing.transform import TransformConfiguration, TransformStatistics
+from data_processing.utils import (
+    ParamsUtils,
+    TransformUtils,
+    UnrecoverableException,
+    get_logger,
+    str2bool,
+)
+from get_duplicate_list_transform import (
+    GetDuplicateListTransform,
+    GetDuplicateListTransformConfiguration,
+)
 from get_duplicate_list_transform_python import (
     GetDuplicateListPythonTransformConfiguration,
 )
+from signature_calc_transform import (
+    SignatureCalculationTransform,
+    SignatureCalculationTransformConfiguration,
+)
 from signature_calc_transform_python import (
     SignatureCalculationPythonTransformConfiguration,
 )
@@ -59,7 +87,13 @@ class ServiceOrchestrator:
         self.global_params = global_params
         self.logger = get_logger(__name__)
 
-    def orchestrate(self):
+    def orchestrate(self) -> int:
+        """
+        Run fuzzy dedup steps, one after the other, or all of them in memory
+        :return: 0 on success, status of the failed step otherwise
+        """
+        if getattr(self.global_params, "in_memory", False):
+            return self.orchestrate_in_memory()
         service_list = self.global_params.services.split(",")
         for service in service_list:
             self.logger.info(f"Starting {service} step")
@@ -75,7 +109,160 @@ class ServiceOrchestrator:
                 self.logger.info(f"{service} completed successfully")
             else:
                 self.logger.error(f"{service} failed with status {status}, aborting ...")
-                break
+                return status
+        return 0
+
+    def orchestrate_in_memory(self) -> int:
+        """
+        Run all fuzzy dedup steps in a single process. Steps hand their results (band signatures,
+        documents to remove) directly to the next step, instead of writing them to storage. Band
+        signatures of the whole data set are kept in memory (or spilled to local files, according to
+        the signature calculation memory budget), so this mode is intended for data sets processed by
+        a single node. Input files are read one at a time, once by signature calculation and once more
+        by data cleaning, so they are never all in memory. Cleaned data and the consolidated duplicate
+        list are identical to the ones produced by running the steps separately; per step statistics
+        and timings are saved in a single metadata file in the output folder
+        :return: 0 on success, 1 otherwise
+        """
+        if self.global_params.services.split(",") != list(SERVICE_DICT.keys()):
+            self.logger.warning(f"In memory mode runs all steps, ignoring services {self.global_params.services}")
+        start_time = time.time()
+        start_ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        input_params = {}
+        output_stats = {}
+        status = "success"
+        data_access = None
+        try:
+            # signature calculation
+            t_start = time.time()
+            params, data_access = self._get_step_params("minhash", SignatureCalculationTransformConfiguration())
+            input_params["minhash"] = params.pop("metadata")
+            files, _, _ = data_access.get_files_to_process()
+            if len(files) == 0:
+                raise UnrecoverableException(f"No input files to process")
+            sc_transform = SignatureCalculationTransform(params | {"data_access": data_access})
+            stats = TransformStatistics()
+            for file in files:
+                contents, _ = data_access.get_file(file)
+                if contents is None:
+                    raise UnrecoverableException(f"Failed to read file {file}")
+                _, file_stats = sc_transform.transform_binary(file_name=file, byte_array=contents)
+                stats.add_stats(file_stats)
+            stats.add_stats(
+                {
+                    "input_files": sc_transform.files_processed,
+                    "input_docs": sc_transform.docs_processed,
+                    "input_bytes": sc_transform.bytes_processed,
+                }
+            )
+            band_signatures = list(sc_transform.get_band_signatures())
+            output_stats["minhash"] = self._get_step_stats(stats, t_start)
+            # cluster analysis
+            t_start = time.time()
+            params, _ = self._get_step_params("cluster", ClusterAnalysisTransformConfiguration())
+            input_params["cluster"] = params.pop("metadata")
+            cl_transform = ClusterAnalysisTransform(params | {"data_access": data_access})
+            stats = TransformStatistics()
+            docs_to_remove = []
+            while len(band_signatures) > 0:
+                band_ix, segment_index, table = band_signatures.pop(0)
+                df = pl.from_arrow(table)
+                if cl_transform.index_folder is not None:
+                    df, index_stats = cl_transform.update_band_segment_index(band_ix, segment_index, df)
+                    stats.add_stats(index_stats)
+                df, analysis_stats = cl_transform.analyze_band_segment(df)
+                docs_to_remove.append(df)
+                stats.add_stats(analysis_stats)
+            output_stats["cluster"] = self._get_step_stats(stats, t_start)
+            # get duplicate list
+            t_start = time.time()
+            params, fd_data_access = self._get_step_params("fdlist", GetDuplicateListTransformConfiguration())
+            input_params["fdlist"] = params.pop("metadata")
+            fd_transform = GetDuplicateListTransform(params | {"data_access": fd_data_access})
+            duplicate_list, consolidation_stats = fd_transform.consolidate_docs_to_remove(docs_to_remove)
+            del docs_to_remove
+            duplicate_list_path = os.path.join(fd_data_access.output_folder, fd_transform.consolidated_filename)
+            result, _ = fd_data_access.save_file(
+                duplicate_list_path, TransformUtils.convert_arrow_to_binary(duplicate_list.to_arrow())
+            )
+            if result is None:
+                raise UnrecoverableException(f"Failed to save duplicate list {duplicate_list_path}")
+            stats = TransformStatistics()
+            stats.add_stats(consolidation_stats)
+            output_stats["fdlist"] = self._get_step_stats(stats, t_start)
+            # data cleaning
+            t_start = time.time()
+            params, dc_data_access = self._get_step_params("fdclean", DataCleaningTransformConfiguration())
+            input_params["fdclean"] = params.pop("metadata")
+            dc_transform = DataCleaningTransform(params | {"df": duplicate_list})
+            stats = TransformStatistics()
+            for file in files:
+                # input files are read again, rather than kept in memory since signature calculation
+                contents, _ = data_access.get_file(file)
+                if contents is None:
+                    raise UnrecoverableException(f"Failed to read file {file}")
+                out_files, file_stats = dc_transform.transform_binary(file_name=file, byte_array=contents)
+                stats.add_stats(file_stats)
+                if len(out_files) == 1:
+                    output_path = dc_data_access.get_output_location(file)
+                    result, _ = dc_data_access.save_file(output_path, out_files[0][0])
+                    if result is None:
+                        raise UnrecoverableException(f"Failed to save cleaned file {output_path}")
+                    stats.add_stats({"result_files": 1, "result_size": len(out_files[0][0])})
+            output_stats["fdclean"] = self._get_step_stats(stats, t_start)
+            self.logger.info(f"In memory fuzzy dedup completed in {round(time.time() - start_time, 3)} sec")
+        except Exception as e:
+            self.logger.error(f"In memory fuzzy dedup failed: {e}", exc_info=True)
+            status = "failure"
+        if data_access is not None:
+            metadata = {
+                "pipeline": "fdedup",
+                "job details": {
+                    "job category": "preprocessing",
+                    "job name": "fdedup",
+                    "job type": "pure python in memory",
+                    "start_time": start_ts,
+                    "end_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "status": status,
+                },
+                "code": None,
+                "job_input_params": input_params,
+                "execution_stats": {"execution time, min": round((time.time() - start_time) / 60.0, 3)},
+                "job_output_stats": output_stats,
+            }
+            data_access.save_job_metadata(metadata)
+        return 0 if status == "success" else 1
+
+    def _get_step_params(
+        self, service_short_name: str, configuration: TransformConfiguration
+    ) -> tuple[dict[str, Any], DataAccess]:
+        """
+        Get parameters of a fuzzy dedup step, parsing the same arguments used for running the step separately
+        :param service_short_name: step short name
+        :param configuration: transform configuration of the step
+        :return: transform parameters (with metadata parameters under the "metadata" key) and data access
+        """
+        parser = argparse.ArgumentParser()
+        configuration.add_input_params(parser)
+        data_access_factory = DataAccessFactory()
+        data_access_factory.add_input_params(parser)
+        args, _ = parser.parse_known_args(self.get_arguments(self.global_params, service_short_name)[1:])
+        if not configuration.apply_input_params(args) or not data_access_factory.apply_input_params(args):
+            raise ValueError(f"Invalid parameters for {service_short_name}")
+        # metadata removes keys from the configuration parameters, so parameters are copied first
+        params = dict(configuration.get_transform_params())
+        params["metadata"] = dict(configuration.get_transform_metadata())
+        return params, data_access_factory.create_data_access()
+
+    @staticmethod
+    def _get_step_stats(stats: TransformStatistics, t_start: float) -> dict[str, Any]:
+        """
+        Get statistics of a fuzzy dedup step
+        :param stats: step statistics
+        :param t_start: step start time
+        :return: statistics, including step processing time
+        """
+        return stats.get_execution_stats() | {"processing_time": round(time.time() - t_start, 3)}
 
     def get_arguments(self, in_args: argparse.Namespace, service_name: str) -> list:
         sys_argv = ["python"]
@@ -220,6 +407,20 @@ def parse_args() -> argparse.Namespace:
         help="path to the file with all the duplicate document ids",
     )
 
+    parser.add_argument(
+        "--index_folder",
+        type=str,
+        required=False,
+        help="path to the band hash index of previous runs, for incremental fuzzy dedup of new documents",
+    )
+
+    parser.add_argument(
+        "--max_docs_per_task",
+        type=int,
+        required=False,
+        help="number of documents above which a band segment is split into multiple cluster analysis tasks",
+    )
+
     # Single argument for service execution
     parser.add_argument(
         "--services",
@@ -251,6 +452,13 @@ def parse_args() -> argparse.Namespace:
         help="Option used for shingling",
     )
 
+    parser.add_argument(
+        "--in_memory",
+        type=lambda x: bool(str2bool(x)),
+        default=False,
+        help="run all steps in a single process, handing intermediate results over in memory",
+    )
+
     parser.add_argument(
         "--run_locally",
         type=lambda x: bool(str2bool(x)),
@@ -268,4 +476,4 @@ if __name__ == "__main__":
     # Initialize the orchestrator
     orchestrator = ServiceOrchestrator(global_params=args)
     # Launch python fuzzy dedup execution
-    orchestrator.orchestrate()
+    sys.exit(orchestrator.orchestrate())
@@ -12,11 +12,16 @@
 import io
 import os
 from argparse import ArgumentParser, Namespace
-from typing import Any
+from typing import Any, Iterable, Iterator
 
 import polars as pl
 from data_processing.transform import AbstractFolderTransform, TransformConfiguration
-from data_processing.utils import CLIArgumentProvider, TransformUtils, get_logger
+from data_processing.utils import (
+    CLIArgumentProvider,
+    TransformUtils,
+    UnrecoverableException,
+    get_logger,
+)
 
 
 short_name = "fdlist"
@@ -82,33 +87,71 @@ class GetDuplicateListTransform(AbstractFolderTransform):
         files, retries = self.data_access.get_folder_files(
             path=input_folder,
             extensions=[".parquet"],
-            return_data=True,
+            return_data=False,
         )
-        if retries > 0:
-            metadata |= {"data_access_retries": retries}
         output_folder = TransformUtils.clean_path(self.data_access.output_folder)
         output_path = os.path.join(output_folder, self.consolidated_filename)
 
         # consolidate into a single data frame band hashes computed by workers
-        consolidated_dataframe, consolidation_stats = self._consolidate_docs_to_remove_files(files)
+        consolidated_dataframe, consolidation_stats = self._consolidate_docs_to_remove_files(list(files.keys()))
         self.logger.info(f"{len(consolidated_dataframe)} documents marked as duplicates")
+        retries += consolidation_stats.pop("data_access_retries", 0)
+        if retries > 0:
+            metadata |= {"data_access_retries": retries}
         metadata |= consolidation_stats
         output_data = TransformUtils.convert_arrow_to_binary(consolidated_dataframe.to_arrow())
         return [(output_data, output_path)], metadata
 
-    def _consolidate_docs_to_remove_files(self, files: dict[str, bytes]) -> tuple[pl.DataFrame, dict[str, Any]]:
-        consolidated_dataframe = pl.DataFrame()
+    def _consolidate_docs_to_remove_files(self, files: list[str]) -> tuple[pl.DataFrame, dict[str, Any]]:
+        """
+        Consolidate documents to remove into a single data frame of unique document ids. Files are read
+        one at a time, so memory is bounded by the number of unique documents to remove, rather than by
+        the size of the input
+        :param files: list of file names
+        :return: consolidated data frame and consolidation statistics
+        """
+        read_stats = {"data_access_retries": 0, "input_bytes": 0}
+
+        def _read_files() -> Iterator[pl.DataFrame]:
+            for fname in files:
+                contents, retries = self.data_access.get_file(fname)
+                read_stats["data_access_retries"] += retries
+                if contents is None:
+                    raise UnrecoverableException(f"Failed to read file {fname}")
+                read_stats["input_bytes"] += len(contents)
+                df = pl.read_parquet(io.BytesIO(contents), columns=["docs_to_remove"])
+                self.logger.debug(f"{fname} has {len(df)} rows")
+                yield df
+
+        consolidated_dataframe, consolidation_stats = self.consolidate_docs_to_remove(_read_files())
+        return consolidated_dataframe, consolidation_stats | {"input_files": len(files)} | read_stats
+
+    def consolidate_docs_to_remove(self, dataframes: Iterable[pl.DataFrame]) -> tuple[pl.DataFrame, dict[str, Any]]:
+        """
+        Consolidate documents to remove into a single data frame of unique document ids. Unique ids are
+        compacted incrementally, once new ids outnumber the ones already compacted
+        :param dataframes: data frames containing docs_to_remove column
+        :return: consolidated data frame and consolidation statistics
+        """
         total_input_rows = 0
-        for fname, contents in files.items():
-            df = pl.read_parquet(io.BytesIO(contents))
+        unique_dataframes = []
+        unique_rows = 0
+        pending_rows = 0
+        for df in dataframes:
             total_input_rows += len(df)
-            self.logger.debug(f"{fname} has {len(df)} rows")
-            consolidated_dataframe = consolidated_dataframe.vstack(df)
-        consolidated_dataframe = consolidated_dataframe.select("docs_to_remove").unique()
+            df = df.select("docs_to_remove").unique()
+            unique_dataframes.append(df)
+            pending_rows += len(df)
+            if pending_rows > max(unique_rows, 1024 * 1024):
+                unique_dataframes = [pl.concat(unique_dataframes).unique()]
+                unique_rows = len(unique_dataframes[0])
+                pending_rows = 0
+        if len(unique_dataframes) > 0:
+            consolidated_dataframe = pl.concat(unique_dataframes).unique()
+        else:
+            consolidated_dataframe = pl.DataFrame({"docs_to_remove": []}, schema={"docs_to_remove": pl.Int64})
 
         consolidation_stats = {
-            "input_files": len(files),
-            "input_bytes": sum(len(v) for v in files.values()),
             "input_rows": total_input_rows,
             "consolidated_files": 1,
             "consolidated_bytes": consolidated_dataframe.to_arrow().nbytes,
@@ -9,17 +9,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 ################################################################################
+import math
 import os
 import re
-import unicodedata
+import shutil
+import tempfile
 from argparse import ArgumentParser, Namespace
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
 
 import mmh3
 import numpy as np
 import polars as pl
 import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 from data_processing.data_access import DataAccessFactory
 from data_processing.transform import AbstractTableTransform, TransformConfiguration
 from data_processing.utils import CLIArgumentProvider, UnrecoverableException
@@ -50,6 +54,8 @@ num_segments_key = "num_segments"
 """ This key holds the number of segments across which we divide the hashing space for each band"""
 shingle_option_key = "shingle_option"
 """ This key holds the option that is used to do shingles calculation for each document"""
+memory_budget_key = "memory_budget"
+""" This key holds the size (MB) of band signatures buffered in memory before spilling them to the local disk"""
 
 # command line arguments
 document_id_column_cli_param = f"{cli_prefix}{document_id_column_key}"
@@ -72,6 +78,8 @@ num_segments_cli_param = f"{cli_prefix}{num_segments_key}"
 """ The number of segments across which we divide the hashing space for each band"""
 shingle_option_cli_param = f"{cli_prefix}{shingle_option_key}"
 """ The option (word/char) used to do shingles calculation for each document"""
+memory_budget_cli_param = f"{cli_prefix}{memory_budget_key}"
+""" The size (MB) of band signatures buffered in memory before spilling them to the local disk"""
 
 captured_arg_keys = [
     document_id_column_key,
@@ -84,6 +92,7 @@ captured_arg_keys = [
     word_shingle_size_key,
     num_segments_key,
     shingle_option_key,
+    memory_budget_key,
 ]
 
 # defaults
@@ -107,6 +116,14 @@ num_segments_default = 1
 """ Default number of segments across which we divide the hashing space for each band"""
 shingle_option_default = "word"
 """ Default option of doing shingling"""
+memory_budget_default = 512
+""" Default size (MB) of band signatures buffered in memory"""
+histogram_bits = 10
+""" Histograms of band hashes have 2**histogram_bits bins of equal width for every segment"""
+max_histogram_bits = 18
+""" Histograms of band hashes have at most 2**max_histogram_bits bins of equal width"""
+band_row_group_size = 16384
+""" Number of rows in a row group of the band signature files, the unit of band hash range reads"""
 
 
 sigcalc_data_factory_key = "sc_data_factory"
@@ -123,6 +140,7 @@ PUNCTUATION = "!/—”:％１〈&(、━\\【#%「」，】；+^]~“《„';
 )
 PUNCTUATION_SET = set(PUNCTUATION)
 PUNCTUATION_TRANS = str.maketrans(PUNCTUATION, " " * len(PUNCTUATION))
+PUNCTUATION_PATTERN = "[" + "".join(f"\\x{{{ord(c):x}}}" for c in PUNCTUATION) + "]"
 
 
 class SignatureCalculationTransform(AbstractTableTransform):
@@ -133,7 +151,12 @@ class SignatureCalculationTransform(AbstractTableTransform):
     band. The band signatures, the minhashes and the document lengths are
     then saved in the output folder, under a folder structure `bands/band=b/segment=s`.
     To improve scalability of the next step of fuzzy dedup, the hash space of
-    each band is divided into `num_segments` segments.
+    each band is divided into `num_segments` segments. Band signatures are routed
+    to per band/segment buffers as they are calculated. Once the buffers exceed
+    `memory_budget` MB, they are spilled to local files, and the content of every
+    band/segment is written to the output once, on flush. A histogram of the band
+    hashes of every band is saved as well, in the `histograms` folder, so that the
+    cluster analysis can split large band segments into balanced parts.
 
     The following internal variables are retrieved from the config parameter:
         document_id_column: name of the column storing the unique ID assigned to each document
@@ -145,6 +168,7 @@ class SignatureCalculationTransform(AbstractTableTransform):
         jaccard_similarity_threshold: Jaccard similarity threshold above which two documents are duplicates
         word_shingle_size: the size of the word shingles calculated for each document
         num_segments: the number of segments across which we divide the hashing space for each band
+        memory_budget: size (MB) of band signatures buffered in memory before spilling them to the local disk
     """
 
     def __init__(self, config: dict[str, Any]):
@@ -167,13 +191,30 @@ class SignatureCalculationTransform(AbstractTableTransform):
         self.num_bands = config.get(num_bands_key, num_bands_default)
         self.num_rows = config.get(num_minhashes_per_band_key, num_minhashes_per_band_default)
         self.shingle_option = config.get(shingle_option_key, shingle_option_default)
-        # use this dataframe to store the minhashes and size for each document
-        self.all_minhashes = None
-        # use this dataframe to store the band hashes for each document
-        self.all_band_hashes = None
+        self.memory_budget = int(config.get(memory_budget_key, memory_budget_default) * 1024 * 1024)
+        # define the upper and lower bounds of each band segment
+        upper_bound = np.uint64(np.iinfo(np.uint64).max)
+        segment_len = np.uint64(upper_bound // self.num_segments)
+        self.segment_bounds = np.array(
+            [np.uint64(segment_index) * segment_len for segment_index in range(self.num_segments)] + [upper_bound],
+            dtype=np.uint64,
+        )
+        # band signatures (band hash and document data) buffered for every (band, segment)
+        self.band_buffers = {}
+        self.buffered_bytes = 0
+        self.band_schema = None
+        # spill files, written once the buffers exceed memory budget. Every spill writes a single file, containing
+        # record batches of all (band, segment), with the indexes of the record batches for every (band, segment)
+        self.spill_folder = None
+        self.spill_files = []
+        # number of band hashes in each histogram bin, for every band. Every segment gets 2**histogram_bits
+        # bins (up to 2**max_histogram_bits bins in total), so that bins are not coarser than the segments
+        self.histogram_bits = min(histogram_bits + math.ceil(math.log2(self.num_segments)), max_histogram_bits)
+        self.band_histograms = np.zeros((self.num_bands, 1 << self.histogram_bits), dtype=np.int64)
         # this variable keeps track of how many files were processed since last
         # data write to properly update metadata
         self.files_processed = 0
+        self.docs_processed = 0
         self.bytes_processed = 0
         self.data_access = config.get("data_access")
         if self.data_access is None:
@@ -205,52 +246,40 @@ class SignatureCalculationTransform(AbstractTableTransform):
         # read the target columns
         df = df.select(self.contents_column, self.document_id_column)
 
-        # generate minhash values
-        minhashes = df.map_rows(
-            lambda row: mm_min_hash.minhash2_nosalt(
-                *self._generate_word_shingles(row, self.shingle_option, window_size=self.word_shingle_size)
-            )
-        )
-        # rename columns, cast minhashes to list(uint32)
-        minhashes = minhashes.select(
-            pl.col("column_2").alias(self.document_id_column),
-            pl.col("column_0").cast(pl.List(pl.UInt32)).alias("minhashes"),
-            pl.col("column_1").alias("document_length"),
-        )
-        # store the minhash calculations to send out at the end of execution
-        if self.all_minhashes is None:
-            self.all_minhashes = minhashes
-        else:
-            self.all_minhashes = self.all_minhashes.vstack(minhashes)
-
-        # Calculate band hashes
-        band_hashes_list = self._process_rows_into_bands(
-            minhashes,
-            self.num_bands,
-            self.num_rows,
-        )
-        band_hash_schema = pl.Schema(
+        # generate shingles for all documents, flattened into a single list with document offsets
+        shingles, offsets = self._generate_shingles(df[self.contents_column])
+        # generate minhash values for all documents at once
+        minhash_values = mm_min_hash.minhash_batch(shingles, offsets)
+        minhash_lists = pa.FixedSizeListArray.from_arrays(pa.array(minhash_values.ravel()), self.num_permutations)
+        minhashes = pl.DataFrame(
             {
-                "band_hash": pl.UInt64,
-                "band_index": pl.Int32,
-                self.document_id_column: pl.Int64,
+                self.document_id_column: df[self.document_id_column].cast(pl.Int64),
+                "minhashes": pl.from_arrow(minhash_lists.cast(pa.list_(pa.uint32()))),
+                "document_length": df[self.contents_column].str.len_chars().cast(pl.Int64),
             }
         )
-        band_hashes = pl.DataFrame(band_hashes_list, schema=band_hash_schema)
-
-        # store the band hash calculations to send out at the end of execution
-        if self.all_band_hashes is None:
-            self.all_band_hashes = band_hashes
-        else:
-            self.all_band_hashes = self.all_band_hashes.vstack(band_hashes)
-
-        if len(self.all_minhashes) > 750000:
-            tables, metadata = self._write_band_signatures()
-        else:
-            tables = []
-            metadata = {}
-        # update metadata stats and return the stats (no tables are returned in transform)
-        return tables, metadata
+        self.docs_processed += len(minhashes)
+        # encapsulate document info in a structure
+        document_data = minhashes.select(
+            pl.struct(
+                [
+                    pl.col(self.document_id_column),
+                    pl.col("minhashes"),
+                    pl.col("document_length"),
+                ]
+            ).alias("document_data"),
+        ).to_arrow()["document_data"]
+
+        # calculate band hashes and route them to the band/segment buffers
+        band_hashes = self._calculate_band_hashes(minhash_values)
+        for band_ix in range(self.num_bands):
+            bins = (band_hashes[:, band_ix] >> np.uint64(64 - self.histogram_bits)).astype(np.int64)
+            self.band_histograms[band_ix] += np.bincount(bins, minlength=1 << self.histogram_bits)
+        self._buffer_band_signatures(band_hashes, document_data)
+        if self.buffered_bytes > self.memory_budget:
+            self._spill_band_signatures()
+        # no tables are returned in transform, band signatures are written on flush
+        return [], {}
 
     def flush(self) -> tuple[list[pa.Table], dict[str, Any]]:
         """
@@ -263,90 +292,178 @@ class SignatureCalculationTransform(AbstractTableTransform):
         propagated to metadata
         """
         self.logger.info(f"Starting flush()")
-        if self.all_band_hashes is not None and self.all_minhashes is not None:
+        if self.band_schema is not None:
             tables, metadata = self._write_band_signatures()
         else:
             tables = []
             metadata = {}
         return tables, metadata
 
+    def _calculate_band_hashes(self, minhashes: np.ndarray) -> np.ndarray:
+        """
+        Calculate band hashes of the documents
+        :param minhashes: np.array of document minhashes (num_docs x num_permutations)
+        :return: np.array of band hashes (num_docs x num_bands)
+        """
+        num_minhashes = minhashes.shape[1]
+        b = self.num_bands
+        r = self.num_rows
+        assert b * r <= num_minhashes, f"b*r must be <= num minhashes, was b={b}, r={r}, num_minhashes={num_minhashes}"
+        band_hashes = np.empty((len(minhashes), b), dtype=np.uint64)
+        for band_index in range(b):
+            band = minhashes[:, band_index * r : (band_index + 1) * r]
+            band_hashes[:, band_index] = [mmh3.hash64(row.tobytes(), seed=42, signed=False)[0] for row in band]
+        return band_hashes
+
+    def _buffer_band_signatures(self, band_hashes: np.ndarray, document_data: pa.ChunkedArray) -> None:
+        """
+        Route band signatures to the buffers of their band and segment
+        :param band_hashes: np.array of band hashes (num_docs x num_bands)
+        :param document_data: document data (id, minhashes and length) of every document
+        :return: None
+        """
+        for band_ix in range(self.num_bands):
+            # segment of every band hash, segment s covers hashes in (bounds[s], bounds[s + 1]]
+            segments = np.searchsorted(self.segment_bounds, band_hashes[:, band_ix], side="left") - 1
+            order = np.argsort(segments, kind="stable")
+            # hashes outside of all segments (segment -1) are skipped
+            ends = np.cumsum(np.bincount(segments + 1, minlength=self.num_segments + 1))
+            for segment_index in range(self.num_segments):
+                indices = order[ends[segment_index] : ends[segment_index + 1]]
+                table = pa.table(
+                    {
+                        "band_hash": pa.array(band_hashes[indices, band_ix], type=pa.uint64()),
+                        "document_data": document_data.take(indices),
+                    }
+                )
+                if self.band_schema is None:
+                    self.band_schema = table.schema
+                if table.num_rows > 0:
+                    self.band_buffers.setdefault((band_ix, segment_index), []).append(table)
+                    self.buffered_bytes += table.nbytes
+
+    def _spill_band_signatures(self) -> None:
+        """
+        Spill buffered band signatures to a local file, freeing the memory. The file is closed once written,
+        so that the number of open files does not depend on the number of bands and segments
+        :return: None
+        """
+        if self.spill_folder is None:
+            self.spill_folder = tempfile.mkdtemp(prefix="minhash_spill_")
+        spill_file = os.path.join(self.spill_folder, f"spill_{len(self.spill_files)}.arrow")
+        self.logger.debug(f"Spilling {self.buffered_bytes:,d} bytes of band signatures to {spill_file}")
+        batch_indexes = {}
+        with pa.ipc.new_file(spill_file, self.band_schema) as writer:
+            for key, tables in self.band_buffers.items():
+                for table in tables:
+                    for batch in table.to_batches():
+                        batch_indexes.setdefault(key, []).append(writer.stats.num_record_batches)
+                        writer.write_batch(batch)
+        self.spill_files.append((spill_file, batch_indexes))
+        self.band_buffers = {}
+        self.buffered_bytes = 0
+
+    def _get_band_signatures(self, band_ix: int, segment_index: int) -> pa.Table:
+        """
+        Get all (spilled and buffered) band signatures of a band and segment
+        :param band_ix: band index
+        :param segment_index: segment index
+        :return: table of band signatures
+        """
+        tables = []
+        for spill_file, batch_indexes in self.spill_files:
+            indexes = batch_indexes.pop((band_ix, segment_index), None)
+            if indexes is None:
+                continue
+            # only the record batches of this band and segment are read
+            with pa.OSFile(spill_file) as source:
+                reader = pa.ipc.open_file(source)
+                tables.append(pa.Table.from_batches([reader.get_batch(i) for i in indexes], schema=self.band_schema))
+            if len(batch_indexes) == 0:
+                # all of the band signatures of this file are read
+                os.remove(spill_file)
+        tables.extend(self.band_buffers.pop((band_ix, segment_index), []))
+        if len(tables) == 0:
+            return self.band_schema.empty_table()
+        return pa.concat_tables(tables).combine_chunks()
+
+    def get_band_signatures(self) -> Iterator[tuple[int, int, pa.Table]]:
+        """
+        Get (and remove from the buffers) band signatures of all bands and segments, one band/segment
+        at a time. Used for writing them to storage, or for handing them directly to cluster analysis
+        :return: iterator of band index, segment index and table of band signatures
+        """
+        if self.band_schema is None:
+            return
+        self.logger.debug(
+            f"{self.buffered_bytes:,d} bytes of band signatures buffered, {len(self.spill_files)} spill files"
+        )
+        for band_ix in range(self.num_bands):
+            for segment_index in range(self.num_segments):
+                yield band_ix, segment_index, self._get_band_signatures(band_ix, segment_index)
+        self.band_buffers = {}
+        self.buffered_bytes = 0
+        self.band_schema = None
+        self.spill_files = []
+        if self.spill_folder is not None:
+            shutil.rmtree(self.spill_folder, ignore_errors=True)
+            self.spill_folder = None
+
     def _write_band_signatures(self):
-        # define the upper and lower bounds of each band segment
         if self.sc_data_access is None:
             self.sc_data_access = self.sc_daf.create_data_access()
-        segment_bounds_list = []
-        upper_bound = np.uint64(np.iinfo(np.uint64).max)
-        segment_len = np.uint64(upper_bound // self.num_segments)
-        for segment_index in range(self.num_segments):
-            segment_bounds_list.append(np.uint64(segment_index) * segment_len)
-        segment_bounds_list.append(upper_bound)
-        segment_bounds = np.array(segment_bounds_list, dtype=np.uint64)
-        self.logger.debug(f"Calculated {len(segment_bounds)} segment_bounds")
+        if self.sc_data_access.output_folder is None:
+            self.sc_data_access.output_folder = self.data_access.output_folder
+        # output files are named after the last processed file
+        suffix_path = Path(self.last_file_name).relative_to(self.data_access.input_folder)
         # output stats for the metadata
         num_tables_written = 0
         num_docs_written = 0
         num_bytes_written = 0
-        self.logger.debug(f"dataframe self.all_band_hashes has {len(self.all_band_hashes)} rows")
-        self.logger.debug(f"dataframe self.all_minhashes has {len(self.all_minhashes)} rows")
-        # iterate through the bands, get the band hashes for each band, divide
-        # them into segments, join with minhashes, and upload to storage
-        for band_ix in range(self.num_bands):
-            # Filtering on, then dropping the `band_index` column
-            band_df = self.all_band_hashes.filter(pl.col("band_index") == band_ix).drop("band_index")
-            # assign each band hash to a segment of the hashing space
-            self.logger.debug(f"band {band_ix} band_df has {len(band_df)} rows")
-            for segment_index in range(self.num_segments):
-                segment_band_df = band_df.filter(
-                    (pl.col("band_hash") > segment_bounds[segment_index])
-                    & (pl.col("band_hash") <= segment_bounds[segment_index + 1])
-                )
-                self.logger.debug(
-                    f"band {band_ix} segment {segment_index} segment_band_df has {len(segment_band_df)} rows"
-                )
-                # join the band hash dataframe with the minihash and doc length dataframe
-                segment_band_minhash_df = segment_band_df.join(
-                    self.all_minhashes,
-                    on=self.document_id_column,
-                    how="inner",
-                )
-                self.logger.debug(f"band {band_ix} segment {segment_index} joined segment_band_df and minhashes")
-
-                # encapsulate document info in a structure
-                segment_band_minhash_df = segment_band_minhash_df.select(
-                    pl.col("band_hash"),
-                    pl.struct(
-                        [
-                            pl.col(self.document_id_column),
-                            pl.col("minhashes"),
-                            pl.col("document_length"),
-                        ]
-                    ).alias("document_data"),
-                )
-                self.logger.debug(f"band {band_ix} segment {segment_index} encapsulated document info in a structure")
-
-                # append the table to the result list, and the path to metadata
-                last_file_name_path = Path(self.last_file_name)
-                suffix_path = last_file_name_path.relative_to(self.data_access.input_folder)
-                if self.sc_data_access.output_folder is None:
-                    self.sc_data_access.output_folder = self.data_access.output_folder
-                save_path = os.path.join(
-                    self.sc_data_access.output_folder,
-                    "bands",
-                    f"band={band_ix}",
-                    f"segment={segment_index}",
-                    suffix_path,
-                )
-                segment_band_minhash_table = segment_band_minhash_df.to_arrow()
-                bytes_written, _, _ = self.sc_data_access.save_table(save_path, segment_band_minhash_table)
-                if bytes_written > 0:
-                    num_tables_written += 1
-                    num_docs_written += segment_band_minhash_table.num_rows
-                    num_bytes_written += bytes_written
-                    self.logger.debug(f"Uploaded table for band {band_ix} and segment {segment_index}")
+        # write the band signatures of every band and segment to storage
+        for band_ix, segment_index, segment_band_minhash_table in self.get_band_signatures():
+            self.logger.debug(f"band {band_ix} segment {segment_index} has {segment_band_minhash_table.num_rows} rows")
+            save_path = os.path.join(
+                self.sc_data_access.output_folder,
+                "bands",
+                f"band={band_ix}",
+                f"segment={segment_index}",
+                suffix_path,
+            )
+            # band signatures are sorted by band hash, in small row groups, so that cluster analysis
+            # tasks processing a band hash range of the segment only read the row groups of their range
+            writer = pa.BufferOutputStream()
+            pq.write_table(
+                segment_band_minhash_table.sort_by("band_hash"),
+                writer,
+                compression="ZSTD",
+                row_group_size=band_row_group_size,
+            )
+            result, _ = self.sc_data_access.save_file(save_path, bytes(writer.getvalue()))
+            bytes_written = segment_band_minhash_table.nbytes if result is not None else 0
+            if bytes_written > 0:
+                num_tables_written += 1
+                num_docs_written += segment_band_minhash_table.num_rows
+                num_bytes_written += bytes_written
+                self.logger.debug(f"Uploaded table for band {band_ix} and segment {segment_index}")
+        # write the histograms of band hashes
+        bands, bins = np.nonzero(self.band_histograms)
+        bin_starts = bins.astype(np.uint64) << np.uint64(64 - self.histogram_bits)
+        histogram_table = pa.table(
+            {
+                "band": pa.array(bands, type=pa.int32()),
+                "bin_start": pa.array(bin_starts, type=pa.uint64()),
+                "bin_end": pa.array(bin_starts + np.uint64((1 << (64 - self.histogram_bits)) - 1), type=pa.uint64()),
+                "count": pa.array(self.band_histograms[bands, bins], type=pa.int64()),
+            }
+        )
+        save_path = os.path.join(self.sc_data_access.output_folder, "histograms", suffix_path)
+        self.sc_data_access.save_table(save_path, histogram_table)
+        self.band_histograms[:] = 0
         # add the stats to metadata
         metadata = {
             "input_files": self.files_processed,
-            "input_docs": len(self.all_minhashes),
+            "input_docs": self.docs_processed,
             "input_bytes": self.bytes_processed,
             "output_files": num_tables_written,
             "output_docs": num_docs_written,
@@ -354,66 +471,63 @@ class SignatureCalculationTransform(AbstractTableTransform):
         }
         self.logger.info(f"Wrote {num_tables_written} tables with a total size of {num_bytes_written:,d} bytes")
         self.files_processed = 0
+        self.docs_processed = 0
         self.bytes_processed = 0
-        self.all_minhashes = None
-        self.all_band_hashes = None
         return [], metadata
 
-    # define shingles generation function
-    def _generate_word_shingles(
-        self, row: tuple, shingling_option: str, window_size: int = 5, delimiter: str = " "
-    ) -> tuple[list, int, int]:
-        text = row[0]
-        # lower case
-        text = text.lower()
-        # replace numbers with '0'
-        text = NUMBERS_PATTERN.sub("0", text)
-        # convert punctuation to spaces
-        text = text.translate(PUNCTUATION_TRANS)
-        # remove consecutive spaces, newlines, tabs in the middle and in the beginning / end
-        text = WHITESPACE_PATTERN.sub(" ", text.strip())
+    def _generate_shingles(self, contents: pl.Series) -> tuple[list[str], np.ndarray]:
+        """
+        Generate shingles of all documents, using polars/arrow string kernels over the whole contents
+        column. The text is normalized (lower case, numbers replaced by 0, punctuation and consecutive
+        white spaces replaced by a single space, diacritics removed), split into words (or characters),
+        and every window of word_shingle_size words (characters) is joined into a shingle
+        :param contents: documents contents
+        :return: shingles of all documents (concatenated), and np.array of document offsets into shingles
+        """
+        window_size = self.word_shingle_size
+        text = (
+            contents.str.to_lowercase()
+            .str.replace_all(NUMBERS_PATTERN.pattern, "0")
+            .str.replace_all(PUNCTUATION_PATTERN, " ")
+            .str.replace_all(WHITESPACE_PATTERN.pattern, " ")
+            .str.strip_chars()
+        )
         # diacritics/unicode normalization
-        text = "".join(c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn")
-        text = text.strip()
-        self.logger.debug(shingling_option)
-        if shingling_option == "char":
-            words = list(text)
+        text = pl.from_arrow(pc.utf8_normalize(text.to_arrow(), "NFD"))
+        text = text.str.replace_all(r"\p{Mn}", "").str.strip_chars()
+        if self.shingle_option == "char":
+            tokens = text.str.extract_all(r"(?s).")
         else:
-            words = text.split()
-        document_id = row[1]
-        doc_len = len(row[0])
-        word_count = len(words)
-        k_shingles = []
-        for i in range(0, max(1, word_count - window_size + 1)):
-            k_shingles.append(delimiter.join(words[i : i + window_size]))
-        return k_shingles, doc_len, document_id
-
-    def _emit_bands(self, int_id_column: str, minhashes: np.array, b: int, r: int, seed: int = 42):
-        num_minhashes = len(minhashes)
-        assert b * r <= num_minhashes, f"b*r must be <= num minhashes, was b={b}, r={r}, num_minhashes={num_minhashes}"
-        results = []
-        for band_index in range(b):
-            band_hash, _ = mmh3.hash64(
-                minhashes[band_index * r : (band_index + 1) * r],
-                seed=seed,
-                signed=False,
-            )
-            results.append((band_hash, band_index, int_id_column))
-        return results
-
-    # Apply the function
-    def _process_rows_into_bands(self, df, minhashlsh_num_bands, minhashlsh_length_band):
-        result = []
-        for row in df.iter_rows():
-            bands = self._emit_bands(
-                row[0],  # document id
-                np.array(row[1], dtype=np.uint32),  # minhashes
-                minhashlsh_num_bands,
-                minhashlsh_length_band,
+            tokens = text.str.extract_all(r"\S+")
+        # documents without tokens have a single empty shingle, same as a single empty token
+        tokens = pl.select(
+            pl.when(tokens.list.len() > 0).then(tokens).otherwise(pl.lit([""], dtype=pl.List(pl.String)))
+        ).to_series()
+        # flatten tokens of all documents, with their position in the document
+        num_tokens = tokens.list.len().to_numpy().astype(np.int64)
+        positions = np.arange(num_tokens.sum()) - np.repeat(np.cumsum(num_tokens) - num_tokens, num_tokens)
+        counts = np.repeat(num_tokens, num_tokens)
+        words = pl.DataFrame({"word": tokens.explode(), "position": positions, "count": counts})
+        # a shingle starts at every position, except the last window_size - 1 positions of a document
+        # (unless the document has fewer words than window_size), and it is the join of the next words
+        shingles = (
+            words.select(
+                pl.concat_str(
+                    [
+                        pl.when(pl.col("position") + j < pl.col("count")).then(pl.col("word").shift(-j))
+                        for j in range(window_size)
+                    ],
+                    separator=" ",
+                    ignore_nulls=True,
+                ).alias("shingle"),
+                (pl.col("position") <= (pl.col("count") - window_size).clip(lower_bound=0)).alias("start"),
             )
-            for band in bands:
-                result.append(band)
-        return result
+            .filter(pl.col("start"))
+            .get_column("shingle")
+        )
+        num_shingles = np.maximum(num_tokens - window_size + 1, 1)
+        offsets = np.concatenate(([0], np.cumsum(num_shingles)))
+        return shingles.to_list(), offsets
 
 
 class SignatureCalculationTransformConfiguration(TransformConfiguration):
@@ -502,6 +616,12 @@ class SignatureCalculationTransformConfiguration(TransformConfiguration):
             default=shingle_option_default,
             help="Shingling option",
         )
+        parser.add_argument(
+            f"--{memory_budget_cli_param}",
+            type=float,
+            default=memory_budget_default,
+            help="size (MB) of band signatures buffered in memory before spilling them to the local disk",
+        )
         self.daf.add_input_params(parser=parser)
 
     def apply_input_params(self, args: Namespace) -> bool:
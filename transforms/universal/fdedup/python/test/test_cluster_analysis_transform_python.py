@@ -10,12 +10,24 @@
 # limitations under the License.
 ################################################################################
 
+import io
 import os
 
-from cluster_analysis_transform import sort_output_cli_param
+import cluster_analysis_transform
+import numpy as np
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+from cluster_analysis_transform import (
+    ClusterAnalysisTransform,
+    get_band_segment_folders,
+    index_folder_key,
+    sort_output_cli_param,
+)
 from cluster_analysis_transform_python import (
     ClusterAnalysisPythonTransformConfiguration,
 )
+from data_processing.data_access import DataAccessLocal
 from data_processing.runtime.pure_python import PythonTransformLauncher
 from data_processing.test_support.launch.transform_test import (
     AbstractTransformLauncherTest,
@@ -46,3 +58,150 @@ class TestPythonClusterAnalysisTransform(AbstractTransformLauncherTest):
             )
         ]
         return fixtures
+
+
+def test_cluster_analysis_index(tmp_path):
+    basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../test-data"))
+    data_access = DataAccessLocal(
+        {"input_folder": basedir + "/expected/signature_calc/bands", "output_folder": str(tmp_path / "output")}
+    )
+    config = {"num_bands": 14, "num_segments": 2, "jaccard_similarity_threshold": 0.7, "data_access": data_access}
+    transform = ClusterAnalysisTransform(config)
+    index_transform = ClusterAnalysisTransform(config | {index_folder_key: str(tmp_path / "index")})
+    for band in range(14):
+        for segment in range(2):
+            folder_name = f"band={band}/segment={segment}"
+            expected, _ = transform.transform(folder_name)
+            expected_df = pl.read_parquet(io.BytesIO(expected[0][0])).sort(["first_doc", "docs_to_remove"])
+            # first run adds all the documents to the index, second one finds all of them in the index
+            for rows_added in [None, 0]:
+                result, metadata = index_transform.transform(folder_name)
+                result_df = pl.read_parquet(io.BytesIO(result[0][0])).sort(["first_doc", "docs_to_remove"])
+                assert result_df.equals(expected_df)
+                if rows_added is None:
+                    assert metadata["index_rows_read"] == 0
+                else:
+                    assert metadata["index_rows_added"] == rows_added
+                    assert metadata["index_rows_read"] == metadata["input_rows"]
+
+
+def test_cluster_analysis_split_segments(tmp_path):
+    basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../test-data"))
+    data_access = DataAccessLocal(
+        {"input_folder": basedir + "/expected/signature_calc/bands", "output_folder": str(tmp_path)}
+    )
+    config = {"num_bands": 14, "num_segments": 2, "jaccard_similarity_threshold": 0.7, "data_access": data_access}
+    transform = ClusterAnalysisTransform(config)
+    folders = get_band_segment_folders(data_access, num_bands=14, num_segments=2)
+    assert len(folders) == 28
+    # bands have 12 documents, band segments with more than 4 documents are split
+    split_folders = get_band_segment_folders(data_access, num_bands=14, num_segments=2, max_docs_per_task=4)
+    assert len(split_folders) > len(folders)
+    results = []
+    for folder_names in [folders, split_folders]:
+        dataframes = []
+        for folder_name in folder_names:
+            result, _ = transform.transform(folder_name)
+            dataframes.append(pl.read_parquet(io.BytesIO(result[0][0])))
+        results.append(pl.concat(dataframes).sort(pl.all()))
+    assert results[1].equals(results[0])
+
+
+def test_cluster_analysis_range_reads(tmp_path):
+    # band segment files sorted by band hash, in small row groups, with clusters of 2 documents
+    rng = np.random.default_rng(42)
+    band_hashes = np.repeat(rng.integers(1, np.iinfo(np.int64).max, size=10000, dtype=np.int64), 2).astype(np.uint64)
+    document_data = pa.array(
+        [{"int_id_column": i, "minhashes": [i // 2] * 8, "document_length": 100} for i in range(len(band_hashes))]
+    )
+    table = pa.table({"band_hash": band_hashes, "document_data": document_data})
+    for i in range(2):
+        path = tmp_path / "bands" / "band=0" / "segment=0" / f"df{i}.parquet"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        pq.write_table(table.slice(i * 10000, 10000).sort_by("band_hash"), path, row_group_size=500)
+    data_access = DataAccessLocal({"input_folder": str(tmp_path / "bands"), "output_folder": str(tmp_path / "out")})
+    config = {"num_bands": 1, "num_segments": 1, "jaccard_similarity_threshold": 0.7, "data_access": data_access}
+    transform = ClusterAnalysisTransform(config)
+    _, metadata = transform.transform("band=0/segment=0")
+    # a range of 5% of the hash space only reads the row groups of the range
+    hash_range = (int(np.iinfo(np.int64).max * 0.5), int(np.iinfo(np.int64).max * 0.55))
+    result, range_metadata = transform.transform(f"band=0/segment=0/range={hash_range[0]}-{hash_range[1]}")
+    assert range_metadata["input_bytes"] < metadata["input_bytes"] // 5
+    in_range = (band_hashes >= hash_range[0]) & (band_hashes <= hash_range[1])
+    assert range_metadata["input_rows"] == np.count_nonzero(in_range)
+    assert range_metadata["num_duplicate_documents"] == np.count_nonzero(in_range) // 2
+
+
+def test_band_segment_folders_partial_bins(tmp_path):
+    # a single histogram bin covering both segments, its documents are split between the segments
+    upper_bound = np.iinfo(np.uint64).max
+    histogram = pa.table(
+        {
+            "band": pa.array([0], type=pa.int32()),
+            "bin_start": pa.array([0], type=pa.uint64()),
+            "bin_end": pa.array([upper_bound], type=pa.uint64()),
+            "count": pa.array([100], type=pa.int64()),
+        }
+    )
+    (tmp_path / "histograms").mkdir()
+    pq.write_table(histogram, tmp_path / "histograms" / "df.parquet")
+    data_access = DataAccessLocal({"input_folder": str(tmp_path / "bands"), "output_folder": str(tmp_path / "out")})
+    folders = get_band_segment_folders(data_access, num_bands=1, num_segments=2, max_docs_per_task=60)
+    assert folders == ["band=0/segment=0", "band=0/segment=1"]
+
+
+def _write_band_signatures(folder, band_hashes: np.ndarray, doc_ids: np.ndarray) -> DataAccessLocal:
+    document_data = pa.StructArray.from_arrays(
+        [
+            pa.array(doc_ids, type=pa.int64()),
+            pa.array([[int(h % 1000)] * 8 for h in band_hashes], type=pa.large_list(pa.uint32())),
+            pa.array(np.full(len(doc_ids), 100), type=pa.int64()),
+        ],
+        names=["int_id_column", "minhashes", "document_length"],
+    )
+    path = folder / "bands" / "band=0" / "segment=0" / "df.parquet"
+    path.parent.mkdir(parents=True)
+    pq.write_table(
+        pa.table({"band_hash": pa.array(band_hashes, type=pa.uint64()), "document_data": document_data}), path
+    )
+    return DataAccessLocal({"input_folder": str(folder / "bands"), "output_folder": str(folder / "output")})
+
+
+def test_cluster_analysis_index_delta(tmp_path, monkeypatch):
+    monkeypatch.setattr(cluster_analysis_transform, "index_row_group_size", 256)
+    monkeypatch.setattr(cluster_analysis_transform, "index_max_files", 3)
+    rng = np.random.default_rng(42)
+    config = {"num_bands": 1, "num_segments": 1, "jaccard_similarity_threshold": 0.7, index_folder_key: str(tmp_path)}
+
+    def _run(name: str, band_hashes: np.ndarray, doc_ids: np.ndarray) -> dict:
+        data_access = _write_band_signatures(tmp_path / name, band_hashes, doc_ids)
+        _, metadata = ClusterAnalysisTransform(config | {"data_access": data_access}).transform("band=0/segment=0")
+        return metadata
+
+    # initial run indexes 50000 documents
+    band_hashes = rng.integers(1, np.iinfo(np.int64).max, size=50000, dtype=np.int64).astype(np.uint64) * 2
+    metadata = _run("run0", band_hashes, np.arange(50000))
+    assert metadata["index_rows_added"] == 50000
+    # a small delta, with 10 duplicates of indexed documents, only reads a few row groups of the index
+    new_hashes = rng.integers(1, np.iinfo(np.int64).max, size=90, dtype=np.int64).astype(np.uint64) * 2
+    metadata = _run("run1", np.concatenate([band_hashes[:10], new_hashes]), np.arange(50000, 50100))
+    assert metadata["index_row_groups"] > 100
+    assert metadata["index_row_groups_read"] <= 15
+    assert metadata["index_rows_read"] == 10
+    assert metadata["num_duplicate_documents"] == 10
+    # partitions with too many files are compacted
+    compacted = 0
+    for run in range(2, 5):
+        delta = rng.integers(1, np.iinfo(np.int64).max, size=1000, dtype=np.int64).astype(np.uint64) * 2
+        metadata = _run(f"run{run}", delta, np.arange(run * 100000, run * 100000 + 1000))
+        compacted += metadata["index_files_compacted"]
+    assert compacted > 0
+    partition_files = [len(os.listdir(folder)) for folder in (tmp_path / "band=0" / "segment=0").iterdir()]
+    assert len(partition_files) == 1 << cluster_analysis_transform.index_partition_bits
+    assert max(partition_files) <= 3
+    # documents processed again are found in the index once (with the 10 duplicates of the first delta),
+    # and are not duplicates of themselves
+    metadata = _run("run5", band_hashes[:1000], np.arange(1000))
+    assert metadata["index_rows_read"] == 1010
+    assert metadata["index_rows_added"] == 0
+    assert metadata["num_duplicate_documents"] == 10
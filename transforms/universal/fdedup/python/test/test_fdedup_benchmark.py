@@ -0,0 +1,42 @@
+# (C) Copyright IBM Corp. 2024.
+# Licensed under the Apache License, Version 2.0 (the “License”);
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#  http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an “AS IS” BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+from fdedup_benchmark import compare_results, generate_corpus
+
+
+def test_generate_corpus():
+    corpus = generate_corpus(num_docs=200, duplicate_rate=0.25, min_words=10, max_words=20, seed=7)
+    assert corpus.column_names == ["int_id_column", "contents"]
+    assert corpus.num_rows == 200
+    assert sorted(corpus["int_id_column"].to_pylist()) == list(range(200))
+    lengths = [len(text.split()) for text in corpus["contents"].to_pylist()]
+    assert min(lengths) >= 10 and max(lengths) <= 20
+    # without edits, duplicates are exact copies of original documents
+    exact = generate_corpus(num_docs=200, duplicate_rate=0.25, min_words=10, max_words=20, edit_rate=0, seed=7)
+    assert len(set(exact["contents"].to_pylist())) == 150
+    # corpus generation is deterministic
+    assert generate_corpus(num_docs=200, duplicate_rate=0.25, min_words=10, max_words=20, seed=7).equals(corpus)
+
+
+def test_compare_results():
+    baseline = {
+        "params": {},
+        "stages": {"cluster_analysis": {"docs_per_sec": 1000, "peak_rss_bytes": 100, "bytes_written": 10}},
+    }
+    current = {
+        "params": {},
+        "stages": {"cluster_analysis": {"docs_per_sec": 950, "peak_rss_bytes": 105, "bytes_written": 10}},
+    }
+    assert compare_results(baseline, current, max_regression=0.1) == []
+    current["stages"]["cluster_analysis"]["docs_per_sec"] = 800
+    current["stages"]["cluster_analysis"]["peak_rss_bytes"] = 150
+    assert len(compare_results(baseline, current, max_regression=0.1)) == 2
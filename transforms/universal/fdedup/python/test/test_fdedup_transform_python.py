@@ -0,0 +1,70 @@
+# (C) Copyright IBM Corp. 2024.
+# Licensed under the Apache License, Version 2.0 (the “License”);
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#  http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an “AS IS” BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+import os
+import sys
+
+import polars as pl
+from fdedup_transform_python import ServiceOrchestrator, parse_args
+
+
+basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../test-data"))
+
+
+def _orchestrate(monkeypatch, input_folder: str, output_folder: str, in_memory: bool) -> int:
+    args = [
+        "fdedup",
+        "--input_folder",
+        input_folder,
+        "--output_folder",
+        output_folder,
+        "--num_segments",
+        "2",
+        "--jaccard_similarity_threshold",
+        "0.7",
+        "--operation_mode",
+        "filter_duplicates",
+        "--in_memory",
+        str(in_memory),
+    ]
+    monkeypatch.setattr(sys, "argv", args)
+    return ServiceOrchestrator(global_params=parse_args()).orchestrate()
+
+
+def _read_folder(folder: str) -> dict[str, pl.DataFrame]:
+    return {
+        os.path.relpath(os.path.join(root, name), folder): pl.read_parquet(os.path.join(root, name))
+        for root, _, names in os.walk(folder)
+        for name in names
+        if name.endswith(".parquet")
+    }
+
+
+def test_in_memory_orchestration(tmp_path, monkeypatch):
+    input_folder = os.path.join(basedir, "input")
+    assert _orchestrate(monkeypatch, input_folder, str(tmp_path / "steps"), in_memory=False) == 0
+    assert _orchestrate(monkeypatch, input_folder, str(tmp_path / "memory"), in_memory=True) == 0
+    # cleaned data and duplicate list are the same as the ones of the steps run separately
+    expected = _read_folder(str(tmp_path / "steps" / "cleaned"))
+    result = _read_folder(str(tmp_path / "memory" / "cleaned"))
+    assert len(expected) == 2 and expected.keys() == result.keys()
+    for name, df in expected.items():
+        assert result[name].equals(df)
+    duplicates = "docs_to_remove_consolidated/docs_to_remove_consolidated.parquet"
+    expected_duplicates = pl.read_parquet(tmp_path / "steps" / duplicates).sort(pl.all())
+    assert len(expected_duplicates) > 0
+    assert pl.read_parquet(tmp_path / "memory" / duplicates).sort(pl.all()).equals(expected_duplicates)
+
+
+def test_in_memory_orchestration_failure(tmp_path, monkeypatch):
+    # failure (no input files) is reported by the exit status
+    assert _orchestrate(monkeypatch, str(tmp_path / "empty"), str(tmp_path / "output"), in_memory=True) == 1
@@ -0,0 +1,36 @@
+# (C) Copyright IBM Corp. 2024.
+# Licensed under the Apache License, Version 2.0 (the “License”);
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#  http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an “AS IS” BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+import numpy as np
+import pytest
+from Murmur_MH import Murmur_MH
+
+
+documents = [
+    ["the quick brown fox", "quick brown fox jumps", "brown fox jumps over"],
+    [""],
+    ["a", "ab", "abc", "abcd", "abcde"],
+    ["naïve café", "日本語のテキスト", "emoji 😀 shingle"],
+]
+
+
+def test_minhash_batch():
+    mh = Murmur_MH(num_perm=112, seed=42)
+    shingles = [shingle for document in documents for shingle in document]
+    offsets = np.cumsum([0] + [len(document) for document in documents])
+    minhashes = mh.minhash_batch(shingles, offsets)
+    assert minhashes.shape == (len(documents), 112)
+    for document, document_minhashes in zip(documents, minhashes):
+        assert document_minhashes.tolist() == mh.minhash2_nosalt(document, 0, 0)[0]
+    # every document must have at least one shingle
+    with pytest.raises(ValueError):
+        mh.minhash_batch(shingles, [0, 0] + offsets[1:].tolist())
@@ -11,12 +11,29 @@
 ################################################################################
 
 import os
+import random
+import unicodedata
 
+import polars as pl
+import pyarrow.parquet as pq
+import pytest
+from data_processing.data_access import DataAccessFactory, DataAccessLocal
 from data_processing.runtime.pure_python import PythonTransformLauncher
 from data_processing.test_support.launch.transform_test import (
     AbstractTransformLauncherTest,
 )
 from data_processing.utils import ParamsUtils
+from signature_calc_transform import (
+    NUMBERS_PATTERN,
+    PUNCTUATION_TRANS,
+    WHITESPACE_PATTERN,
+    SignatureCalculationTransform,
+    memory_budget_key,
+    num_segments_key,
+    shingle_option_key,
+    sigcalc_data_factory_key,
+    word_shingle_size_key,
+)
 from signature_calc_transform_python import (
     SignatureCalculationPythonTransformConfiguration,
 )
@@ -37,4 +54,69 @@ class TestPythonSignatureCalcTransform(AbstractTransformLauncherTest):
         }
         launcher = PythonTransformLauncher(SignatureCalculationPythonTransformConfiguration())
         fixtures = [(launcher, config, basedir + "/input/", basedir + "/expected/signature_calc/")]
+        # spill all band signatures to the local disk
+        config = config | {"minhash_memory_budget": 0}
+        fixtures.append((launcher, config, basedir + "/input/", basedir + "/expected/signature_calc/"))
         return fixtures
+
+
+def _reference_shingles(text: str, shingle_option: str, window_size: int) -> list[str]:
+    """
+    Per document normalization and shingling, that the columnar implementation replaced
+    """
+    text = text.lower()
+    text = NUMBERS_PATTERN.sub("0", text)
+    text = text.translate(PUNCTUATION_TRANS)
+    text = WHITESPACE_PATTERN.sub(" ", text.strip())
+    text = "".join(c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn")
+    text = text.strip()
+    words = list(text) if shingle_option == "char" else text.split()
+    return [" ".join(words[i : i + window_size]) for i in range(0, max(1, len(words) - window_size + 1))]
+
+
+@pytest.mark.parametrize("shingle_option", ["word", "char"])
+@pytest.mark.parametrize("window_size", [1, 3, 5])
+def test_columnar_shingles(shingle_option: str, window_size: int):
+    rng = random.Random(window_size)
+    alphabet = list("abcXYZ019 \n\t.,;!?-'\"()") + list("éÀüñçΣσςΟΔΟΣ漢字İı") + ["́", " ", "12.5", "  "]
+    docs = ["", " ", "!!", "one"] + [
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 60))) for _ in range(300)
+    ]
+    transform = SignatureCalculationTransform(
+        {
+            word_shingle_size_key: window_size,
+            shingle_option_key: shingle_option,
+            "data_access": DataAccessLocal(),
+            sigcalc_data_factory_key: DataAccessFactory(),
+        }
+    )
+    shingles, offsets = transform._generate_shingles(pl.Series(docs))
+    for i, doc in enumerate(docs):
+        assert shingles[offsets[i] : offsets[i + 1]] == _reference_shingles(doc, shingle_option, window_size), doc
+
+
+def test_spill_files():
+    basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../test-data/input"))
+    tables = [pq.read_table(f"{basedir}/data_1/df1.parquet"), pq.read_table(f"{basedir}/data_2/df2.parquet")]
+    signatures = []
+    for memory_budget in [1024, 0]:
+        transform = SignatureCalculationTransform(
+            {
+                num_segments_key: 16,
+                memory_budget_key: memory_budget,
+                "data_access": DataAccessLocal(),
+                sigcalc_data_factory_key: DataAccessFactory(),
+            }
+        )
+        for index, table in enumerate(tables):
+            transform.transform(table=table, file_name=f"df{index}.parquet")
+        if memory_budget == 0:
+            # every spill writes a single file for all bands and segments
+            assert len(transform.spill_files) == len(tables)
+            assert sorted(os.listdir(transform.spill_folder)) == ["spill_0.arrow", "spill_1.arrow"]
+        signatures.append([(b, s, t.sort_by("band_hash")) for b, s, t in transform.get_band_signatures()])
+        assert transform.spill_folder is None
+    assert len(signatures[0]) == 14 * 16
+    for (band, segment, table), (spilled_band, spilled_segment, spilled_table) in zip(*signatures):
+        assert (band, segment) == (spilled_band, spilled_segment)
+        assert table.equals(spilled_table)
@@ -21,6 +21,7 @@ from data_cleaning_transform import (
     dataclean_data_factory_key,
     duplicate_list_location_default,
     duplicate_list_location_key,
+    get_docs_to_remove_ids,
 )
 from data_processing.data_access import DataAccessFactoryBase
 from data_processing.utils import CLIArgumentProvider, get_logger
@@ -109,7 +110,8 @@ class DataCleaningRuntime(DefaultRayTransformRuntime):
         if duplicate_list_location.startswith("s3://"):
             _, duplicate_list_location = duplicate_list_location.split("://")
         duplicate_list, retries = dc_data_access.get_file(duplicate_list_location)
-        docs_to_remove_list = ray.put(duplicate_list)
+        # sorted ids are put in the object store once, and shared (zero copy) by all the actors of a node
+        docs_to_remove_list = ray.put(get_docs_to_remove_ids(duplicate_list))
         return {"df": docs_to_remove_list} | self.params
 
 
@@ -73,4 +73,4 @@ if __name__ == "__main__":
     # Initialize the orchestrator
     orchestrator = RayServiceOrchestrator(global_params=args)
     # Launch ray fuzzy dedup execution
-    orchestrator.orchestrate()
+    sys.exit(orchestrator.orchestrate())
@@ -19,6 +19,7 @@ from data_cleaning_transform import (
     dataclean_data_factory_key,
     duplicate_list_location_default,
     duplicate_list_location_key,
+    get_docs_to_remove_ids,
 )
 from data_processing.data_access import DataAccessFactoryBase
 from data_processing.transform import TransformStatistics
@@ -76,7 +77,7 @@ class DataCleaningSparkRuntime(DefaultSparkTransformRuntime):
         if duplicate_list_location.startswith("s3://"):
             _, duplicate_list_location = duplicate_list_location.split("://")
         self.duplicate_list, retries = dc_data_access.get_file(duplicate_list_location)
-        return self.params | {"df": self.duplicate_list}
+        return self.params | {"df": get_docs_to_remove_ids(self.duplicate_list)}
 
 
 class DataCleaningSparkTransformConfiguration(SparkTransformRuntimeConfiguration):
@@ -113,7 +114,7 @@ class DataCleaningSparkTransformConfiguration(SparkTransformRuntimeConfiguration
         if duplicate_list_location.startswith("s3://"):
             _, duplicate_list_location = duplicate_list_location.split("://")
         self.duplicate_list, retries = data_access.get_file(duplicate_list_location)
-        return {"df": self.duplicate_list}
+        return {"df": get_docs_to_remove_ids(self.duplicate_list)}
 
 
 if __name__ == "__main__":
@@ -59,4 +59,4 @@ if __name__ == "__main__":
     # Initialize the orchestrator
     orchestrator = SparkServiceOrchestrator(global_params=args)
     # Launch spark fuzzy dedup execution
-    orchestrator.orchestrate()
+    sys.exit(orchestrator.orchestrate())